@@ -1,33 +1,40 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordRequestForm
-from sqlalchemy.orm import Session
-from app.db.connection import get_db
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.db.connection import get_async_db
 from app.models.models import User
 from app.schemas.schema_user import UserCreate, UserOut, Token
-from app.core.security import get_password_hash, verify_password, create_access_token
-from app.core.email import EmailService
+from app.core.security import hash_password_async, verify_password_async, create_access_token
+from app.core.email import send_email_background
 from app.core.email_template import WELCOME_EMAIL_HTML
 
 router = APIRouter()
-email_service = EmailService()
 
 # 1. signup
 @router.post("/signup", response_model=UserOut)
-def signup(user_in: UserCreate, db: Session = Depends(get_db)):
-    user_exists = db.query(User).filter(User.email == user_in.email).first()
+async def signup(
+    user_in: UserCreate,
+    background_tasks: BackgroundTasks,
+    db: AsyncSession = Depends(get_async_db)
+):
+    user_exists = (await db.execute(select(User).where(User.email == user_in.email))).scalars().first()
     if user_exists:
         raise HTTPException(status_code=400, detail="Email đã được đăng ký")
     
     new_user = User(
         email=user_in.email,
         fullname=user_in.fullname,
-        password=get_password_hash(user_in.password)
+        # bcrypt chạy trong pool băm mật khẩu, không chặn event loop
+        password=await hash_password_async(user_in.password)
     )
     
     db.add(new_user)
-    db.commit()
-    db.refresh(new_user)
-    email_service.send_email(
+    await db.commit()
+    await db.refresh(new_user)
+    # Gửi mail chào mừng sau khi đã trả response (SMTP + STARTTLS mất vài trăm ms)
+    background_tasks.add_task(
+        send_email_background,
         to=[new_user.email],
         subject="Chào mừng bạn đến với Aqua Sentinel",
         body=WELCOME_EMAIL_HTML.format(
@@ -40,10 +47,10 @@ def signup(user_in: UserCreate, db: Session = Depends(get_db)):
 
 # 2. login
 @router.post("/login", response_model=Token)
-def login(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
-    user = db.query(User).filter(User.email == form_data.username).first()
+async def login(form_data: OAuth2PasswordRequestForm = Depends(), db: AsyncSession = Depends(get_async_db)):
+    user = (await db.execute(select(User).where(User.email == form_data.username))).scalars().first()
     
-    if not user or not verify_password(form_data.password, user.password):
+    if not user or not await verify_password_async(form_data.password, user.password):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Email hoặc mật khẩu không chính xác"
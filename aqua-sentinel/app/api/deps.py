@@ -1,32 +1,70 @@
+from uuid import UUID
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from jose import jwt, JWTError
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from app.db.connection import get_db
-from app.models.models import User
+from app.db.connection import get_async_db
+from app.models.models import User, Pool
 from app.core.security import SECRET_KEY, ALGORITHM
+from app.services.auth_cache import auth_cache
 
 # Khai báo đường dẫn lấy token
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="api/login")
 
-def get_current_user(db: Session = Depends(get_db), token: str = Depends(oauth2_scheme)):
+async def get_current_user(db: AsyncSession = Depends(get_async_db), token: str = Depends(oauth2_scheme)):
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Không thể xác thực thông tin người dùng",
         headers={"WWW-Authenticate": "Bearer"},
     )
-    try:
-        # Giải mã Token
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        user_id: str = payload.get("sub")
-        if user_id is None:
+    # Token đã giải mã trước đó (còn hạn) -> bỏ qua bước giải mã
+    user_id = auth_cache.token_user(token)
+    if user_id is None:
+        try:
+            # Giải mã Token
+            payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+            user_id: str = payload.get("sub")
+            if user_id is None:
+                raise credentials_exception
+            user_id = UUID(user_id)
+        except (JWTError, ValueError):
             raise credentials_exception
-    except JWTError:
-        raise credentials_exception
-    
-    # Kiểm tra User có tồn tại trong DB không
-    user = db.query(User).filter(User.user_id == user_id).first()
+        auth_cache.store_token(token, user_id, payload.get("exp"))
+
+    # Kiểm tra User có tồn tại trong DB không (cache trước)
+    user = auth_cache.user(user_id)
     if user is None:
-        raise credentials_exception
-        
-    return user # Trả về đối tượng User hoàn chỉnh
\ No newline at end of file
+        user = (await db.execute(select(User).where(User.user_id == user_id))).scalars().first()
+        if user is None:
+            raise credentials_exception
+        auth_cache.store_user(user)
+
+    return user # Trả về đối tượng User hoàn chỉnh
+
+def _owned_pools_query(user_id, pool_ids):
+    return select(Pool.pool_id, Pool.species_id, Pool.region_id).where(
+        Pool.pool_id.in_(pool_ids),
+        Pool.owner_id == user_id
+    )
+
+async def get_owned_pools(db: AsyncSession, user_id, pool_ids):
+    """
+    {pool_id: (pool_id, species_id, region_id)} for the pools of pool_ids owned by
+    user_id; pools not owned (or missing) are left out. Cached per (user, pool),
+    the rest is one IN (...) query.
+    """
+    owned, missing = auth_cache.owned_pools(user_id, pool_ids)
+    if missing:
+        rows = (await db.execute(_owned_pools_query(user_id, missing))).all()
+        owned.update(auth_cache.store_owned(user_id, missing, rows))
+    return owned
+
+def get_owned_pools_sync(db: Session, user_id, pool_ids):
+    """get_owned_pools for sync handlers (Session), same cache and query."""
+    owned, missing = auth_cache.owned_pools(user_id, pool_ids)
+    if missing:
+        rows = db.execute(_owned_pools_query(user_id, missing)).all()
+        owned.update(auth_cache.store_owned(user_id, missing, rows))
+    return owned
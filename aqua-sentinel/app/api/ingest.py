@@ -0,0 +1,75 @@
+from datetime import datetime, timezone
+from fastapi import APIRouter, Depends, HTTPException, status
+from sqlalchemy.orm import Session
+
+from app.db.connection import get_db
+from app.api.deps import get_current_user, get_owned_pools_sync
+from app.models.models import User
+from app.schemas.schema_measurement import IngestRequest, IngestResponse
+from app.services.ingest_buffer import measurement_buffer
+from app.services.reading_store import reading_store
+
+router = APIRouter()
+
+def _to_row(pool_id, ts, point):
+    return {
+        "pool_id": pool_id,
+        "created_at": ts,
+        "dissolved_oxygen": point.dissolved_oxygen,
+        "ph": point.ph,
+        "amonia": point.ammonia,
+        "turbidity": point.turbidity,
+        "temperature": point.temperature,
+    }
+
+def _parse_timestamp(value):
+    # DB lưu giờ UTC không kèm múi giờ: đổi mọi timestamp có múi giờ về dạng đó để
+    # buffer ghi và reading_store không trộn datetime naive với aware
+    ts = datetime.fromisoformat(value)
+    if ts.tzinfo is not None:
+        ts = ts.astimezone(timezone.utc).replace(tzinfo=None)
+    return ts
+
+# 1. nhận dữ liệu cảm biến
+@router.post("/ingest", response_model=IngestResponse, status_code=status.HTTP_202_ACCEPTED)
+def ingest_readings(
+    req: IngestRequest,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    # KIỂM TRA QUYỀN SỞ HỮU: cache, rồi một truy vấn IN (...) cho các hồ còn lại
+    requested_ids = {item.pool_id for item in req.items}
+    pools = get_owned_pools_sync(db, current_user.user_id, requested_ids)
+    if set(pools) != requested_ids:
+        raise HTTPException(
+            status_code=403,
+            detail="Bạn không có quyền truy cập vào hồ này hoặc hồ không tồn tại"
+        )
+
+    try:
+        parsed = [
+            (item.pool_id, [(_parse_timestamp(p.timestamp), p) for p in item.readings])
+            for item in req.items
+        ]
+    except ValueError:
+        raise HTTPException(400, "Timestamp không hợp lệ")
+    rows = [_to_row(pool_id, ts, p) for pool_id, points in parsed for ts, p in points]
+
+    # Buffer đầy -> báo client gửi lại sau (backpressure)
+    if not measurement_buffer.offer(rows):
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Hệ thống đang quá tải, vui lòng gửi lại sau",
+            headers={"Retry-After": "1"},
+        )
+
+    # Cập nhật bộ nhớ đệm để /predict chỉ cần pool_id
+    for pool_id, points in parsed:
+        reading_store.append_points(pool_id, points)
+
+    return {"accepted": len(rows), "buffered": len(measurement_buffer)}
+
+# 2. trạng thái buffer
+@router.get("/ingest/stats")
+def ingest_stats(current_user: User = Depends(get_current_user)):
+    return measurement_buffer.snapshot()
@@ -0,0 +1,50 @@
+import hmac
+import os
+from typing import Optional
+from fastapi import APIRouter, Depends, Header, HTTPException, status
+from starlette.concurrency import run_in_threadpool
+from app.api.deps import get_current_user
+from app.models.models import User
+from app.schemas.schema_model import ReloadRequest, ReloadResponse
+from app.services.model_registry import SERVING_WORKERS, model_registry
+
+router = APIRouter()
+
+# Token cho thao tác vận hành (reload model); để trống = tắt API reload
+MODEL_ADMIN_TOKEN = os.getenv("MODEL_ADMIN_TOKEN")
+
+def require_admin_token(x_admin_token: Optional[str] = Header(default=None)):
+    if not MODEL_ADMIN_TOKEN or not x_admin_token or not hmac.compare_digest(
+        x_admin_token, MODEL_ADMIN_TOKEN
+    ):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Không có quyền thực hiện thao tác này"
+        )
+
+# 1. Danh sách phiên bản model
+@router.get("/models")
+def list_models(current_user: User = Depends(get_current_user)):
+    return {
+        "registry": model_registry.snapshot(),
+        "versions": model_registry.versions(),
+    }
+
+# 2. Nạp phiên bản mới không cần khởi động lại server
+@router.post("/models/reload", response_model=ReloadResponse)
+async def reload_models(req: ReloadRequest = ReloadRequest(), _: None = Depends(require_admin_token)):
+    if model_registry.watch_interval <= 0 and SERVING_WORKERS > 1:
+        # Watcher bị tắt: chỉ worker này đổi model, các worker khác giữ phiên bản cũ
+        print(f"[WARN] Model reload with MODEL_WATCH_INTERVAL_S=0 and {SERVING_WORKERS} workers: "
+              "other workers keep their version")
+
+    # Nạp + warm trong thread riêng; request đang chạy vẫn dùng phiên bản cũ.
+    # Ghi CURRENT sau khi nạp xong: watcher của các worker khác nạp theo
+    try:
+        result = await run_in_threadpool(model_registry.reload, req.version, True)
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Nạp model thất bại, giữ phiên bản cũ: {e}")
+
+    return {**result, "reload_ms": model_registry.stats["last_reload_ms"]}
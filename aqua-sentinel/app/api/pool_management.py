@@ -1,41 +1,47 @@
 from fastapi import APIRouter, Depends, HTTPException, status, BackgroundTasks
-from sqlalchemy.orm import Session, joinedload
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import joinedload
 from typing import List
 from uuid import UUID
 from datetime import datetime
 
-from app.db.connection import get_db
+from app.db.connection import get_async_db
 from app.api.deps import get_current_user
 from app.models.models import User, Pool, Region, AquaticSpecies
 from app.schemas.schema_pool import PoolCreate, PoolOut
+from app.services.auth_cache import auth_cache
+from app.services.reading_store import reading_store
 
-from app.core.email import EmailService
+from app.core.email import send_email_background
 from app.core.email_template import POOL_CREATED_EMAIL_HTML, POOL_DELETED_EMAIL_HTML
 
 router = APIRouter()
-email_service = EmailService()
 
 # 1. get pools
 @router.get("/my-pools", response_model=List[PoolOut])
-def get_my_pools(
-    db: Session = Depends(get_db), 
+async def get_my_pools(
+    db: AsyncSession = Depends(get_async_db), 
     current_user: User = Depends(get_current_user)
 ):
-    return db.query(Pool).options(
-        joinedload(Pool.region),
-        joinedload(Pool.species)
-    ).filter(Pool.owner_id == current_user.user_id).all()
+    result = await db.execute(
+        select(Pool).options(
+            joinedload(Pool.region),
+            joinedload(Pool.species)
+        ).where(Pool.owner_id == current_user.user_id)
+    )
+    return result.scalars().all()
 
 # 2. add pool
 @router.post("/", response_model=PoolOut, status_code=status.HTTP_201_CREATED)
-def create_pool(
+async def create_pool(
     pool_in: PoolCreate,
     background_tasks: BackgroundTasks, # Thêm BackgroundTasks
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_user)
 ):
-    region = db.query(Region).filter(Region.region_name == pool_in.region_name).first()
-    species = db.query(AquaticSpecies).filter(AquaticSpecies.species_id == pool_in.species_id).first()
+    region = (await db.execute(select(Region).where(Region.region_name == pool_in.region_name))).scalars().first()
+    species = await db.get(AquaticSpecies, pool_in.species_id)
     
     if not region or not species:
         raise HTTPException(404, detail="Vùng miền hoặc loài không tồn tại")
@@ -44,16 +50,21 @@ def create_pool(
         pool_name=pool_in.pool_name,
         region_id=region.region_id,
         species_id=pool_in.species_id,
-        owner_id=current_user.user_id
+        owner_id=current_user.user_id,
+        # Gắn sẵn quan hệ: PoolOut đọc region / species mà không cần lazy load (không có ở async)
+        region=region,
+        species=species
     )
     
     db.add(new_pool)
-    db.commit()
-    db.refresh(new_pool)
+    await db.commit()
+    await db.refresh(new_pool, ["created_at"])
+    # Bỏ kết quả "không sở hữu" đã cache cho hồ này (nếu có)
+    auth_cache.forget_pool(new_pool.pool_id)
 
     # background task sending email
     background_tasks.add_task(
-        email_service.send_email,
+        send_email_background,
         to=[current_user.email],
         subject="Aqua Sentinel: Tạo hồ mới thành công!",
         body=POOL_CREATED_EMAIL_HTML.format(
@@ -69,16 +80,18 @@ def create_pool(
 
 # 3. delete pool
 @router.delete("/{pool_id}", status_code=status.HTTP_200_OK)
-def delete_pool(
+async def delete_pool(
     pool_id: UUID,
     background_tasks: BackgroundTasks,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_user)
 ):
-    pool = db.query(Pool).filter(
-        Pool.pool_id == pool_id, 
-        Pool.owner_id == current_user.user_id
-    ).first()
+    pool = (await db.execute(
+        select(Pool).where(
+            Pool.pool_id == pool_id, 
+            Pool.owner_id == current_user.user_id
+        )
+    )).scalars().first()
     
     if not pool:
         raise HTTPException(404, detail="Hồ không tồn tại hoặc bạn không có quyền xoá")
@@ -86,12 +99,14 @@ def delete_pool(
     # Lưu lại tên hồ trước khi xoá để đưa vào email
     pool_name_deleted = pool.pool_name
     
-    db.delete(pool)
-    db.commit()
+    await db.delete(pool)
+    await db.commit()
+    reading_store.evict(pool_id)
+    auth_cache.forget_pool(pool_id)
 
     # Gửi email cảnh báo xoá dữ liệu
     background_tasks.add_task(
-        email_service.send_email,
+        send_email_background,
         to=[current_user.email],
         subject="Aqua Sentinel: Xác nhận xoá hồ nuôi",
         body=POOL_DELETED_EMAIL_HTML.format(
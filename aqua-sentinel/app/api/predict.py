@@ -1,48 +1,244 @@
+import asyncio
+import os
+import numpy as np
 from fastapi import APIRouter, HTTPException
-from app.schemas.schema_prediction import PredictRequest, PredictResponse
-from app.services.prediction_service import prediction_service
-from app.services.risk_engine import risk_engine
-from app.db.connection import get_db
+from app.schemas.schema_prediction import (
+    PredictRequest, PredictResponse, BatchPredictRequest, BatchPredictResponse
+)
+from app.services.model_registry import model_registry
+from app.services.prediction_service import STEP_MINUTES, split_horizons
+from app.services.risk_engine import LEVELS, risk_engine
+from app.services.reading_store import reading_store
+from app.services.batcher import prediction_batcher
+from app.services.inference_executor import inference_executor
+from app.core.security import password_executor
+from app.services.auth_cache import auth_cache
+from app.services.result_cache import HIT, LEAD, result_cache, result_key
+from app.db.connection import get_async_db
 from fastapi import APIRouter, Depends
-from sqlalchemy.orm import Session
-from app.api.deps import get_current_user
-from app.models.models import User, Pool
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.api.deps import get_current_user, get_owned_pools
+from app.models.models import User
 
 router = APIRouter()
 
+MIN_HISTORY = 12
+MAX_BATCH_POOLS = int(os.getenv("MAX_BATCH_POOLS", 500))
+
+def _columns(rows, keys=None):
+    """List of dicts -> dict of arrays (the columnar input of RiskEngine.assess_batch)."""
+    keys = keys or rows[0].keys()
+    return {k: np.array([row[k] for row in rows], dtype=np.float64) for k in keys}
+
+def _build_responses(species, outputs):
+    """
+    Responses for rows of (results, current_state) from one model set. The
+    risk of each horizon is assessed for all rows in one RiskEngine.assess_batch
+    call; reason texts are only rendered for the rows being returned.
+    """
+    # results gồm mọi horizon của model; 5 phút là dự báo chính
+    horizons = [split_horizons(results) for results, _ in outputs]
+    current = _columns([state for _, state in outputs], ("dissolved_oxygen", "temperature"))
+
+    # 2. Đánh giá rủi ro
+    risks = {
+        minutes: risk_engine.assess_batch(_columns([h[minutes] for h in horizons]), current, species)
+        for minutes in horizons[0]
+    }
+
+    responses = []
+    for i, (horizon, (_, current_state)) in enumerate(zip(horizons, outputs)):
+        preds = horizon[STEP_MINUTES]
+        risk = risks[STEP_MINUTES].to_dict(i)
+
+        forecast = {}
+        for minutes, values in horizon.items():
+            if minutes == STEP_MINUTES:
+                continue
+            forecast[f"{minutes}min"] = {
+                "prediction": values,
+                "risk_level": LEVELS[risks[minutes].level_codes[i]],
+                "details": risks[minutes].reasons(i),
+            }
+
+        responses.append({
+            "species": species[i],
+            "current_values": {
+                k: current_state[k] for k in preds.keys() if k in current_state
+            },
+            "prediction_next_5min": preds,
+            "risk_level": risk["level"],
+            "details": risk["reasons"],
+            "thresholds": risk["thresholds_used"],
+            "forecast": forecast,
+        })
+    return responses
+
+async def _predict_pools(service, pool_ids, species, X):
+    """
+    Responses for the rows of X (one per pool). Identical (version, species,
+    features) rows are answered from the result cache or wait for the request
+    already computing them; only the rest are computed.
+    """
+    keys = [result_key(service.version, species[i], X[i]) for i in range(len(pool_ids))]
+    responses = [None] * len(pool_ids)
+    waiting = {}
+    lead = []
+    for i, key in enumerate(keys):
+        state, value = result_cache.acquire(key)
+        if state == HIT:
+            responses[i] = value
+        elif state == LEAD:
+            lead.append(i)
+        else:
+            waiting[i] = value
+
+    if lead:
+        try:
+            computed = await _compute_pools(
+                service, [pool_ids[i] for i in lead], [species[i] for i in lead], X[lead]
+            )
+        except BaseException as e:
+            for i in lead:
+                result_cache.fail(keys[i], e)
+            raise
+        for i, response in zip(lead, computed):
+            result_cache.complete(keys[i], response)
+            responses[i] = response
+
+    for i, future in waiting.items():
+        # shield: request này bị huỷ không huỷ luôn kết quả của các request khác
+        responses[i] = await asyncio.shield(future)
+
+    # Bản sao nông: batch còn gắn thêm pool_id vào từng response
+    return [dict(response) for response in responses]
+
+async def _compute_pools(service, pool_ids, species, X):
+    """
+    Pools whose inputs have not moved since their last SAFE forecast reuse it
+    (INFERENCE_SKIP=1); the others go through the models in one batch.
+    """
+    skipper = service.skipper
+    outputs = [None] * len(pool_ids)
+    fresh = []
+    for i, pool_id in enumerate(pool_ids):
+        preds = skipper.lookup(pool_id, X[i], service.feature_cols)
+        if preds is None:
+            fresh.append(i)
+        else:
+            outputs[i] = (preds, dict(zip(service.feature_cols, X[i].tolist())))
+
+    if fresh:
+        # Có thể được gộp chung lô với các request đồng thời khác
+        for i, output in zip(fresh, await prediction_batcher.predict(service, X[fresh])):
+            outputs[i] = output
+
+    responses = _build_responses(species, outputs)
+    for i in fresh:
+        skipper.store(pool_ids[i], X[i], outputs[i][0], responses[i]["risk_level"])
+    return responses
+
 @router.post("/predict", response_model=PredictResponse)
 async def predict_water(
     req: PredictRequest,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_user) # Yêu cầu đăng nhập
 ):
-    # KIỂM TRA QUYỀN SỞ HỮU HỒ
-    pool = db.query(Pool).filter(
-        Pool.pool_id == req.pool_id, 
-        Pool.owner_id == current_user.user_id # Phải trùng owner_id
-    ).first()
+    # KIỂM TRA QUYỀN SỞ HỮU HỒ (cache theo user + hồ, chỉ hỏi DB khi chưa có)
+    pool = (await get_owned_pools(db, current_user.user_id, [req.pool_id])).get(req.pool_id)
 
     if not pool:
         raise HTTPException(
-            status_code=403, 
+            status_code=403,
             detail="Bạn không có quyền truy cập vào hồ này hoặc hồ không tồn tại"
         )
-    if len(req.history) < 12:
-        raise HTTPException(400, "Cần tối thiểu 12 điểm dữ liệu")
-    
-    # 1. Dự đoán
-    preds, current_state = prediction_service.predict(req.history)
-    
-    # 2. Đánh giá rủi ro
-    risk = risk_engine.assess_risk(preds, current_state, req.species)
-    
+
+    # 1. Dự đoán: cả request dùng một phiên bản model dù có reload giữa chừng,
+    # chọn bộ model theo loài / vùng của hồ (không có thì dùng bộ chung)
+    service = model_registry.active.route(pool.species_id, pool.region_id)
+    if req.history is None:
+        # Lấy lịch sử từ bộ nhớ đệm của server, nạp từ DB nếu chưa đủ hoặc đã quá hạn
+        # (worker khác có thể đã nhận dữ liệu ingest mới hơn)
+        if reading_store.needs_warm(req.pool_id, MIN_HISTORY):
+            await reading_store.warm(db, req.pool_id)
+        features = reading_store.latest_features(req.pool_id)
+        if features is None or reading_store.count(req.pool_id) < MIN_HISTORY:
+            raise HTTPException(400, "Cần tối thiểu 12 điểm dữ liệu")
+        if not service.loaded:
+            # Bộ model dùng lần đầu: nạp ngoài event loop
+            await inference_executor.run(service.load)
+        X = service.feature_row(features)
+    else:
+        if len(req.history) < MIN_HISTORY:
+            raise HTTPException(400, "Cần tối thiểu 12 điểm dữ liệu")
+        X = await inference_executor.run(service.feature_matrix, [req.history])
+
+    # Ngưỡng rủi ro, khoá cache và "species" trả về theo loài của hồ, cùng loài với bộ model
+    return (await _predict_pools(service, [req.pool_id], [pool.species_id], X))[0]
+
+@router.post("/predict/batch", response_model=BatchPredictResponse)
+async def predict_water_batch(
+    req: BatchPredictRequest,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user)
+):
+    if not req.items:
+        raise HTTPException(400, "Danh sách hồ trống")
+    if len(req.items) > MAX_BATCH_POOLS:
+        raise HTTPException(400, f"Tối đa {MAX_BATCH_POOLS} hồ mỗi request")
+
+    for item in req.items:
+        if item.history is None or len(item.history) < MIN_HISTORY:
+            raise HTTPException(400, f"Hồ {item.pool_id}: cần tối thiểu 12 điểm dữ liệu")
+
+    # KIỂM TRA QUYỀN SỞ HỮU: cache, rồi một truy vấn IN (...) cho các hồ còn lại
+    requested_ids = {item.pool_id for item in req.items}
+    pools = await get_owned_pools(db, current_user.user_id, requested_ids)
+    if set(pools) != requested_ids:
+        raise HTTPException(
+            status_code=403,
+            detail="Bạn không có quyền truy cập vào hồ này hoặc hồ không tồn tại"
+        )
+
+    # 1. Dự đoán: mỗi nhóm hồ dùng chung một bộ model là một lần gọi model
+    active = model_registry.active
+    groups = {}
+    for i, item in enumerate(req.items):
+        pool = pools[item.pool_id]
+        service = active.route(pool.species_id, pool.region_id)
+        groups.setdefault(id(service), (service, []))[1].append(i)
+
+    async def predict_group(service, indices):
+        X = await inference_executor.run(
+            service.feature_matrix, [req.items[i].history for i in indices]
+        )
+        return await _predict_pools(
+            service,
+            [req.items[i].pool_id for i in indices],
+            [pools[req.items[i].pool_id].species_id for i in indices],
+            X,
+        )
+
+    group_outputs = await asyncio.gather(
+        *(predict_group(service, indices) for service, indices in groups.values())
+    )
+    outputs = [None] * len(req.items)
+    for (_, indices), group_output in zip(groups.values(), group_outputs):
+        for i, output in zip(indices, group_output):
+            outputs[i] = output
+
+    for item, result in zip(req.items, outputs):
+        result["pool_id"] = item.pool_id
+
+    return {"results": outputs}
+
+@router.get("/predict/stats")
+def predict_stats(current_user: User = Depends(get_current_user)):
     return {
-        "species": req.species,
-        "current_values": {
-            k: current_state[k] for k in preds.keys() if k in current_state
-        },
-        "prediction_next_5min": preds,
-        "risk_level": risk["level"],
-        "details": risk["reasons"],
-        "thresholds": risk["thresholds_used"]
-    }
\ No newline at end of file
+        "microbatch": prediction_batcher.snapshot(),
+        "executor": inference_executor.snapshot(),
+        "inference_skip": model_registry.active.skip_snapshot(),
+        "result_cache": result_cache.snapshot(),
+        "auth_cache": auth_cache.snapshot(),
+        "password_hashing": password_executor.snapshot(),
+    }
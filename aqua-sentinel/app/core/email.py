@@ -6,6 +6,7 @@ from email.mime.multipart import MIMEMultipart
 from email.mime.base import MIMEBase
 from email import encoders
 from typing import List, Optional
+from functools import lru_cache
 import os
 from dotenv import load_dotenv
 
@@ -57,3 +58,19 @@ class EmailService:
             server.starttls()
             server.login(EMAIL_USERNAME, EMAIL_PASSWORD)
             server.send_message(msg)
+
+# Khởi tạo khi gửi email đầu tiên, không phải lúc import router
+@lru_cache(maxsize=1)
+def get_email_service() -> EmailService:
+    return EmailService()
+
+def send_email_background(**kwargs):
+    """
+    send_email for BackgroundTasks: the service is resolved inside the task, so missing
+    EMAIL_* settings or an SMTP error are logged instead of failing the request.
+    """
+    # Tài khoản / hồ đã được commit trước đó: lỗi gửi mail không được làm hỏng request
+    try:
+        get_email_service().send_email(**kwargs)
+    except Exception as e:
+        print(f"[ERROR] Failed to send email to {', '.join(kwargs.get('to', []))}: {e}")
@@ -0,0 +1,96 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+
+class QueueFull(Exception):
+    """Raised by BoundedExecutor.run when the bounded queue is full."""
+
+
+class BoundedExecutor:
+    """
+    Bounded thread pool for blocking work awaited from async handlers.
+
+    Handlers await run() instead of calling the blocking function on the event
+    loop, so other requests stay responsive while the pool is busy. At most
+    queue_max tasks may be queued or running; beyond that run() raises
+    `rejected` so the API can answer 503 instead of queueing without bound.
+    """
+
+    def __init__(self, workers: int, queue_max: int, name: str, rejected=QueueFull):
+        self.workers = workers
+        self.queue_max = queue_max
+        # Exception khi hàng đợi đầy: mỗi pool (inference, băm mật khẩu, ...) có thông báo 503 riêng
+        self.rejected = rejected
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix=name)
+        self._lock = threading.Lock()
+        self._queued = 0
+        self._running = 0
+
+        self.stats = {
+            "submitted": 0,
+            "rejected": 0,
+            "completed": 0,
+            "failed": 0,
+            "cancelled": 0,  # huỷ khi còn chờ trong hàng đợi
+            "wait_ms_total": 0.0,
+            "wait_ms_max": 0.0,
+            "run_ms_total": 0.0,
+        }
+
+    async def run(self, fn, *args):
+        """Run fn(*args) on the pool and return its result."""
+        with self._lock:
+            if self._queued + self._running >= self.queue_max:
+                self.stats["rejected"] += 1
+                raise self.rejected()
+            self._queued += 1
+            self.stats["submitted"] += 1
+
+        future = self._pool.submit(self._call, fn, args, time.perf_counter())
+        # Request bị huỷ khi tác vụ còn trong hàng đợi: _call không bao giờ chạy -> trả chỗ tại đây
+        future.add_done_callback(self._release_if_cancelled)
+        return await asyncio.wrap_future(future)
+
+    def _release_if_cancelled(self, future):
+        if future.cancelled():
+            with self._lock:
+                self._queued -= 1
+                self.stats["cancelled"] += 1
+
+    def _call(self, fn, args, submitted_at):
+        started = time.perf_counter()
+        with self._lock:
+            self._queued -= 1
+            self._running += 1
+            wait_ms = (started - submitted_at) * 1000
+            self.stats["wait_ms_total"] += wait_ms
+            self.stats["wait_ms_max"] = max(self.stats["wait_ms_max"], wait_ms)
+
+        ok = False
+        try:
+            result = fn(*args)
+            ok = True
+            return result
+        finally:
+            with self._lock:
+                self._running -= 1
+                self.stats["completed" if ok else "failed"] += 1
+                self.stats["run_ms_total"] += (time.perf_counter() - started) * 1000
+
+    def shutdown(self):
+        self._pool.shutdown(wait=True)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            done = (self.stats["completed"] + self.stats["failed"]) or 1
+            return {
+                "workers": self.workers,
+                "queue_max": self.queue_max,
+                "queue_depth": self._queued,
+                "running": self._running,
+                **self.stats,
+                "avg_wait_ms": self.stats["wait_ms_total"] / done,
+                "avg_run_ms": self.stats["run_ms_total"] / done,
+            }
@@ -3,6 +3,7 @@ from jose import jwt
 from passlib.context import CryptContext
 import os
 from dotenv import load_dotenv
+from app.core.executor import BoundedExecutor, QueueFull
 
 load_dotenv()
 
@@ -17,12 +18,33 @@ PWD_CONTEXT = CryptContext(
 
 ALGORITHM = os.getenv("ALGORITHM")
 
+# bcrypt (~250 ms mỗi lần ở 12 rounds, nhả GIL) chạy trong pool riêng: không chặn event loop,
+# không chiếm threadpool chung của các handler khác
+PASSWORD_WORKERS = int(os.getenv("PASSWORD_WORKERS", min(4, os.cpu_count() or 1)))
+# Số lần băm / kiểm tra tối đa đang chờ + đang chạy; vượt quá thì từ chối (503)
+PASSWORD_QUEUE_MAX = int(os.getenv("PASSWORD_QUEUE_MAX", 64))
+
+
+class PasswordQueueFull(QueueFull):
+    """Raised when too many password hashes / verifications are queued."""
+
+
+password_executor = BoundedExecutor(
+    PASSWORD_WORKERS, PASSWORD_QUEUE_MAX, name="password", rejected=PasswordQueueFull
+)
+
 def get_password_hash(password: str) -> str:
     return PWD_CONTEXT.hash(password)
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     return PWD_CONTEXT.verify(plain_password, hashed_password)
 
+async def hash_password_async(password: str) -> str:
+    return await password_executor.run(get_password_hash, password)
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    return await password_executor.run(verify_password, plain_password, hashed_password)
+
 def create_access_token(data: dict):
     to_encode = data.copy()
     expire = datetime.utcnow() + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
@@ -1,5 +1,25 @@
-import pandas as pd
+"""
+Sinh dữ liệu môi trường ao nuôi giả lập (5 phút / điểm).
+
+Mỗi bước thời gian cập nhật state machine + mô phỏng vật lý cho CẢ ĐÀN ao cùng
+lúc bằng mảng numpy (mỗi phần tử là một ao), nên 1000 ao tốn gần bằng 1 ao.
+
+- Một ao, ghi CSV như trước (aquaculture_v2.csv, dùng cho train_model.py):
+    python -m app.data.data_generation
+- Nhiều ao, ghi theo phân vùng (khối ao x khoảng thời gian), chạy song song:
+    python -m app.data.data_generation --ponds 5000 --out fleet/ --workers 8 --seed 42
+    --format parquet cần pyarrow; mặc định npy: mỗi phân vùng là thư mục <cột>.npy
+
+Kết quả chỉ phụ thuộc --seed và --block-ponds: mỗi khối ao có luồng số ngẫu nhiên
+riêng (SeedSequence(seed, spawn_key=(khối,))), không phụ thuộc số worker.
+"""
+import argparse
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
 import numpy as np
+import pandas as pd
 
 # =========================
 # CONFIG
@@ -14,127 +34,252 @@ STATE_RAIN = 1
 STATE_FEEDING = 2
 STATE_CRASH = 3 # Tảo tàn, oxy sập
 
+COLUMNS = [
+    "timestamp", "temperature", "dissolved_oxygen",
+    "ph", "turbidity", "ammonia", "rain_event", "feeding_event",
+    "state" # Trạng thái thật, dùng làm nhãn khi backtest
+]
+
+# Số ao mỗi khối (một luồng ngẫu nhiên, một tác vụ của worker)
+BLOCK_PONDS = 256
+# Số ngày mỗi phân vùng file (256 ao x 7 ngày ~ 2.6 triệu dòng)
+CHUNK_DAYS = 7
+# Số bước mỗi lần rút số ngẫu nhiên hàng loạt
+DRAW_STEPS = 288
+
 def sigmoid(x):
     return 1 / (1 + np.exp(-x))
 
-def generate_aquaculture_data():
-    time_index = pd.date_range(start=START_DATE, end=END_DATE, freq=FREQ)
-    data = []
-    
-    # Init values
-    temp = 28.0
-    do = 6.5
-    ph = 7.5
-    turbidity = 5.0
-    ammonia = 0.01
-    
-    current_state = STATE_NORMAL
-    state_duration = 0
-    
-    for t in time_index:
+
+class PondFleet:
+    """State machine + physics of n ponds, advanced one 5-minute step at a time (arrays of shape (n,))."""
+
+    def __init__(self, n, rng):
+        self.n = n
+        self.rng = rng
+
+        # Init values
+        self.temp = np.full(n, 28.0)
+        self.do = np.full(n, 6.5)
+        self.ph = np.full(n, 7.5)
+        self.turbidity = np.full(n, 5.0)
+        self.ammonia = np.full(n, 0.01)
+
+        self.state = np.full(n, STATE_NORMAL, dtype=np.int8)
+        self.duration = np.zeros(n, dtype=np.int64)
+        self._draws = None
+        self._draw_pos = DRAW_STEPS
+
+    def _draw(self):
+        # Rút trước số ngẫu nhiên cho DRAW_STEPS bước: ít lần gọi RNG hơn
+        if self._draw_pos == DRAW_STEPS:
+            shape = (DRAW_STEPS, self.n)
+            self._draws = (
+                self.rng.random(shape),
+                self.rng.integers(24, 48, shape),         # thời gian Crash
+                self.rng.integers(12, 36, shape),         # thời gian mưa
+                self.rng.standard_normal((DRAW_STEPS, 5, self.n)),
+            )
+            self._draw_pos = 0
+        i = self._draw_pos
+        self._draw_pos += 1
+        rand, crash_dur, rain_dur, noise = self._draws
+        return rand[i], crash_dur[i], rain_dur[i], noise[i]
+
+    def step(self, hour, minute, month):
+        rand, crash_dur, rain_dur, noise = self._draw()
+
         # 1. QUẢN LÝ TRẠNG THÁI (State Machine)
-        if state_duration > 0:
-            state_duration -= 1
-        else:
-            # Chuyển đổi trạng thái ngẫu nhiên nhưng có kịch bản
-            rand = np.random.rand()
-            if rand < 0.005: # 0.5% cơ hội bị Oxygen Crash (Nguy hiểm)
-                current_state = STATE_CRASH
-                state_duration = np.random.randint(24, 48) # Kéo dài 2-4 tiếng (12 steps/h)
-            elif rand < 0.05: # 5% cơ hội mưa
-                current_state = STATE_RAIN
-                state_duration = np.random.randint(12, 36)
-            elif t.hour in [7, 17] and t.minute == 0: # Giờ ăn
-                current_state = STATE_FEEDING
-                state_duration = 12 # 1 tiếng
-            else:
-                current_state = STATE_NORMAL
-                state_duration = 0
+        # Ao còn thời gian trạng thái thì giữ nguyên, ao hết thì chuyển ngẫu nhiên
+        idle = self.duration == 0
+        feeding_time = hour in (7, 17) and minute == 0 # Giờ ăn
+        new_state = np.where(
+            rand < 0.005, STATE_CRASH, # 0.5% cơ hội bị Oxygen Crash (Nguy hiểm)
+            np.where(rand < 0.05, STATE_RAIN, STATE_FEEDING if feeding_time else STATE_NORMAL) # 5% cơ hội mưa
+        )
+        new_duration = np.where(
+            rand < 0.005, crash_dur, # Kéo dài 2-4 tiếng (12 steps/h)
+            np.where(rand < 0.05, rain_dur, 12 if feeding_time else 0) # Ăn: 1 tiếng
+        )
+        self.state = np.where(idle, new_state, self.state).astype(np.int8)
+        self.duration = np.where(idle, new_duration, self.duration - 1)
+
+        crash = self.state == STATE_CRASH
+        rain = self.state == STATE_RAIN
+        feeding = self.state == STATE_FEEDING
 
         # 2. MÔ PHỎNG VẬT LÝ (PHYSICS SIMULATION)
-        
+
         # --- Temperature (Theo giờ + Mùa) ---
-        base_temp = 28 + 2 * np.sin(2 * np.pi * (t.month - 1) / 12) # Mùa
-        daily_fluct = 3 * np.sin(2 * np.pi * (t.hour - 6) / 24) # Ngày đêm
-        target_temp = base_temp + daily_fluct
-        
-        if current_state == STATE_RAIN:
-            target_temp -= 3.0 # Mưa làm lạnh
-            
+        base_temp = 28 + 2 * np.sin(2 * np.pi * (month - 1) / 12) # Mùa
+        daily_fluct = 3 * np.sin(2 * np.pi * (hour - 6) / 24) # Ngày đêm
+        target_temp = base_temp + daily_fluct - 3.0 * rain # Mưa làm lạnh
+
         # Di chuyển temp từ từ về target (quán tính nhiệt)
-        temp += 0.1 * (target_temp - temp) + np.random.normal(0, 0.1)
+        self.temp += 0.1 * (target_temp - self.temp) + 0.1 * noise[0]
 
         # --- Dissolved Oxygen (DO) ---
         # DO bão hòa phụ thuộc nghịch đảo với nhiệt độ
-        saturation_do = 14.6 - (0.3 * temp) 
-        
-        if current_state == STATE_CRASH:
-            # Crash: Oxy tụt không phanh (Exponential Decay)
-            target_do = 1.5 
-            do += 0.15 * (target_do - do) # Tụt rất nhanh
-        elif current_state == STATE_FEEDING:
-            target_do = saturation_do - 1.5 # Cá tập trung ăn -> Tốn oxy
-            do += 0.05 * (target_do - do)
-        else:
-            # Quang hợp ban ngày, hô hấp ban đêm
-            photosynthesis = 2.0 * np.sin(2 * np.pi * (t.hour - 6) / 24)
-            target_do = saturation_do + photosynthesis
-            do += 0.05 * (target_do - do) + np.random.normal(0, 0.1)
+        saturation_do = 14.6 - (0.3 * self.temp)
+        photosynthesis = 2.0 * np.sin(2 * np.pi * (hour - 6) / 24) # Quang hợp ban ngày, hô hấp ban đêm
+        self.do = np.where(
+            crash, self.do + 0.15 * (1.5 - self.do), # Crash: Oxy tụt không phanh
+            np.where(
+                feeding, self.do + 0.05 * (saturation_do - 1.5 - self.do), # Cá tập trung ăn -> Tốn oxy
+                self.do + 0.05 * (saturation_do + photosynthesis - self.do) + 0.1 * noise[1],
+            ),
+        )
 
         # --- pH ---
-        if current_state == STATE_CRASH:
-             target_ph = 5.5 # Axit hóa
-             ph += 0.1 * (target_ph - ph)
-        elif current_state == STATE_RAIN:
-            target_ph = 6.8 # Mưa axit nhẹ
-            ph += 0.05 * (target_ph - ph)
-        else:
-            # pH dao động nhẹ theo DO (CO2)
-            target_ph = 7.5 + 0.3 * (do - 6) / 10
-            ph += 0.02 * (target_ph - ph) + np.random.normal(0, 0.01)
+        self.ph = np.where(
+            crash, self.ph + 0.1 * (5.5 - self.ph), # Axit hóa
+            np.where(
+                rain, self.ph + 0.05 * (6.8 - self.ph), # Mưa axit nhẹ
+                # pH dao động nhẹ theo DO (CO2)
+                self.ph + 0.02 * (7.5 + 0.3 * (self.do - 6) / 10 - self.ph) + 0.01 * noise[2],
+            ),
+        )
 
         # --- Ammonia (NH3) ---
-        if current_state == STATE_FEEDING:
-            ammonia += 0.02 # Tăng nhanh khi ăn
-        elif current_state == STATE_CRASH:
-            ammonia += 0.01 # Xác tảo phân hủy
-        else:
-            # Lọc sinh học tự nhiên giảm NH3
-            ammonia *= 0.98 
-            
-        ammonia = max(0.0, ammonia + np.random.normal(0, 0.001))
+        self.ammonia = np.where(
+            feeding, self.ammonia + 0.02, # Tăng nhanh khi ăn
+            np.where(crash, self.ammonia + 0.01, self.ammonia * 0.98), # Xác tảo phân hủy / lọc sinh học
+        )
+        self.ammonia = np.maximum(0.0, self.ammonia + 0.001 * noise[3])
 
         # --- Turbidity ---
-        if current_state == STATE_RAIN:
-            turbidity += 5.0 # Mưa làm đục
-        elif current_state == STATE_CRASH:
-            turbidity += 2.0
-        else:
-            # Lắng đọng tự nhiên
-            turbidity = max(2.0, turbidity * 0.95)
-        
-        turbidity += np.random.normal(0, 0.2)
+        self.turbidity = np.where(
+            rain, self.turbidity + 5.0, # Mưa làm đục
+            np.where(crash, self.turbidity + 2.0, np.maximum(2.0, self.turbidity * 0.95)), # Lắng đọng tự nhiên
+        )
+        self.turbidity += 0.2 * noise[4]
 
         # Safety Clamps
-        do = max(0.1, do)
-        ph = np.clip(ph, 4.0, 10.0)
-        turbidity = max(1.0, min(turbidity, 500.0)) # Cap lại không cho lên vô cực
-        
-        data.append([
-            t, temp, do, ph, turbidity, ammonia,
-            1 if current_state == STATE_RAIN else 0,
-            1 if current_state == STATE_FEEDING else 0
-        ])
-        
-    df = pd.DataFrame(data, columns=[
-        "timestamp", "temperature", "dissolved_oxygen", 
-        "ph", "turbidity", "ammonia", "rain_event", "feeding_event"
-    ])
-    
+        self.do = np.maximum(0.1, self.do)
+        self.ph = np.clip(self.ph, 4.0, 10.0)
+        self.turbidity = np.clip(self.turbidity, 1.0, 500.0) # Cap lại không cho lên vô cực
+
+        return {
+            "temperature": self.temp, "dissolved_oxygen": self.do, "ph": self.ph,
+            "turbidity": self.turbidity, "ammonia": self.ammonia,
+            "rain_event": rain.astype(np.int8), "feeding_event": feeding.astype(np.int8),
+            "state": self.state,
+        }
+
+
+def simulate(n_ponds, time_index, rng, chunk_steps):
+    """Yield (timestamps, {column: (steps, n_ponds) array}) for consecutive chunks of time_index."""
+    fleet = PondFleet(n_ponds, rng)
+    hours = time_index.hour.to_numpy()
+    minutes = time_index.minute.to_numpy()
+    months = time_index.month.to_numpy()
+    for start in range(0, len(time_index), chunk_steps):
+        stop = min(start + chunk_steps, len(time_index))
+        columns = None
+        for i in range(start, stop):
+            values = fleet.step(hours[i], minutes[i], months[i])
+            if columns is None:
+                columns = {c: np.empty((stop - start, n_ponds), dtype=v.dtype) for c, v in values.items()}
+            for c, v in values.items():
+                columns[c][i - start] = v
+        yield time_index[start:stop], columns
+
+
+def _long_format(timestamps, pond_ids, columns):
+    # (bước, ao) -> một dòng mỗi (ao, thời điểm), các dòng của một ao liền nhau theo thời gian
+    steps = len(timestamps)
+    data = {
+        "timestamp": np.tile(timestamps.values, len(pond_ids)),
+        "pool_id": np.repeat(pond_ids, steps),
+    }
+    data.update({c: v.T.reshape(-1) for c, v in columns.items()})
+    return data
+
+
+def _write_partition(out_dir, name, data, fmt):
+    if fmt == "parquet":
+        pd.DataFrame(data).to_parquet(os.path.join(out_dir, f"{name}.parquet"), index=False)
+    else:
+        part_dir = os.path.join(out_dir, name)
+        os.makedirs(part_dir, exist_ok=True)
+        for column, values in data.items():
+            np.save(os.path.join(part_dir, f"{column}.npy"), values)
+
+
+def generate_block(block, n_ponds, out_dir, seed, start, end, fmt, chunk_days, block_ponds=BLOCK_PONDS):
+    """Simulate ponds [block * block_ponds, ...) and write one partition per chunk_days. Returns rows written."""
+    first = block * block_ponds
+    count = min(block_ponds, n_ponds - first)
+    rng = np.random.default_rng(np.random.SeedSequence(seed, spawn_key=(block,)))
+    time_index = pd.date_range(start=start, end=end, freq=FREQ)
+    pond_ids = np.arange(first, first + count, dtype=np.int32)
+
+    rows = 0
+    chunk_steps = chunk_days * 288
+    for chunk, (timestamps, columns) in enumerate(simulate(count, time_index, rng, chunk_steps)):
+        data = _long_format(timestamps, pond_ids, columns)
+        _write_partition(out_dir, f"part-b{block:05d}-t{chunk:04d}", data, fmt)
+        rows += len(data["timestamp"])
+    return rows
+
+
+def generate_fleet(n_ponds, out_dir, seed=0, start=START_DATE, end=END_DATE, fmt="npy",
+                   workers=1, chunk_days=CHUNK_DAYS, block_ponds=BLOCK_PONDS):
+    """Generate n_ponds ponds into partitions under out_dir, blocks of ponds spread over `workers` processes."""
+    if fmt == "parquet":
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            raise SystemExit("--format parquet needs pyarrow (pip install pyarrow) or use --format npy")
+    os.makedirs(out_dir, exist_ok=True)
+
+    blocks = range((n_ponds + block_ponds - 1) // block_ponds)
+    args = (n_ponds, out_dir, seed, start, end, fmt, chunk_days, block_ponds)
+    if workers <= 1:
+        return sum(generate_block(b, *args) for b in blocks)
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(generate_block, b, *args) for b in blocks]
+        return sum(f.result() for f in futures)
+
+
+def generate_aquaculture_data(seed=None, start=START_DATE, end=END_DATE, path="aquaculture_v2.csv"):
+    """One pond, one CSV (the file train_model.py reads by default)."""
+    time_index = pd.date_range(start=start, end=end, freq=FREQ)
+    parts = [
+        pd.DataFrame({"timestamp": timestamps, **{c: v[:, 0] for c, v in columns.items()}})
+        for timestamps, columns in simulate(1, time_index, np.random.default_rng(seed), len(time_index))
+    ]
+    df = pd.concat(parts, ignore_index=True)[COLUMNS]
+
     # Save
-    df.to_csv("aquaculture_v2.csv", index=False)
+    df.to_csv(path, index=False)
     print(f"Generated {len(df)} rows with Physics-based Logic.")
     return df
 
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Generate synthetic aquaculture sensor data")
+    parser.add_argument("--ponds", type=int, default=1, help="1: single CSV; > 1: partitions in --out")
+    parser.add_argument("--out", default="fleet", help="Output directory for --ponds > 1")
+    parser.add_argument("--format", choices=["npy", "parquet"], default="npy")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--start", default=START_DATE)
+    parser.add_argument("--end", default=END_DATE)
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--chunk-days", type=int, default=CHUNK_DAYS)
+    parser.add_argument("--block-ponds", type=int, default=BLOCK_PONDS)
+    return parser.parse_args()
+
+
 if __name__ == "__main__":
-    generate_aquaculture_data()
\ No newline at end of file
+    args = parse_args()
+    if args.ponds <= 1:
+        generate_aquaculture_data(seed=args.seed, start=args.start, end=args.end)
+    else:
+        started = time.perf_counter()
+        rows = generate_fleet(
+            args.ponds, args.out, seed=args.seed or 0, start=args.start, end=args.end, fmt=args.format,
+            workers=args.workers, chunk_days=args.chunk_days, block_ponds=args.block_ponds,
+        )
+        elapsed = time.perf_counter() - started
+        print(f"Generated {rows} rows for {args.ponds} ponds in {elapsed:.1f}s ({rows / elapsed:,.0f} rows/s)")
@@ -1,5 +1,6 @@
 import os
 from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker, declarative_base
 from dotenv import load_dotenv
 
@@ -11,15 +12,53 @@ HOST = os.getenv("host")
 PORT = os.getenv("port")
 DBNAME = os.getenv("dbname")
 
+# Pool kết nối (mỗi engine, mỗi process): tối đa DB_POOL_SIZE + DB_MAX_OVERFLOW kết nối
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", 5))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", 10))
+# Chờ tối đa N giây để lấy kết nối khi pool đã hết
+DB_POOL_TIMEOUT_S = float(os.getenv("DB_POOL_TIMEOUT_S", 30))
+# Đóng kết nối cũ hơn N giây (tránh bị server / proxy cắt ngầm); -1 = không giới hạn
+DB_POOL_RECYCLE_S = int(os.getenv("DB_POOL_RECYCLE_S", 1800))
+# Kiểm tra kết nối trước khi dùng (thêm một round-trip, bỏ được lỗi kết nối chết)
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "1") == "1"
+# Cache prepared statement của asyncpg mỗi kết nối; đặt 0 khi đi qua pgbouncer (transaction mode)
+DB_STATEMENT_CACHE_SIZE = int(os.getenv("DB_STATEMENT_CACHE_SIZE", 100))
+
 DATABASE_URL = f"postgresql+psycopg2://{USER}:{PASSWORD}@{HOST}:{PORT}/{DBNAME}?sslmode=require"
+ASYNC_DATABASE_URL = (
+    f"postgresql+asyncpg://{USER}:{PASSWORD}@{HOST}:{PORT}/{DBNAME}"
+    f"?prepared_statement_cache_size={DB_STATEMENT_CACHE_SIZE}"
+)
+
+POOL_OPTIONS = dict(
+    pool_size=DB_POOL_SIZE,
+    max_overflow=DB_MAX_OVERFLOW,
+    pool_timeout=DB_POOL_TIMEOUT_S,
+    pool_recycle=DB_POOL_RECYCLE_S,
+    pool_pre_ping=DB_POOL_PRE_PING,
+)
 
-engine = create_engine(DATABASE_URL)
+# Engine đồng bộ: script, ingest và luồng ghi nền (ingest_buffer)
+engine = create_engine(DATABASE_URL, **POOL_OPTIONS)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
+# Engine bất đồng bộ cho các handler async: chờ DB không chặn event loop
+async_engine = create_async_engine(
+    ASYNC_DATABASE_URL,
+    connect_args={"ssl": "require", "statement_cache_size": DB_STATEMENT_CACHE_SIZE},
+    **POOL_OPTIONS,
+)
+# expire_on_commit=False: đọc thuộc tính sau commit không phát sinh truy vấn ngầm
+AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
 def get_db():
     db = SessionLocal()
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
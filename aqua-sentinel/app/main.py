@@ -1,21 +1,72 @@
-from fastapi import FastAPI
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
 from app.api import predict
 from app.api import auth
 from app.api import pool_management
+from app.api import ingest
+from app.api import model_admin
+from app.db.connection import async_engine
+from app.core.security import PasswordQueueFull, password_executor
+from app.services.ingest_buffer import measurement_buffer
+from app.services.inference_executor import inference_executor, InferenceQueueFull
+from app.services.model_registry import model_registry
 import os
+import threading
 from dotenv import load_dotenv
 
 load_dotenv()
 
+# "background" (mặc định): nạp model trong nền, server nhận request ngay
+# "startup": chờ nạp xong model mới nhận request
+# "lazy": nạp ở lần dự đoán đầu tiên
+MODEL_PRELOAD = os.getenv("MODEL_PRELOAD", "background")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if MODEL_PRELOAD == "startup":
+        model_registry.load()
+    elif MODEL_PRELOAD == "background":
+        threading.Thread(target=model_registry.load, name="model-preload", daemon=True).start()
+    model_registry.start()
+    measurement_buffer.start()
+    yield
+    measurement_buffer.stop()
+    model_registry.stop()
+    inference_executor.shutdown()
+    password_executor.shutdown()
+    await async_engine.dispose()
+
 app = FastAPI(
     title="Aqua Sentinel AI",
     description="Hệ thống dự báo chất lượng nước và cảnh báo rủi ro nuôi trồng thủy sản",
-    version="2.0.0"
+    version="2.0.0",
+    lifespan=lifespan
 )
 
+# Hàng đợi inference đầy -> báo client gửi lại sau (backpressure)
+@app.exception_handler(InferenceQueueFull)
+async def inference_queue_full_handler(request: Request, exc: InferenceQueueFull):
+    return JSONResponse(
+        status_code=503,
+        content={"detail": "Hệ thống dự báo đang quá tải, vui lòng thử lại sau"},
+        headers={"Retry-After": "1"},
+    )
+
+# Quá nhiều đăng ký / đăng nhập cùng lúc (bcrypt) -> báo client gửi lại sau
+@app.exception_handler(PasswordQueueFull)
+async def password_queue_full_handler(request: Request, exc: PasswordQueueFull):
+    return JSONResponse(
+        status_code=503,
+        content={"detail": "Hệ thống đang bận xử lý đăng nhập, vui lòng thử lại sau"},
+        headers={"Retry-After": "1"},
+    )
+
 app.include_router(predict.router, prefix="/api")
 app.include_router(auth.router, prefix="/api")
 app.include_router(pool_management.router, prefix="/api/pool")
+app.include_router(ingest.router, prefix="/api")
+app.include_router(model_admin.router, prefix="/api")
 
 @app.get("/")
 async def root():
@@ -24,4 +75,4 @@ async def root():
 if __name__ == "__main__":
     import uvicorn
     port = int(os.environ.get("PORT_APP", 8000))
-    uvicorn.run("main:app", host="0.0.0.0", port=port)
\ No newline at end of file
+    uvicorn.run("main:app", host="0.0.0.0", port=port)
@@ -1,5 +1,5 @@
 import uuid
-from sqlalchemy import Column, String, Float, DateTime, ForeignKey, Text, text
+from sqlalchemy import Column, String, Float, DateTime, ForeignKey, Text, Index, text
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.orm import relationship
 from app.db.connection import Base
@@ -101,4 +101,9 @@ class WaterMeasurement(Base):
     )
     
     # Quan hệ ngược lại
-    pool = relationship("Pool", back_populates="measurements")
\ No newline at end of file
+    pool = relationship("Pool", back_populates="measurements")
+
+    # Lấy N điểm mới nhất của một hồ bằng một lần quét index
+    __table_args__ = (
+        Index("ix_water_measurement_pool_created", "pool_id", "created_at"),
+    )
\ No newline at end of file
@@ -0,0 +1,109 @@
+"""
+Pre-fork serving mode: load the models once in a parent process, then fork workers.
+
+`uvicorn --workers N` spawns fresh interpreters, so every worker loads all models
+again. Here the parent imports app.main, loads the active model version, binds the
+socket and forks WEB_WORKERS children that serve from the inherited memory (their
+startup preload is then a no-op); model pages stay shared copy-on-write.
+
+Chạy từ thư mục aqua-sentinel:
+    WEB_WORKERS=8 python -m app.prefork
+Đo RSS từng worker: python -m app.script.measure_worker_rss
+"""
+import gc
+import os
+import signal
+import socket
+import sys
+
+import uvicorn
+
+WEB_WORKERS = int(os.getenv("WEB_WORKERS", 4))
+# model_registry đọc số worker để bật watcher CURRENT mặc định (reload qua API tới mọi worker)
+os.environ.setdefault("WEB_WORKERS", str(WEB_WORKERS))
+HOST_APP = os.getenv("HOST_APP", "0.0.0.0")
+PORT_APP = int(os.getenv("PORT_APP", 8000))
+
+
+def _bind(host, port):
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+    return sock
+
+
+def _serve(app, sock):
+    # Kết nối DB không được dùng chung giữa các process
+    from app.db.connection import async_engine, engine
+    engine.dispose(close=False)
+    async_engine.sync_engine.dispose(close=False)
+
+    config = uvicorn.Config(app, lifespan="on")
+    uvicorn.Server(config).run(sockets=[sock])
+
+
+def main():
+    # Nạp model trong process cha. Không predict ở đây: thread pool của
+    # XGBoost/OpenMP đã khởi tạo trước khi fork có thể treo ở process con
+    from app.main import app
+    from app.services.model_registry import model_registry
+    model_registry.load()
+
+    sock = _bind(HOST_APP, PORT_APP)
+
+    # Đưa mọi object hiện có ra khỏi GC để việc quét GC ở worker không ghi
+    # vào các trang nhớ dùng chung (phá copy-on-write)
+    gc.freeze()
+
+    children = set()
+
+    def _spawn():
+        pid = os.fork()
+        if pid == 0:
+            signal.signal(signal.SIGINT, signal.SIG_DFL)
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            try:
+                _serve(app, sock)
+            finally:
+                os._exit(0)
+        children.add(pid)
+
+    for _ in range(WEB_WORKERS):
+        _spawn()
+    print(f"[prefork] serving on {HOST_APP}:{PORT_APP} with {WEB_WORKERS} workers (parent {os.getpid()})")
+
+    stopping = False
+
+    def _stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in children:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGINT, _stop)
+    signal.signal(signal.SIGTERM, _stop)
+
+    # Giám sát: worker chết bất thường thì fork lại từ process cha
+    while children:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        except InterruptedError:
+            continue
+        children.discard(pid)
+        if not stopping:
+            print(f"[prefork] worker {pid} exited ({status}), restarting")
+            _spawn()
+
+    sock.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,17 @@
+from pydantic import BaseModel
+from typing import List
+from uuid import UUID
+
+from app.schemas.schema_prediction import SensorPoint
+
+# Dữ liệu cảm biến gửi lên theo từng hồ
+class PoolReadings(BaseModel):
+    pool_id: UUID
+    readings: List[SensorPoint]
+
+class IngestRequest(BaseModel):
+    items: List[PoolReadings]
+
+class IngestResponse(BaseModel):
+    accepted: int
+    buffered: int
@@ -0,0 +1,11 @@
+from pydantic import BaseModel
+from typing import Optional
+
+# Nạp phiên bản model; bỏ trống version = phiên bản trong file CURRENT
+class ReloadRequest(BaseModel):
+    version: Optional[str] = None
+
+class ReloadResponse(BaseModel):
+    previous: Optional[str]
+    active: str
+    reload_ms: float
@@ -1,5 +1,6 @@
 from pydantic import BaseModel
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
+from uuid import UUID
 
 class SensorPoint(BaseModel):
     timestamp: str
@@ -12,8 +13,17 @@ class SensorPoint(BaseModel):
     feeding_event: int
 
 class PredictRequest(BaseModel):
-    species: str = "tom" 
-    history: List[SensorPoint]
+    pool_id: UUID
+    # Không còn dùng: loài lấy theo hồ trong DB (giữ để request cũ vẫn hợp lệ)
+    species: Optional[str] = None
+    # Bỏ trống -> dùng dữ liệu đã ingest trên server
+    history: Optional[List[SensorPoint]] = None
+
+# Dự báo + mức rủi ro ở một horizon xa hơn 5 phút
+class HorizonForecast(BaseModel):
+    prediction: Dict[str, float]
+    risk_level: str
+    details: List[str]
 
 class PredictResponse(BaseModel):
     species: str
@@ -21,4 +31,16 @@ class PredictResponse(BaseModel):
     prediction_next_5min: Dict[str, float]
     risk_level: str
     details: List[str]
-    thresholds: Dict[str, Any]
\ No newline at end of file
+    thresholds: Dict[str, Any]
+    # "15min", "30min", "60min": chỉ có khi bộ model được train với --horizons
+    forecast: Dict[str, HorizonForecast] = {}
+
+# Dự đoán theo lô: nhiều hồ trong một request
+class BatchPredictRequest(BaseModel):
+    items: List[PredictRequest]
+
+class PoolPredictResponse(PredictResponse):
+    pool_id: UUID
+
+class BatchPredictResponse(BaseModel):
+    results: List[PoolPredictResponse]
@@ -0,0 +1,361 @@
+"""
+Backtest offline: chạy model + RiskEngine trên toàn bộ chuỗi dữ liệu lịch sử
+(CSV hoặc thư mục phân vùng của data/data_generation.py) để đánh giá phiên bản model / ngưỡng mới trước
+khi triển khai.
+
+- Đặc trưng tính theo cột cho cả chunk (train_model.engineer_features), mỗi hồ riêng
+- Inference theo lô (PredictionService.predict_columns), rủi ro theo lô (RiskEngine.assess_batch)
+- Đọc CSV theo chunk, chỉ giữ vài dòng cuối mỗi hồ giữa các chunk -> dữ liệu nhiều
+  hồ / nhiều năm vẫn vừa bộ nhớ. Thư mục phân vùng (--ponds N --out DIR) được đọc
+  bằng train_model.read_data rồi xử lý theo chunk như CSV
+
+Báo cáo cho mỗi horizon:
+  - ma trận nhầm lẫn mức rủi ro: dự đoán vs mức tính từ giá trị thật tại t + horizon
+  - ma trận nhầm lẫn cảnh báo vs trạng thái CRASH thật tại t + horizon (cần cột `state`)
+và thời gian cảnh báo trước mỗi đợt CRASH, tốc độ xử lý.
+
+Chạy từ thư mục aqua-sentinel:
+    python -m app.script.backtest --data app/data/aquaculture_v2.csv
+    python -m app.script.backtest --data fleet/
+    python -m app.script.backtest --data ponds.csv --version 20250101-000000 --thresholds new.json
+new.json ghi đè một phần SPECIES_CONFIG, ví dụ {"tom": {"do_warning": 4.5}}
+"""
+import argparse
+import json
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+from app.script.train_model import DATA_PATH, engineer_features, read_data, target_cols, windows
+from app.services.model_registry import MODEL_DIR, ModelRegistry
+from app.services.prediction_service import STEP_MINUTES, PredictionService, split_horizons
+from app.services.risk_engine import LEVELS, RiskEngine
+
+# Giống data_generation.STATE_CRASH
+STATE_CRASH = 3
+
+# Số dòng quá khứ cần để tính đặc trưng của dòng đầu chunk
+CONTEXT_ROWS = max(windows)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Backtest models and risk thresholds on historical data")
+    parser.add_argument(
+        "--data", default=DATA_PATH,
+        help="CSV or partition directory (pool_id / species_id / state columns optional)"
+    )
+    parser.add_argument("--model-dir", default=MODEL_DIR, help="Registry root")
+    parser.add_argument("--version", default=None, help="Model version (default: CURRENT)")
+    parser.add_argument("--species", default="tom", help="Species when the CSV has no species_id column")
+    parser.add_argument("--thresholds", default=None, help="JSON overriding RiskEngine.SPECIES_CONFIG")
+    parser.add_argument(
+        "--alert-level", choices=LEVELS[1:], default="DANGER_ACTION_NEEDED",
+        help="Lowest predicted level that counts as an alert"
+    )
+    parser.add_argument("--lookback-min", type=int, default=60, help="Alerts this long before a crash count as early")
+    parser.add_argument("--chunk-rows", type=int, default=200_000)
+    parser.add_argument("--nthread", type=int, default=os.cpu_count(), help="XGBoost threads (offline: all cores)")
+    parser.add_argument("--json", default=None, help="Also write the report to this file")
+    return parser.parse_args()
+
+
+class EpisodeTracker:
+    """
+    CRASH episodes of one pool and the first alert for each, across chunks.
+    Lead time = episode start - first alert in [start - lookback, episode end]
+    (positive: warned before the crash began).
+    """
+
+    def __init__(self, lookback_min):
+        self.lookback = lookback_min
+        self.prev_crash = False
+        self.open_start = None
+        self.open_alert = None
+        self.recent_alerts = np.empty(0, dtype=np.int64)
+        self.leads = []  # phút, None = không có cảnh báo
+
+    def _first_alert(self, alerts, lo, hi):
+        i = np.searchsorted(alerts, lo)
+        return int(alerts[i]) if i < len(alerts) and alerts[i] <= hi else None
+
+    def update(self, ts, crash, alert):
+        """ts: minutes (int64), crash / alert: bool arrays of consecutive rows."""
+        if len(ts) == 0:
+            return
+        alerts = np.concatenate([self.recent_alerts, ts[alert]])
+        prev = np.concatenate([[self.prev_crash], crash[:-1]])
+        starts = np.flatnonzero(crash & ~prev)
+        ends = np.flatnonzero(crash & ~np.concatenate([crash[1:], [False]]))
+        last = len(ts) - 1
+
+        episodes = []
+        if self.open_start is not None:
+            if crash[0]:
+                episodes.append((self.open_start, self.open_alert, ends[0]))
+                ends = ends[1:]
+            else:
+                self.leads.append(self._lead(self.open_start, self.open_alert))
+        episodes += [(int(ts[s]), None, e) for s, e in zip(starts, ends)]
+
+        self.open_start = self.open_alert = None
+        for start, found, end in episodes:
+            if found is None:
+                found = self._first_alert(alerts, start - self.lookback, ts[end])
+            if end == last:
+                # Đợt CRASH còn tiếp ở chunk sau
+                self.open_start, self.open_alert = start, found
+            else:
+                self.leads.append(self._lead(start, found))
+
+        self.prev_crash = bool(crash[-1])
+        self.recent_alerts = alerts[alerts > ts[-1] - self.lookback]
+
+    @staticmethod
+    def _lead(start, found):
+        return None if found is None else start - found
+
+    def close(self):
+        if self.open_start is not None:
+            self.leads.append(self._lead(self.open_start, self.open_alert))
+            self.open_start = None
+
+
+class Backtest:
+    def __init__(self, service: PredictionService, engine: RiskEngine, args):
+        self.service = service
+        self.engine = engine
+        self.args = args
+        self.alert_code = LEVELS.index(args.alert_level)
+        self.feature_cols = service.feature_cols
+        self.horizons = service.horizons
+        self.max_steps = max(self.horizons) // STEP_MINUTES
+
+        self._carry = {}     # pool -> (DataFrame chưa xử lý xong, số dòng đầu đã đánh giá)
+        self._trackers = {}  # pool -> EpisodeTracker
+        self.has_state = None
+
+        self.rows = 0
+        self.timing = {"read": 0.0, "features": 0.0, "inference": 0.0, "risk": 0.0, "metrics": 0.0}
+        self.level_cm = {m: np.zeros((len(LEVELS), len(LEVELS)), dtype=np.int64) for m in self.horizons}
+        self.crash_cm = {m: np.zeros((2, 2), dtype=np.int64) for m in self.horizons}
+
+    # ---------- FEATURES ----------
+    def _pool_rows(self, pool, part):
+        """Feature rows of `pool` that can be evaluated now, with their future values."""
+        carry, done = self._carry.get(pool, (None, 0))
+        df = part if carry is None else pd.concat([carry, part], ignore_index=True)
+        df = df.reset_index(drop=True)
+
+        # Dòng chưa có đủ tương lai cho horizon dài nhất chờ chunk sau
+        end = max(done, len(df) - self.max_steps)
+        keep_from = max(0, end - CONTEXT_ROWS)
+        self._carry[pool] = (df.iloc[keep_from:], end - keep_from)
+        if end <= done:
+            return None
+
+        feats = engineer_features(df.copy())
+        rows = slice(done, end)
+        out = {"X": feats[self.feature_cols].to_numpy(np.float64)[rows]}
+        for minutes in self.horizons:
+            steps = minutes // STEP_MINUTES
+            out[minutes] = {c: df[c].to_numpy(np.float64)[done + steps:end + steps] for c in target_cols}
+            if self.has_state:
+                out[("state", minutes)] = df["state"].to_numpy()[done + steps:end + steps]
+        out["ts"] = df["timestamp"].to_numpy("datetime64[m]").astype(np.int64)[rows]
+        out["state"] = df["state"].to_numpy()[rows] if self.has_state else None
+        out["species"] = (
+            df["species_id"].to_numpy()[rows] if "species_id" in df.columns
+            else np.full(end - done, self.args.species)
+        )
+
+        # Đầu chuỗi của hồ chưa đủ 12 điểm
+        valid = ~np.isnan(out["X"]).any(axis=1)
+        if not valid.all():
+            out = {k: _mask(v, valid) for k, v in out.items()}
+        return out
+
+    # ---------- CHUNK ----------
+    def process(self, chunk):
+        if self.has_state is None:
+            self.has_state = "state" in chunk.columns
+
+        started = time.perf_counter()
+        groups = chunk.groupby("pool_id", sort=False) if "pool_id" in chunk.columns else [(None, chunk)]
+        parts = []
+        for pool, part in groups:
+            rows = self._pool_rows(pool, part)
+            if rows is not None and len(rows["X"]):
+                parts.append((pool, rows))
+        self.timing["features"] += time.perf_counter() - started
+        if not parts:
+            return
+
+        X = np.concatenate([rows["X"] for _, rows in parts])
+        species = np.concatenate([rows["species"] for _, rows in parts])
+
+        started = time.perf_counter()
+        preds = split_horizons(self.service.predict_columns(X))
+        self.timing["inference"] += time.perf_counter() - started
+
+        started = time.perf_counter()
+        current = {c: X[:, self.feature_cols.index(c)] for c in ("dissolved_oxygen", "temperature")}
+        codes = self.engine.species_codes(species)
+        predicted, actual = {}, {}
+        for minutes in self.horizons:
+            future = {c: np.concatenate([rows[minutes][c] for _, rows in parts]) for c in target_cols}
+            predicted[minutes] = self.engine.assess_batch(preds[minutes], current, codes).level_codes
+            actual[minutes] = self.engine.assess_batch(future, current, codes).level_codes
+        self.timing["risk"] += time.perf_counter() - started
+
+        started = time.perf_counter()
+        alert_any = np.zeros(len(X), dtype=bool)
+        for minutes in self.horizons:
+            np.add.at(self.level_cm[minutes], (actual[minutes], predicted[minutes]), 1)
+            alert = predicted[minutes] >= self.alert_code
+            alert_any |= alert
+            if self.has_state:
+                crash = np.concatenate([rows[("state", minutes)] for _, rows in parts]) == STATE_CRASH
+                np.add.at(self.crash_cm[minutes], (crash.astype(np.intp), alert.astype(np.intp)), 1)
+
+        if self.has_state:
+            offset = 0
+            for pool, rows in parts:
+                n = len(rows["X"])
+                tracker = self._trackers.setdefault(pool, EpisodeTracker(self.args.lookback_min))
+                tracker.update(rows["ts"], rows["state"] == STATE_CRASH, alert_any[offset:offset + n])
+                offset += n
+        self.timing["metrics"] += time.perf_counter() - started
+        self.rows += len(X)
+
+    # ---------- REPORT ----------
+    def report(self, total_s):
+        for tracker in self._trackers.values():
+            tracker.close()
+        leads = [lead for t in self._trackers.values() for lead in t.leads]
+        detected = np.array([lead for lead in leads if lead is not None], dtype=np.float64)
+
+        horizons = {}
+        for minutes in self.horizons:
+            entry = {"risk_levels": _confusion(self.level_cm[minutes], LEVELS)}
+            if self.has_state:
+                entry["crash_alerts"] = _confusion(self.crash_cm[minutes], ("no_crash", "crash"), ("no_alert", "alert"))
+            horizons[f"{minutes}min"] = entry
+
+        return {
+            "model_version": self.service.version,
+            "alert_level": self.args.alert_level,
+            "rows": self.rows,
+            "pools": len(self._carry),
+            "horizons": horizons,
+            "crash_episodes": {
+                "episodes": len(leads),
+                "detected": len(detected),
+                "detection_rate": len(detected) / len(leads) if leads else None,
+                "warned_before_onset": int((detected > 0).sum()),
+                "lead_min_median": float(np.median(detected)) if len(detected) else None,
+                "lead_min_mean": float(detected.mean()) if len(detected) else None,
+                "lead_min_p10": float(np.percentile(detected, 10)) if len(detected) else None,
+            } if self.has_state else None,
+            "timing_s": {**self.timing, "total": total_s},
+            "rows_per_s": self.rows / total_s if total_s else None,
+        }
+
+
+def _mask(value, valid):
+    if isinstance(value, dict):
+        return {k: v[valid] for k, v in value.items()}
+    return None if value is None else value[valid]
+
+
+def _confusion(cm, labels, predicted_labels=None):
+    """Rows: truth, columns: prediction, plus precision / recall of each predicted class."""
+    predicted_labels = predicted_labels or labels
+    col_sum, row_sum = cm.sum(axis=0), cm.sum(axis=1)
+    return {
+        "labels": {"truth": list(labels), "predicted": list(predicted_labels)},
+        "matrix": cm.tolist(),
+        "precision": [float(cm[i, i] / col_sum[i]) if col_sum[i] else None for i in range(len(labels))],
+        "recall": [float(cm[i, i] / row_sum[i]) if row_sum[i] else None for i in range(len(labels))],
+    }
+
+
+def _print_matrix(title, entry):
+    labels, predicted = entry["labels"]["truth"], entry["labels"]["predicted"]
+    width = max(len(l) for l in labels + predicted) + 2
+    print(f"  {title} (rows: truth, columns: predicted)")
+    print(" " * (width + 2) + "".join(f"{l:>{width}}" for l in predicted) + f"{'recall':>{width}}")
+    for label, row, recall in zip(labels, entry["matrix"], entry["recall"]):
+        recall = f"{recall:.3f}" if recall is not None else "-"
+        print(f"  {label:<{width}}" + "".join(f"{v:>{width}}" for v in row) + f"{recall:>{width}}")
+    precision = "".join(f"{p:>{width}.3f}" if p is not None else f"{'-':>{width}}" for p in entry["precision"])
+    print(f"  {'precision':<{width}}" + precision)
+
+
+def print_report(report):
+    print(f"\nModel {report['model_version']}: {report['rows']} rows, {report['pools']} pool(s), "
+          f"alert = predicted level >= {report['alert_level']}")
+    for name, entry in report["horizons"].items():
+        print(f"\n[{name}]")
+        _print_matrix("Risk level", entry["risk_levels"])
+        if "crash_alerts" in entry:
+            _print_matrix("Alert vs CRASH", entry["crash_alerts"])
+
+    episodes = report["crash_episodes"]
+    if episodes:
+        print(f"\nCRASH episodes: {episodes['episodes']}, detected {episodes['detected']}, "
+              f"{episodes['warned_before_onset']} warned before onset")
+        if episodes["detected"]:
+            print(f"Lead time (min, + = before onset): median {episodes['lead_min_median']:.0f}, "
+                  f"mean {episodes['lead_min_mean']:.1f}, p10 {episodes['lead_min_p10']:.0f}")
+    else:
+        print("\nNo `state` column: crash matrices and lead time skipped")
+
+    timing = report["timing_s"]
+    print("\nTime (s): " + ", ".join(f"{k} {v:.2f}" for k, v in timing.items()))
+    print(f"Throughput: {report['rows_per_s']:,.0f} rows/s")
+
+
+def read_chunks(path, chunk_rows):
+    """DataFrames of at most chunk_rows rows, each pool's rows in time order across chunks."""
+    if os.path.isfile(path):
+        yield from pd.read_csv(path, chunksize=chunk_rows, parse_dates=["timestamp"])
+        return
+    # Phân vùng chia theo khối hồ x khoảng thời gian: read_data gom lại theo (hồ, thời gian)
+    df = read_data(path)
+    for start in range(0, len(df), chunk_rows):
+        yield df.iloc[start:start + chunk_rows]
+
+
+def main():
+    args = parse_args()
+
+    registry = ModelRegistry(args.model_dir)
+    version = args.version or registry.current_version()
+    service = PredictionService(model_dir=registry.version_dir(version), version=version, nthread=args.nthread)
+
+    engine = RiskEngine()
+    if args.thresholds:
+        with open(args.thresholds) as f:
+            for species, overrides in json.load(f).items():
+                base = engine.SPECIES_CONFIG.get(species, engine.SPECIES_CONFIG["tom"])
+                engine.SPECIES_CONFIG[species] = {**base, **overrides}
+
+    backtest = Backtest(service, engine, args)
+    started = time.perf_counter()
+    read_started = started
+    for chunk in read_chunks(args.data, args.chunk_rows):
+        backtest.timing["read"] += time.perf_counter() - read_started
+        backtest.process(chunk)
+        read_started = time.perf_counter()
+
+    report = backtest.report(time.perf_counter() - started)
+    print_report(report)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,163 @@
+"""
+Đo thông lượng /signup và /login khi nhiều request chạy cùng lúc, kèm độ trễ của
+một request nhẹ (GET /) gửi liên tục trong lúc đó: nếu bcrypt hay SMTP chặn event
+loop thì GET / chậm theo.
+
+Server chạy ngay trong process này (uvicorn, cổng ngẫu nhiên) với DB là một file
+SQLite tạm (aiosqlite). Gửi mail được thay bằng một lần chờ --smtp-ms để mô phỏng
+SMTP mà không gửi thật. Cần thêm: pip install aiosqlite
+
+Chạy từ thư mục aqua-sentinel:
+    python -m app.script.bench_auth
+    PASSWORD_WORKERS=4 python -m app.script.bench_auth --users 64 --concurrency 1 16 64
+"""
+import argparse
+import asyncio
+import os
+import socket
+import tempfile
+import threading
+import time
+
+import httpx
+import numpy as np
+import uvicorn
+
+# Không nạp model: chỉ đo phần xác thực
+os.environ.setdefault("MODEL_PRELOAD", "lazy")
+
+
+class SlowEmailService:
+    """Stands in for the SMTP sender: waits like a Gmail STARTTLS round trip, sends nothing."""
+
+    def __init__(self, delay_s):
+        self.delay_s = delay_s
+        self.sent = 0
+
+    def send_email(self, **kwargs):
+        time.sleep(self.delay_s)
+        self.sent += 1
+
+
+def make_app(db_path, email_service):
+    from sqlalchemy import DefaultClause, create_engine, text
+    from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+    import app.core.email as email
+    from app.db.connection import Base, get_async_db
+    from app.main import app
+
+    engine = create_engine(f"sqlite:///{db_path}")
+    # now() AT TIME ZONE 'utc' chỉ có ở PostgreSQL
+    for table in Base.metadata.tables.values():
+        for column in table.columns:
+            if column.server_default is not None:
+                column.server_default = DefaultClause(text("CURRENT_TIMESTAMP"))
+            column.onupdate = None
+    Base.metadata.create_all(engine)
+
+    Session = async_sessionmaker(
+        create_async_engine(f"sqlite+aiosqlite:///{db_path}"), autoflush=False, expire_on_commit=False
+    )
+
+    async def _get_async_db():
+        async with Session() as session:
+            yield session
+
+    app.dependency_overrides[get_async_db] = _get_async_db
+    email.get_email_service = lambda: email_service
+    return app
+
+
+def start_server(app):
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    # Không có TCP_NODELAY, header và body gửi riêng bị Nagle + delayed ACK giữ ~40 ms
+    sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    sock.bind(("127.0.0.1", 0))
+    server = uvicorn.Server(uvicorn.Config(app, log_level="warning", lifespan="on"))
+    thread = threading.Thread(target=server.run, kwargs={"sockets": [sock]}, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.05)
+    return server, thread, f"http://127.0.0.1:{sock.getsockname()[1]}"
+
+
+async def probe(client, stop, latencies):
+    while not stop.is_set():
+        started = time.perf_counter()
+        await client.get("/")
+        latencies.append((time.perf_counter() - started) * 1000)
+        await asyncio.sleep(0.01)
+
+
+async def burst(client, requests, concurrency):
+    """Send all requests with at most `concurrency` in flight; (wall s, latencies ms, errors, probe ms)."""
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies, errors, probe_ms = [], 0, []
+
+    async def one(method, url, kwargs):
+        nonlocal errors
+        async with semaphore:
+            started = time.perf_counter()
+            response = await client.request(method, url, **kwargs)
+            latencies.append((time.perf_counter() - started) * 1000)
+            errors += response.status_code >= 400
+
+    stop = asyncio.Event()
+    prober = asyncio.create_task(probe(client, stop, probe_ms))
+    started = time.perf_counter()
+    await asyncio.gather(*(one(*r) for r in requests))
+    wall = time.perf_counter() - started
+    stop.set()
+    await prober
+    return wall, latencies, errors, probe_ms
+
+
+async def run(base_url, args):
+    limits = httpx.Limits(max_connections=max(args.concurrency) + 2)
+    async with httpx.AsyncClient(base_url=base_url, timeout=120, limits=limits) as client:
+        print(f"{'phase':<8} {'conc':>5} {'req/s':>8} {'p50 ms':>9} {'p99 ms':>9} {'errors':>7} "
+              f"{'GET / p50':>10} {'GET / p99':>10}")
+        for concurrency in args.concurrency:
+            users = [f"bench-{concurrency}-{i}@example.com" for i in range(args.users)]
+            phases = {
+                "signup": [
+                    ("POST", "/api/signup", {"json": {"email": u, "fullname": "Bench", "password": "bench-pass"}})
+                    for u in users
+                ],
+                "login": [
+                    ("POST", "/api/login", {"data": {"username": u, "password": "bench-pass"}})
+                    for u in users
+                ],
+            }
+            for phase, requests in phases.items():
+                wall, latencies, errors, probe_ms = await burst(client, requests, concurrency)
+                print(f"{phase:<8} {concurrency:>5} {len(requests) / wall:>8.1f} "
+                      f"{np.percentile(latencies, 50):>9.1f} {np.percentile(latencies, 99):>9.1f} {errors:>7} "
+                      f"{np.percentile(probe_ms, 50):>10.1f} {np.percentile(probe_ms, 99):>10.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=16, help="Signups (then logins) per concurrency level")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8])
+    parser.add_argument("--smtp-ms", type=float, default=300, help="Simulated welcome email send time")
+    args = parser.parse_args()
+
+    from app.core.security import PASSWORD_WORKERS, PWD_CONTEXT
+
+    db_path = os.path.join(tempfile.mkdtemp(), "bench-auth.db")
+    email_service = SlowEmailService(args.smtp_ms / 1000)
+    server, thread, base_url = start_server(make_app(db_path, email_service))
+    print(f"PASSWORD_WORKERS={PASSWORD_WORKERS}  bcrypt rounds={PWD_CONTEXT.to_dict()['bcrypt__rounds']}  "
+          f"cpus={os.cpu_count()}  smtp={args.smtp_ms:.0f} ms")
+    try:
+        asyncio.run(run(base_url, args))
+    finally:
+        server.should_exit = True
+        thread.join(timeout=30)
+        os.remove(db_path)
+    print(f"Welcome emails delivered in background: {email_service.sent}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""
+So sánh XGBoost gốc với TreeEnsembleEngine (NumPy): sai số và độ trễ theo kích thước lô.
+
+Chạy từ thư mục aqua-sentinel:
+    python -m app.script.bench_inference
+    python -m app.script.bench_inference --model-dir <thư mục model khác>
+"""
+import argparse
+import time
+
+import numpy as np
+
+from app.script.check_feature_parity import make_series, to_history
+from app.services.feature_engine import engineer_batch
+from app.services.model_registry import resolve_model_dir
+from app.services.prediction_service import PredictionService
+from app.services.tree_engine import TreeEnsembleEngine
+
+BATCH_SIZES = [1, 8, 64, 512, 4096]
+TOLERANCE = 1e-4
+
+
+def timed(fn, repeat):
+    fn()  # warm up
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--model-dir", default=None, help="Default: version in models_storage/CURRENT")
+    args = parser.parse_args()
+    args.model_dir = args.model_dir or resolve_model_dir()
+
+    service = PredictionService(model_dir=args.model_dir, inference_engine="xgboost")
+    layout = "multi-output" if service.fused_model is not None else "per-target"
+    print(f"Layout: {layout} ({', '.join(service.output_names)})")
+
+    start = time.perf_counter()
+    if service.fused_model is not None:
+        engine = TreeEnsembleEngine.from_multi_output(service.fused_model, len(service.output_names))
+    else:
+        engine = TreeEnsembleEngine.from_models(service.models, service.output_names)
+    print(f"Compiled {engine.n_trees} trees (depth {engine.depth}) in "
+          f"{(time.perf_counter() - start) * 1000:.0f} ms")
+
+    df = make_series(n=max(BATCH_SIZES) + 20)
+    histories = [to_history(df.iloc[i:i + 16]) for i in range(max(BATCH_SIZES))]
+    X = engineer_batch(histories, service.feature_cols)
+
+    def xgb_predict(rows):
+        out = service._infer(rows)
+        return np.column_stack([out[name] for name in service.output_names])
+
+    max_err = np.abs(xgb_predict(X) - engine.predict(X)).max()
+    print(f"[{'PASS' if max_err < TOLERANCE else 'FAIL'}] max |xgboost - numpy| = {max_err:.2e}")
+
+    print(f"\n{'rows':>6} | {'xgboost ms':>11} | {'numpy ms':>9} | speedup")
+    for n in BATCH_SIZES:
+        rows = X[:n]
+        repeat = max(3, 2000 // n)
+        t_xgb = timed(lambda: xgb_predict(rows), repeat)
+        t_np = timed(lambda: engine.predict(rows), repeat)
+        print(f"{n:>6} | {t_xgb:>11.3f} | {t_np:>9.3f} | {t_xgb / t_np:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
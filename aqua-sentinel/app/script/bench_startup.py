@@ -0,0 +1,131 @@
+"""
+Đo thời gian khởi động: từ `import app.main` đến khi /predict đầu tiên trả kết quả.
+
+Mỗi lần đo chạy trong một interpreter mới. DB được thay bằng một file SQLite tạm
+(tạo sau khi import, không tính vào thời gian; handler đọc qua aiosqlite) và bỏ qua
+bước đăng nhập, để chỉ đo phần của server: import, startup (lifespan) và request
+/predict đầu tiên. Cần thêm: pip install aiosqlite
+
+Chạy từ thư mục aqua-sentinel:
+    python -m app.script.bench_startup
+    python -m app.script.bench_startup --runs 5 --preload lazy background startup
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+RUN_ID = "AQUA_BENCH_STARTUP_CHILD"
+
+
+def _child(history_path):
+    start = time.perf_counter()
+    from app.main import app
+    imported = time.perf_counter()
+
+    from fastapi.testclient import TestClient
+    from sqlalchemy import DefaultClause, create_engine, text
+    from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+    from sqlalchemy.orm import sessionmaker
+    from app.api.deps import get_current_user
+    from app.db.connection import Base, get_async_db
+    from app.models.models import AquaticSpecies, Pool, Region, User
+
+    db_path = os.path.join(os.path.dirname(history_path), f"bench-startup-{os.getpid()}.db")
+    engine = create_engine(f"sqlite:///{db_path}")
+    # now() AT TIME ZONE 'utc' chỉ có ở PostgreSQL
+    for table in Base.metadata.tables.values():
+        for column in table.columns:
+            if column.server_default is not None:
+                column.server_default = DefaultClause(text("CURRENT_TIMESTAMP"))
+            column.onupdate = None
+    Base.metadata.create_all(engine)
+    Session = sessionmaker(bind=engine, autoflush=False)
+
+    db = Session()
+    user = User(fullname="bench", email="bench@example.com", password="x")
+    region = Region(region_name="bench")
+    species = AquaticSpecies(species_id="tom", species_name="Tom")
+    db.add_all([user, region, species])
+    db.commit()
+    pool = Pool(pool_name="bench", owner_id=user.user_id, region_id=region.region_id, species_id="tom")
+    db.add(pool)
+    db.commit()
+
+    AsyncSession = async_sessionmaker(
+        create_async_engine(f"sqlite+aiosqlite:///{db_path}"), autoflush=False, expire_on_commit=False
+    )
+
+    async def _get_async_db():
+        async with AsyncSession() as session:
+            yield session
+
+    app.dependency_overrides[get_async_db] = _get_async_db
+    app.dependency_overrides[get_current_user] = lambda: user
+    with open(history_path) as f:
+        payload = {"pool_id": str(pool.pool_id), "species": "tom", "history": json.load(f)}
+    fixture = time.perf_counter() - imported
+
+    with TestClient(app) as client:
+        started = time.perf_counter()
+        response = client.post("/api/predict", json=payload)
+        served = time.perf_counter()
+        response.raise_for_status()
+        response = client.post("/api/predict", json=payload)
+        warm = (time.perf_counter() - served) * 1000
+
+    print(json.dumps({
+        "import_ms": (imported - start) * 1000,
+        "startup_ms": (started - imported - fixture) * 1000,
+        "first_predict_ms": (served - started) * 1000,
+        "total_ms": (served - start - fixture) * 1000,
+        "warm_predict_ms": warm,
+    }))
+    os.remove(db_path)
+
+
+def _history_file():
+    from app.script.check_feature_parity import make_series
+
+    df = make_series(15, seed=1)
+    df["timestamp"] = df["timestamp"].astype(str)
+    f = tempfile.NamedTemporaryFile("w", suffix=".json", delete=False)
+    json.dump(df.to_dict("records"), f, default=int)
+    f.close()
+    return f.name
+
+
+def main():
+    if os.environ.get(RUN_ID):
+        _child(sys.argv[1])
+        return
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--preload", nargs="+", default=["lazy", "background", "startup"])
+    args = parser.parse_args()
+
+    history_path = _history_file()
+    columns = ["import_ms", "startup_ms", "first_predict_ms", "total_ms", "warm_predict_ms"]
+    print(f"{'MODEL_PRELOAD':<14}" + "".join(f"{c:>18}" for c in columns) + "  (median)")
+    try:
+        for mode in args.preload:
+            env = {**os.environ, RUN_ID: "1", "MODEL_PRELOAD": mode}
+            runs = []
+            for _ in range(args.runs):
+                out = subprocess.run(
+                    [sys.executable, "-W", "ignore", "-m", "app.script.bench_startup", history_path],
+                    env=env, capture_output=True, text=True, check=True,
+                )
+                runs.append(json.loads(out.stdout.strip().splitlines()[-1]))
+            medians = [sorted(r[c] for r in runs)[len(runs) // 2] for c in columns]
+            print(f"{mode:<14}" + "".join(f"{m:>18.1f}" for m in medians))
+    finally:
+        os.remove(history_path)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+"""
+Kiểm tra đặc trưng giữa TRAIN và SERVER không bị lệch.
+
+So sánh từng bit:
+  1. script/train_model.py (pandas, cả chuỗi)  vs  RollingFeatureState (O(1) mỗi điểm)
+  2. PredictionService._engineer_features (pandas, history)  vs  feature_engine.latest_features
+  3. FEATURE_ENGINE=pandas  vs  FEATURE_ENGINE=numpy trên một lô history nhiều độ dài
+và thứ tự cột với features.json của phiên bản model đang dùng.
+
+Chạy từ thư mục aqua-sentinel:
+    python -m app.script.check_feature_parity
+"""
+import json
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+from app.script import train_model
+from app.services.feature_engine import (
+    TARGET_COLS, RollingFeatureState, latest_features, engineer_batch
+)
+from app.services.model_registry import resolve_model_dir
+from app.services.prediction_service import PredictionService
+from app.schemas.schema_prediction import SensorPoint
+
+N_STEPS = 3000
+HISTORY_LEN = 16
+
+
+def make_series(n=N_STEPS, seed=42):
+    """Chuỗi ngẫu nhiên có giá trị lặp lại / âm để phủ các nhánh đặc biệt của rolling mean."""
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame({
+        "timestamp": pd.date_range("2024-01-01", periods=n, freq="5min"),
+        "temperature": np.round(28 + np.cumsum(rng.normal(0, 0.1, n)), 2),
+        "dissolved_oxygen": np.round(6.5 + np.cumsum(rng.normal(0, 0.05, n)), 2),
+        "ph": np.round(7.5 + rng.normal(0, 0.05, n), 2),
+        "turbidity": np.round(np.abs(5 + np.cumsum(rng.normal(0, 0.2, n))), 2),
+        "ammonia": np.round(rng.normal(0.02, 0.03, n), 4),
+        "rain_event": (rng.random(n) < 0.05).astype(int),
+        "feeding_event": (rng.random(n) < 0.05).astype(int),
+    })
+    df.loc[100:130, "ph"] = 7.5  # cửa sổ toàn giá trị giống nhau
+    return df
+
+
+def same_bits(a, b):
+    return np.array_equal(
+        np.asarray(a, dtype=np.float64).view(np.int64),
+        np.asarray(b, dtype=np.float64).view(np.int64),
+    )
+
+
+def check_column_order(feature_cols):
+    features_path = os.path.join(resolve_model_dir(train_model.MODEL_DIR), "features.json")
+    if not os.path.isfile(features_path):
+        print(f"[SKIP] {features_path} not found")
+        return True
+    with open(features_path) as f:
+        saved = json.load(f)
+    ok = saved == feature_cols
+    print(f"[{'PASS' if ok else 'FAIL'}] features.json column order matches train_model.build_feature_cols()")
+    return ok
+
+
+def check_incremental(df, feature_cols):
+    expected = train_model.engineer_features(df.copy())
+    expected = expected[feature_cols].fillna(0).to_numpy(dtype=np.float64)
+
+    state = RollingFeatureState()
+    mismatches = 0
+    for i, row in enumerate(df.itertuples(index=False)):
+        state.update(
+            row.timestamp,
+            [getattr(row, c) for c in TARGET_COLS],
+            rain_event=row.rain_event,
+            feeding_event=row.feeding_event,
+        )
+        if not same_bits(state.vector(feature_cols), expected[i]):
+            mismatches += 1
+
+    ok = mismatches == 0
+    print(f"[{'PASS' if ok else 'FAIL'}] RollingFeatureState vs train_model.py: "
+          f"{mismatches}/{len(df)} rows differ")
+    return ok
+
+
+def to_history(window):
+    return [
+        SensorPoint(**{**r, "timestamp": str(r["timestamp"])})
+        for r in window.to_dict("records")
+    ]
+
+
+def check_history_path(df, feature_cols):
+    service = PredictionService.__new__(PredictionService)
+    mismatches = 0
+    checked = 0
+    for end in range(HISTORY_LEN, len(df), 37):
+        window = df.iloc[end - HISTORY_LEN:end]
+        history = to_history(window)
+        expected = service._engineer_features(history)
+        expected = np.array([expected[c].iloc[0] for c in feature_cols], dtype=np.float64)
+
+        last = window.iloc[-1]
+        got = latest_features(
+            window[TARGET_COLS].to_numpy(),
+            last["timestamp"],
+            rain_event=last["rain_event"],
+            feeding_event=last["feeding_event"],
+        )
+        got = np.array([got[c] for c in feature_cols], dtype=np.float64)
+
+        checked += 1
+        if not same_bits(got, expected):
+            mismatches += 1
+
+    ok = mismatches == 0
+    print(f"[{'PASS' if ok else 'FAIL'}] latest_features vs PredictionService._engineer_features: "
+          f"{mismatches}/{checked} windows differ")
+    return ok
+
+
+def check_batch_engine(df, feature_cols):
+    service = PredictionService(feature_engine="pandas", preload=False)
+    service.feature_cols = feature_cols
+    service._loaded = True  # chỉ cần feature_cols, không nạp model
+
+    rng = np.random.default_rng(7)
+    histories = []
+    for _ in range(200):
+        n = int(rng.integers(12, 30))
+        end = int(rng.integers(n, len(df)))
+        histories.append(to_history(df.iloc[end - n:end]))
+
+    expected = service.feature_matrix(histories)
+    got = engineer_batch(histories, feature_cols)
+
+    mismatches = int((~np.all(got.view(np.int64) == expected.view(np.int64), axis=1)).sum())
+    ok = mismatches == 0
+    print(f"[{'PASS' if ok else 'FAIL'}] engineer_batch (numpy) vs pandas engine: "
+          f"{mismatches}/{len(histories)} rows differ")
+    return ok
+
+
+if __name__ == "__main__":
+    feature_cols = train_model.build_feature_cols()
+    df = make_series()
+
+    results = [
+        check_column_order(feature_cols),
+        check_incremental(df, feature_cols),
+        check_history_path(df, feature_cols),
+        check_batch_engine(df, feature_cols),
+    ]
+    sys.exit(0 if all(results) else 1)
@@ -0,0 +1,91 @@
+"""
+Kiểm tra RiskEngine.assess_batch (numpy) cho kết quả giống hệt assess_risk.
+
+So sánh level, score, từng câu lý do và ngưỡng trên các dòng ngẫu nhiên của mọi
+loài (kể cả loài không có trong cấu hình, giá trị nằm đúng trên ngưỡng và thiếu
+nhiệt độ), rồi in thời gian của hai cách.
+
+Chạy từ thư mục aqua-sentinel:
+    python -m app.script.check_risk_parity
+    python -m app.script.check_risk_parity --rows 200000
+"""
+import argparse
+import sys
+import time
+
+import numpy as np
+
+from app.services.risk_engine import THRESHOLD_FIELDS, risk_engine
+
+
+def make_rows(n, seed=0):
+    rng = np.random.default_rng(seed)
+    species = np.array(list(risk_engine.SPECIES_CONFIG) + ["khong_ro"])[rng.integers(0, 7, n)]
+    prediction = {
+        "dissolved_oxygen": np.round(rng.uniform(0, 9, n), 2),
+        "ph": np.round(rng.uniform(5, 10, n), 2),
+        "ammonia": np.round(rng.uniform(0, 1.5, n), 4),
+        "temperature": np.round(rng.uniform(20, 38, n), 1),
+    }
+    current = {
+        "dissolved_oxygen": np.round(rng.uniform(0, 9, n), 2),
+        "temperature": np.round(rng.uniform(20, 38, n), 1),
+    }
+
+    # Một phần các dòng nằm đúng trên ngưỡng của loài để thử các phép so sánh < / >
+    edge = rng.random(n) < 0.2
+    for i in np.flatnonzero(edge):
+        cfg = risk_engine.SPECIES_CONFIG.get(species[i], risk_engine.SPECIES_CONFIG["tom"])
+        field = THRESHOLD_FIELDS[rng.integers(0, len(THRESHOLD_FIELDS))]
+        target = {"do": "dissolved_oxygen", "ph": "ph", "ammonia": "ammonia", "temp": "temperature"}
+        column = target[field.split("_")[0]]
+        if field == "temp_shock_delta":
+            prediction["temperature"][i] = current["temperature"][i] + cfg[field]
+        else:
+            prediction[column][i] = cfg[field]
+
+    # Thiếu nhiệt độ ở vài dòng
+    prediction["temperature"][rng.random(n) < 0.05] = np.nan
+    return prediction, current, species
+
+
+def row(values, i):
+    return {k: float(v[i]) for k, v in values.items() if not np.isnan(v[i])}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=50000)
+    args = parser.parse_args()
+
+    prediction, current, species = make_rows(args.rows)
+
+    started = time.perf_counter()
+    scalar = [
+        risk_engine.assess_risk(row(prediction, i), row(current, i), species[i])
+        for i in range(args.rows)
+    ]
+    scalar_s = time.perf_counter() - started
+
+    started = time.perf_counter()
+    batch = risk_engine.assess_batch(prediction, current, species)
+    levels = batch.levels
+    batch_s = time.perf_counter() - started
+
+    diff = [
+        i for i in range(args.rows)
+        if batch.to_dict(i) != scalar[i] or levels[i] != scalar[i]["level"]
+    ]
+    ok = not diff
+    print(f"[{'PASS' if ok else 'FAIL'}] assess_batch vs assess_risk: {len(diff)}/{args.rows} rows differ")
+    if diff:
+        i = diff[0]
+        print(f"  row {i}: scalar={scalar[i]}\n         batch={batch.to_dict(i)}")
+
+    print(f"assess_risk (loop): {scalar_s * 1000:.1f} ms   assess_batch (levels only): {batch_s * 1000:.1f} ms "
+          f"({scalar_s / batch_s:.0f}x)")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+"""
+Chuyển model cũ (xgb_*.pkl, features.pkl của joblib) sang định dạng gốc của XGBoost
+(xgb_*.ubj hoặc xgb_*.json) và features.json mà PredictionService ưu tiên nạp.
+Với --format json, INFERENCE_ENGINE=numpy dựng tree engine mà không cần import xgboost.
+
+Chạy từ thư mục aqua-sentinel:
+    python -m app.script.export_native_models
+    python -m app.script.export_native_models --model-dir <thư mục model> --format json --remove-pickles
+"""
+import argparse
+import glob
+import json
+import os
+
+import joblib
+import numpy as np
+from xgboost import XGBRegressor
+
+
+def export(model_dir, fmt="ubj", remove_pickles=False):
+    for pickle_path in sorted(glob.glob(os.path.join(model_dir, "xgb_*.pkl"))):
+        native_path = pickle_path[:-len(".pkl")] + f".{fmt}"
+        model = joblib.load(pickle_path)
+        model.save_model(native_path)
+
+        # Kiểm tra model nạp lại cho kết quả giống hệt
+        reloaded = XGBRegressor()
+        reloaded.load_model(native_path)
+        X = np.random.default_rng(0).normal(size=(64, model.n_features_in_))
+        if not np.array_equal(model.predict(X), reloaded.predict(X)):
+            raise RuntimeError(f"{native_path} does not reproduce {pickle_path}")
+
+        print(f"{os.path.basename(pickle_path)} -> {os.path.basename(native_path)}")
+        if remove_pickles:
+            os.remove(pickle_path)
+
+    features_pkl = os.path.join(model_dir, "features.pkl")
+    if os.path.isfile(features_pkl):
+        with open(os.path.join(model_dir, "features.json"), "w") as f:
+            json.dump(list(joblib.load(features_pkl)), f)
+        print("features.pkl -> features.json")
+        if remove_pickles:
+            os.remove(features_pkl)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--model-dir", default="./app/models_storage/")
+    parser.add_argument("--format", choices=["ubj", "json"], default="ubj")
+    parser.add_argument("--remove-pickles", action="store_true")
+    args = parser.parse_args()
+    export(args.model_dir, args.format, args.remove_pickles)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""
+Đo bộ nhớ mỗi worker khi có và không có chia sẻ model giữa các process.
+
+- separate: mỗi worker là interpreter mới tự nạp model (như `uvicorn --workers N`)
+- shared:   process cha nạp model rồi fork worker (như `python -m app.prefork`)
+
+RSS đếm cả trang nhớ dùng chung nên gần như bằng nhau ở hai chế độ; PSS (chia
+đều trang dùng chung cho các process) và USS (chỉ trang riêng) cho thấy khác biệt.
+Chỉ chạy trên Linux (đọc /proc/<pid>/smaps_rollup).
+
+Chạy từ thư mục aqua-sentinel:
+    python -m app.script.measure_worker_rss
+    python -m app.script.measure_worker_rss --workers 8 --model-dir <thư mục model>
+"""
+import argparse
+import gc
+import multiprocessing as mp
+
+import numpy as np
+
+from app.script.check_feature_parity import make_series, to_history
+from app.services.model_registry import resolve_model_dir
+
+_service = None
+
+
+def _read_memory(pid):
+    """RSS / PSS / USS in MB from /proc/<pid>/smaps_rollup."""
+    fields = {}
+    with open(f"/proc/{pid}/smaps_rollup") as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) == 3 and parts[2] == "kB":
+                fields[parts[0].rstrip(":")] = int(parts[1]) / 1024
+    return {
+        "rss": fields["Rss"],
+        "pss": fields["Pss"],
+        "uss": fields["Private_Clean"] + fields["Private_Dirty"],
+    }
+
+
+def _load(model_dir):
+    from app.services.prediction_service import PredictionService
+    return PredictionService(model_dir=model_dir)
+
+
+def _worker(model_dir, ready, done):
+    global _service
+    if _service is None:
+        _service = _load(model_dir)
+
+    # Một ít traffic giống worker thật trước khi đo
+    df = make_series(200, seed=1)
+    histories = [to_history(df.iloc[i:i + 15]) for i in range(0, 150, 5)]
+    for _ in range(3):
+        _service.predict_batch(histories)
+
+    ready.set()
+    done.wait()
+
+
+def measure(mode, workers, model_dir):
+    global _service
+    if mode == "shared":
+        _service = _load(model_dir)
+        gc.freeze()
+        ctx = mp.get_context("fork")
+    else:
+        _service = None
+        ctx = mp.get_context("spawn")
+
+    done = ctx.Event()
+    procs, events = [], []
+    for _ in range(workers):
+        ready = ctx.Event()
+        p = ctx.Process(target=_worker, args=(model_dir, ready, done))
+        p.start()
+        procs.append(p)
+        events.append(ready)
+
+    for ready in events:
+        ready.wait()
+    stats = [_read_memory(p.pid) for p in procs]
+
+    done.set()
+    for p in procs:
+        p.join()
+    if mode == "shared":
+        gc.unfreeze()
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--model-dir", default=None, help="Default: version in models_storage/CURRENT")
+    args = parser.parse_args()
+    args.model_dir = args.model_dir or resolve_model_dir()
+
+    print(f"{'mode':<10}{'RSS/worker':>12}{'PSS/worker':>12}{'USS/worker':>12}{'PSS total':>12}  (MB)")
+    for mode in ("separate", "shared"):
+        stats = measure(mode, args.workers, args.model_dir)
+        mean = {k: np.mean([s[k] for s in stats]) for k in ("rss", "pss", "uss")}
+        total_pss = sum(s["pss"] for s in stats)
+        print(f"{mode:<10}{mean['rss']:>12.1f}{mean['pss']:>12.1f}{mean['uss']:>12.1f}{total_pss:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,154 @@
+"""
+Nguồn dữ liệu train từ bảng water_measurement (train_model.py --source db).
+
+Bộ nhớ không phụ thuộc số tháng dữ liệu:
+  1. đọc bảng theo thứ tự (pool_id, created_at) qua server-side cursor, mỗi lần
+     fetch_rows dòng (index ix_water_measurement_pool_created)
+  2. tính đặc trưng + target cho từng đoạn của một hồ, chỉ giữ lại vài dòng cuối
+     của hồ đó làm ngữ cảnh cho đoạn sau
+  3. ghi ma trận ra đĩa theo từng phần (spool) <= spool_rows dòng
+  4. XGBoost đọc lại từng phần qua SpoolIter (xgboost.DataIter) và dựng
+     ExtMemQuantileDMatrix với các trang lưu trên đĩa
+Chỉ nhãn / trọng số (8 byte mỗi dòng) nằm trong RAM, do XGBoost giữ.
+"""
+import os
+
+import numpy as np
+import pandas as pd
+import xgboost
+from sqlalchemy import select
+
+from app.services.prediction_service import STEP_MINUTES
+
+FETCH_ROWS = 50_000
+SPOOL_ROWS = 500_000
+
+VALUE_COLUMNS = ["dissolved_oxygen", "ph", "ammonia", "turbidity", "temperature"]
+
+
+def stream_measurements(engine, since=None, until=None, fetch_rows=FETCH_ROWS):
+    """Yield DataFrames of readings ordered by (pool_id, timestamp), fetch_rows rows at a time."""
+    # Import tại chỗ: app.models kéo theo app.db.connection (cần biến môi trường DB),
+    # train từ CSV, backtest và report_variants không được phụ thuộc vào nó
+    from app.models.models import WaterMeasurement
+
+    m = WaterMeasurement
+    stmt = select(
+        m.pool_id, m.created_at.label("timestamp"),
+        m.dissolved_oxygen, m.ph, m.amonia.label("ammonia"), m.turbidity, m.temperature,
+    ).order_by(m.pool_id, m.created_at)
+    if since is not None:
+        stmt = stmt.where(m.created_at >= since)
+    if until is not None:
+        stmt = stmt.where(m.created_at < until)
+
+    with engine.connect() as conn:
+        # stream_results: psycopg2 dùng server-side cursor, không tải hết kết quả về client
+        result = conn.execution_options(stream_results=True, max_row_buffer=fetch_rows).execute(stmt)
+        for rows in result.partitions(fetch_rows):
+            df = pd.DataFrame(rows, columns=["pool_id", "timestamp"] + VALUE_COLUMNS)
+            # water_measurement không lưu cờ mưa / cho ăn -> mặc định 0 (như reading_store.warm)
+            df["rain_event"] = 0
+            df["feeding_event"] = 0
+            yield df.dropna(subset=VALUE_COLUMNS)
+
+
+class PoolFeatureStream:
+    """
+    Turns pool-ordered reading chunks into training matrices, one pool segment at
+    a time. Each pool keeps only `context_rows` rows (for the rolling windows)
+    plus the rows still waiting for their future target values.
+    """
+
+    def __init__(self, prepare, to_arrays, horizons, context_rows):
+        self.prepare = prepare          # train_model.prepare_pool
+        self.to_arrays = to_arrays      # train_model.build_arrays (đã gắn feature_cols / outputs)
+        self.horizons = horizons
+        self.context_rows = context_rows
+        self.max_steps = max(horizons) // STEP_MINUTES
+        self._pool = None
+        self._carry = None
+        self._done = 0
+
+    def feed(self, chunk):
+        """Yield arrays for every row of `chunk` (and earlier carry) that has features and targets."""
+        for pool, part in chunk.groupby("pool_id", sort=False):
+            if pool != self._pool:
+                # Hồ mới: các dòng cuối của hồ trước không có tương lai -> bỏ (như dropna khi train CSV)
+                self._pool, self._carry, self._done = pool, None, 0
+            df = part if self._carry is None else pd.concat([self._carry, part], ignore_index=True)
+            df = df.reset_index(drop=True)
+
+            end = max(self._done, len(df) - self.max_steps)
+            keep_from = max(0, end - self.context_rows)
+            done, self._carry, self._done = self._done, df.iloc[keep_from:], end - keep_from
+            if end <= done:
+                continue
+
+            ready = self.prepare(df.copy(), self.horizons).iloc[done:end].dropna()
+            if len(ready):
+                yield self.to_arrays(ready)
+
+
+def spool(batches, spool_dir, spool_rows=SPOOL_ROWS):
+    """Write batches of {X, Y, w} to spool_dir/part-NNNNN/*.npy of <= ~spool_rows rows. Returns (parts, rows)."""
+    os.makedirs(spool_dir, exist_ok=True)
+    parts, pending, pending_rows, total = [], [], 0, 0
+
+    def flush():
+        path = os.path.join(spool_dir, f"part-{len(parts):05d}")
+        os.makedirs(path, exist_ok=True)
+        for name in ("X", "Y", "w"):
+            np.save(os.path.join(path, f"{name}.npy"), np.concatenate([b[name] for b in pending]))
+        parts.append(path)
+
+    for batch in batches:
+        pending.append(batch)
+        pending_rows += len(batch["X"])
+        total += len(batch["X"])
+        if pending_rows >= spool_rows:
+            flush()
+            pending, pending_rows = [], 0
+    if pending:
+        flush()
+    return parts, total
+
+
+def load_part(path, name):
+    return np.load(os.path.join(path, f"{name}.npy"), mmap_mode="r")
+
+
+class SpoolIter(xgboost.DataIter):
+    """Feeds spooled parts to XGBoost one at a time; label: one Y column or all of them (None)."""
+
+    def __init__(self, parts, label=None, cache_prefix=None):
+        self.parts = parts
+        self.label = label
+        self._i = 0
+        # Các trang ExtMemQuantileDMatrix được ghi cạnh các phần spool
+        super().__init__(cache_prefix=cache_prefix or os.path.join(os.path.dirname(parts[0]), "xgb-cache"))
+
+    def next(self, input_data):
+        if self._i == len(self.parts):
+            return False
+        path = self.parts[self._i]
+        Y = load_part(path, "Y")
+        input_data(
+            data=load_part(path, "X"),
+            label=Y if self.label is None else Y[:, self.label],
+            weight=load_part(path, "w"),
+        )
+        self._i += 1
+        return True
+
+    def reset(self):
+        self._i = 0
+
+
+def label_column(parts, j):
+    """
+    Target column j for all spooled rows, or the whole 2-D label matrix for j=None
+    (multi-output), like train_label on in-memory data. XGBoost keeps labels in memory anyway.
+    """
+    # Y[:, None] thêm một trục (n, 1, n_targets) chứ không lấy mọi cột
+    return np.concatenate([load_part(path, "Y") if j is None else load_part(path, "Y")[:, j] for path in parts])
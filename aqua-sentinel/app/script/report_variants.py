@@ -0,0 +1,140 @@
+"""
+Báo cáo các biến thể model (train_model.py --variants): sai số trên tập kiểm tra
+so với độ trễ dự đoán 1 dòng và theo lô, để chọn MODEL_VARIANT cho từng tầng
+triển khai.
+
+Tập kiểm tra nên là dữ liệu không dùng khi train, ví dụ sinh bằng seed khác:
+    python -m app.data.data_generation --ponds 20 --seed 7 --out /tmp/val
+
+Chạy từ thư mục aqua-sentinel:
+    python -m app.script.report_variants --data /tmp/val
+    python -m app.script.report_variants --data /tmp/val --version 20250101-000000 --inference-engine numpy
+"""
+import argparse
+import json
+import os
+import time
+
+import numpy as np
+import xgboost
+
+from app.script.train_model import prepare_dataset, read_data
+from app.services.model_registry import ModelRegistry
+from app.services.prediction_service import MODEL_DIR, VARIANTS_DIR, PredictionService
+
+
+def count_trees(service):
+    """Trees evaluated per prediction row (all outputs)."""
+    total = 0
+    for name in service._model_names:
+        booster = xgboost.Booster(model_file=service._find_model_file(name))
+        rounds = booster.num_boosted_rounds()
+        total += rounds * (len(service.output_names) if name == "multi" else 1)
+    return total
+
+
+def latency_us(fn, rows, repeat):
+    """p50 / p99 microseconds of fn(one row) over `repeat` different rows."""
+    fn(rows[:1])  # warm up
+    samples = []
+    for i in range(repeat):
+        row = rows[i % len(rows)][None, :]
+        started = time.perf_counter()
+        fn(row)
+        samples.append((time.perf_counter() - started) * 1e6)
+    return np.percentile(samples, 50), np.percentile(samples, 99)
+
+
+def batch_ms(fn, rows, repeat):
+    fn(rows)  # warm up
+    started = time.perf_counter()
+    for _ in range(repeat):
+        fn(rows)
+    return (time.perf_counter() - started) / repeat * 1000
+
+
+def evaluate(service, df, args):
+    X = df[service.feature_cols].to_numpy(np.float64)
+    preds = service.predict_columns(X)
+    mae = {
+        name: float(np.abs(preds[name] - df[f"{name}_target"].to_numpy()).mean())
+        for name in service.output_names
+    }
+    single_p50, single_p99 = latency_us(service.predict_matrix, X, args.single_repeat)
+    batch = X[:args.batch_size]
+    ms = batch_ms(service.predict_matrix, batch, args.batch_repeat)
+    return {
+        "trees": count_trees(service),
+        "mae": mae,
+        "single_p50_us": single_p50,
+        "single_p99_us": single_p99,
+        "batch_ms": ms,
+        "batch_rows_s": len(batch) / ms * 1000,
+    }
+
+
+def print_report(report, outputs, args):
+    full = report["full"]["mae"]
+    print(f"Validation rows: {args.rows}   batch size: {args.batch_size}   engine: {args.inference_engine}")
+    print(f"\n{'variant':<10} | {'trees':>6} | {'MAE / full':>10} | {'worst':>6} | "
+          f"{'1 row p50 us':>12} | {'p99 us':>8} | {'batch ms':>9} | {'rows/s':>9}")
+    for name, r in report.items():
+        ratios = [r["mae"][o] / full[o] if full[o] else 1.0 for o in outputs]
+        print(f"{name:<10} | {r['trees']:>6} | {np.mean(ratios):>10.3f} | {max(ratios):>6.3f} | "
+              f"{r['single_p50_us']:>12.0f} | {r['single_p99_us']:>8.0f} | {r['batch_ms']:>9.2f} | "
+              f"{r['batch_rows_s']:>9.0f}")
+
+    print(f"\nMAE per output:\n{'variant':<10} | " + " | ".join(f"{o:>18}" for o in outputs))
+    for name, r in report.items():
+        print(f"{name:<10} | " + " | ".join(f"{r['mae'][o]:>18.4f}" for o in outputs))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--data", required=True, help="Validation CSV or partition directory (not the training data)")
+    parser.add_argument("--model-dir", default=MODEL_DIR, help="Registry root")
+    parser.add_argument("--version", default=None, help="Default: version in CURRENT")
+    parser.add_argument("--inference-engine", choices=["xgboost", "numpy"], default="xgboost")
+    parser.add_argument("--max-rows", type=int, default=20000, help="Validation rows used (0 = all)")
+    parser.add_argument("--batch-size", type=int, default=256)
+    parser.add_argument("--single-repeat", type=int, default=300)
+    parser.add_argument("--batch-repeat", type=int, default=20)
+    parser.add_argument("--json", default=None, help="Also write the report to this file")
+    args = parser.parse_args()
+
+    registry = ModelRegistry(args.model_dir)
+    version = args.version or registry.current_version()
+    version_dir = registry.version_dir(version)
+    variants_dir = os.path.join(version_dir, VARIANTS_DIR)
+    names = sorted(os.listdir(variants_dir)) if os.path.isdir(variants_dir) else []
+    if not names:
+        print(f"[WARN] {version} has no variants (train_model.py --variants); reporting the full models only")
+
+    services = {
+        name: PredictionService(
+            model_dir=version_dir, version=version, variant=None if name == "full" else name,
+            inference_engine=args.inference_engine,
+        )
+        for name in ["full"] + names
+    }
+    outputs = services["full"].output_names
+
+    df = prepare_dataset(read_data(args.data), services["full"].horizons)
+    if args.max_rows and len(df) > args.max_rows:
+        df = df.sample(args.max_rows, random_state=0).sort_index()
+    args.rows = len(df)
+
+    report = {}
+    for name, service in services.items():
+        print(f"Evaluating {name}...")
+        report[name] = evaluate(service, df, args)
+
+    print(f"\nModel version {version}")
+    print_report(report, outputs, args)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"version": version, "rows": args.rows, "variants": report}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,68 +1,592 @@
+import argparse
+import hashlib
+import inspect
+import json
 import pandas as pd
 import numpy as np
-from xgboost import XGBRegressor
-import joblib
+import xgboost
 import os
+import shutil
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime, timezone
 
-# CONFIG
-DATA_PATH = "../data/aquaculture_v2.csv"
-MODEL_DIR = "../models_storage"
-os.makedirs(MODEL_DIR, exist_ok=True)
+from app.script.measurement_source import (
+    FETCH_ROWS, SPOOL_ROWS, PoolFeatureStream, SpoolIter, label_column, load_part, spool, stream_measurements,
+)
+from app.services.model_registry import MANIFEST_FILE, VERSIONS_DIR, write_current
+from app.services.prediction_service import (
+    SEGMENTS_DIR, STEP_MINUTES, VARIANTS_DIR, horizon_output, segment_key,
+)
 
-# LOAD
-print("Loading data...")
-df = pd.read_csv(DATA_PATH)
-df["timestamp"] = pd.to_datetime(df["timestamp"])
+# CONFIG
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+DATA_PATH = os.path.join(SCRIPT_DIR, "../data/aquaculture_v2.csv")
+MODEL_DIR = os.path.join(SCRIPT_DIR, "../models_storage")
+# Ma trận đặc trưng đã tính: <cache>/<hash dữ liệu + spec>/{X,Y,w}.npy, đọc lại bằng memmap
+FEATURE_CACHE_DIR = os.path.join(SCRIPT_DIR, "../data/feature_cache")
 
 target_cols = ["dissolved_oxygen", "ph", "ammonia", "turbidity", "temperature"]
 
-# FEATURE ENGINEERING (SERVER & TRAIN PHẢI GIỐNG NHAU 100%)
-# Shift target (-1 step = 5 mins prediction)
-for col in target_cols:
-    df[f"{col}_target"] = df[col].shift(-1)
+XGB_PARAMS = dict(
+    n_estimators=500,
+    max_depth=6,
+    learning_rate=0.05,
+    objective="reg:squarederror",
+    n_jobs=-1
+)
+
+# --segment-by species / region / species,region -> cột trong CSV và tham số segment_key
+SEGMENT_COLUMNS = {"species": "species_id", "region": "region_id"}
+SEGMENT_ARGS = {"species": "species", "region": "region_id"}
+MIN_SEGMENT_ROWS = 5000
+
+# --variants: bộ model gọn cho tầng triển khai yếu (MODEL_VARIANT), ví dụ
+#   fast:trees=150             cắt 150 cây đầu của model đầy đủ (không train lại)
+#   small:trees=200,depth=4    train lại với cây nông hơn
+#   tiny:trees=100,depth=3,distill  học theo dự báo của model đầy đủ thay vì nhãn thật
+VARIANT_KEYS = ("trees", "depth", "distill")
 
 # Rolling windows (Quan trọng: window nhỏ để bắt trend nhanh)
-windows = [3, 12] 
-for col in target_cols:
-    for w in windows:
-        df[f"{col}_roll_mean_{w}"] = df[col].rolling(window=w).mean()
-        df[f"{col}_delta_{w}"] = df[col] - df[col].shift(w) # Trend
+windows = [3, 12]
+
 
-# Time info
-df["hour"] = df["timestamp"].dt.hour
-df["month"] = df["timestamp"].dt.month
+# FEATURE ENGINEERING (SERVER & TRAIN PHẢI GIỐNG NHAU 100%)
+# Kiểm tra bằng: python -m app.script.check_feature_parity
+def engineer_features(df):
+    for col in target_cols:
+        for w in windows:
+            df[f"{col}_roll_mean_{w}"] = df[col].rolling(window=w).mean()
+            df[f"{col}_delta_{w}"] = df[col] - df[col].shift(w) # Trend
+
+    # Time info
+    df["hour"] = df["timestamp"].dt.hour
+    df["month"] = df["timestamp"].dt.month
+    return df
 
-df = df.dropna()
 
 # FEATURES LIST
-feature_cols = ["rain_event", "feeding_event", "hour", "month"]
-for col in target_cols:
-    feature_cols.append(col) # Current Value
-    feature_cols.extend([f"{col}_roll_mean_3", f"{col}_roll_mean_12", 
-                         f"{col}_delta_3", f"{col}_delta_12"])
-
-# TRAIN LOOP
-X = df[feature_cols]
-weights = np.ones(len(X))
-# Tăng trọng số cho các mẫu nguy hiểm để model nhớ hơn
-weights[df["dissolved_oxygen"] < 3.5] = 10.0 
-weights[df["ammonia"] > 0.5] = 10.0
-
-for name in target_cols:
-    print(f"Training {name}...")
-    y = df[f"{name}_target"]
-    
-    model = XGBRegressor(
-        n_estimators=500,
-        max_depth=6,
-        learning_rate=0.05,
-        objective="reg:squarederror",
-        n_jobs=-1
+def build_feature_cols():
+    feature_cols = ["rain_event", "feeding_event", "hour", "month"]
+    for col in target_cols:
+        feature_cols.append(col) # Current Value
+        feature_cols.extend([f"{col}_roll_mean_3", f"{col}_roll_mean_12",
+                             f"{col}_delta_3", f"{col}_delta_12"])
+    return feature_cols
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Train Aqua Sentinel forecasting models")
+    parser.add_argument(
+        "--data", default=DATA_PATH,
+        help="CSV or partition directory (data_generation.py --ponds N --out DIR)"
+    )
+    parser.add_argument("--model-dir", default=MODEL_DIR, help="Registry root; models go to versions/<version>/")
+    parser.add_argument("--version", default=None, help="Version name (default: UTC timestamp)")
+    parser.add_argument(
+        "--no-activate", action="store_true",
+        help="Do not point CURRENT at the new version (activate later via /api/models/reload)"
+    )
+    parser.add_argument(
+        "--multi-output", action="store_true",
+        help="Train one multi-output model (xgb_multi.*) instead of one model per target"
     )
-    
-    model.fit(X, y, sample_weight=weights) # Apply weight
-    
-    joblib.dump(model, f"{MODEL_DIR}/xgb_{name}.pkl")
-    
-joblib.dump(feature_cols, f"{MODEL_DIR}/features.pkl")
-print("Training Done. Models saved in 'models_storage/' directory.")
\ No newline at end of file
+    parser.add_argument(
+        "--format", choices=["ubj", "json"], default="ubj",
+        help="Native XGBoost model format; json lets INFERENCE_ENGINE=numpy start without xgboost"
+    )
+    parser.add_argument(
+        "--segment-by", nargs="*", default=[], choices=["species", "region", "species,region"],
+        help="Also train specialised model sets per species and/or region (CSV needs species_id / region_id)"
+    )
+    parser.add_argument("--min-segment-rows", type=int, default=MIN_SEGMENT_ROWS)
+    parser.add_argument(
+        "--horizons", nargs="+", type=int, default=[STEP_MINUTES],
+        help="Forecast horizons in minutes (multiples of 5), e.g. 5 15 30 60; one direct model per target and horizon"
+    )
+    parser.add_argument("--cache-dir", default=FEATURE_CACHE_DIR)
+    parser.add_argument("--no-cache", action="store_true", help="Always recompute features, write no cache")
+    parser.add_argument("--threads", type=int, default=os.cpu_count(), help="Total XGBoost thread budget")
+    parser.add_argument(
+        "--parallel-targets", type=int, default=os.cpu_count(),
+        help="Per-target models trained at once (each gets threads / parallel-targets threads)"
+    )
+    parser.add_argument(
+        "--source", choices=["csv", "db"], default="csv",
+        help="csv: --data file/directory in memory; db: stream water_measurement through external memory"
+    )
+    parser.add_argument("--since", type=datetime.fromisoformat, default=None, help="db: first created_at (ISO)")
+    parser.add_argument("--until", type=datetime.fromisoformat, default=None, help="db: created_at before (ISO)")
+    parser.add_argument("--db-url", default=None, help="db: SQLAlchemy URL (default: app.db.connection engine)")
+    parser.add_argument("--fetch-rows", type=int, default=FETCH_ROWS, help="db: rows per server-side cursor fetch")
+    parser.add_argument("--spool-rows", type=int, default=SPOOL_ROWS, help="db: rows per on-disk matrix part")
+    parser.add_argument(
+        "--variants", nargs="*", type=parse_variant, default=[],
+        help="Compact variants NAME:trees=N[,depth=D][,distill] in variants/NAME/ of every model set"
+    )
+    args = parser.parse_args()
+    if args.source == "db" and args.segment_by:
+        parser.error("--segment-by needs species_id / region_id columns, water_measurement has none")
+    if any(m <= 0 or m % STEP_MINUTES for m in args.horizons):
+        parser.error(f"--horizons must be positive multiples of {STEP_MINUTES}")
+    args.horizons = sorted(set(args.horizons))
+    return args
+
+
+def parse_variant(spec):
+    """"tiny:trees=100,depth=3,distill" -> {"name": "tiny", "trees": 100, "depth": 3, "distill": True}"""
+    name, _, options = spec.partition(":")
+    variant = {"name": name, "trees": None, "depth": None, "distill": False}
+    for option in filter(None, options.split(",")):
+        key, _, value = option.partition("=")
+        if key not in VARIANT_KEYS:
+            raise argparse.ArgumentTypeError(f"unknown variant option '{key}' in {spec}")
+        variant[key] = True if key == "distill" else int(value)
+    if not name or "/" in name:
+        raise argparse.ArgumentTypeError(f"variant needs a name: {spec}")
+    if not variant["trees"] or not 0 < variant["trees"] <= XGB_PARAMS["n_estimators"]:
+        raise argparse.ArgumentTypeError(f"variant trees must be 1..{XGB_PARAMS['n_estimators']}: {spec}")
+    if variant["distill"] and variant["depth"] is None:
+        variant["depth"] = XGB_PARAMS["max_depth"]
+    return variant
+
+
+def output_names(horizons):
+    """Model outputs in the order PredictionService expects: horizon by horizon, target by target."""
+    return [horizon_output(col, minutes) for minutes in horizons for col in target_cols]
+
+
+def _sha256(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def data_source(args):
+    if args.source == "db":
+        return f"db:water_measurement[{args.since or ''}, {args.until or ''})"
+    return os.path.abspath(args.data)
+
+
+def write_manifest(version_dir, version, args, feature_cols, n_rows, segments, cache_key=None, timer=None):
+    files = {}
+    for dirpath, _, filenames in os.walk(version_dir):
+        for name in filenames:
+            path = os.path.join(dirpath, name)
+            rel = os.path.relpath(path, version_dir)
+            if rel != MANIFEST_FILE:
+                files[rel] = _sha256(path)
+
+    manifest = {
+        "version": version,
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "layout": "multi" if args.multi_output else "per_target",
+        "targets": target_cols,
+        "horizons": args.horizons,
+        "format": args.format,
+        "feature_cols": feature_cols,
+        "xgb_params": XGB_PARAMS,
+        "xgboost_version": xgboost.__version__,
+        "data": data_source(args),
+        "train_rows": n_rows,
+        "segments": segments,
+        "variants": {v["name"]: {k: v[k] for k in VARIANT_KEYS} for v in args.variants},
+        "feature_cache_key": cache_key,
+        "train_threads": args.threads,
+        "timing_s": dict(timer.stages) if timer else None,
+        "files": dict(sorted(files.items())),
+    }
+    with open(os.path.join(version_dir, MANIFEST_FILE), "w") as f:
+        json.dump(manifest, f, indent=2)
+
+
+def prepare_pool(part, horizons=(STEP_MINUTES,)):
+    """Targets + features of one pool's readings, in time order."""
+    # Shift target (-1 step = 5 mins prediction, -3 = 15 mins, ...)
+    for minutes in horizons:
+        for col in target_cols:
+            part[f"{horizon_output(col, minutes)}_target"] = part[col].shift(-(minutes // STEP_MINUTES))
+    return engineer_features(part)
+
+
+def prepare_dataset(df, horizons=(STEP_MINUTES,)):
+    """Targets + features, per pool when the CSV holds several pools (no rolling across pools)."""
+    if "pool_id" in df.columns:
+        df = pd.concat(
+            [prepare_pool(part.copy(), horizons) for _, part in df.groupby("pool_id", sort=False)],
+            ignore_index=True,
+        )
+    else:
+        df = prepare_pool(df, horizons)
+    return df.dropna(subset=build_feature_cols() + [f"{c}_target" for c in output_names(horizons)])
+
+
+def sample_weights(df):
+    weights = np.ones(len(df), dtype=np.float32)
+    # Tăng trọng số cho các mẫu nguy hiểm để model nhớ hơn
+    weights[(df["dissolved_oxygen"] < 3.5).to_numpy()] = 10.0
+    weights[(df["ammonia"] > 0.5).to_numpy()] = 10.0
+    return weights
+
+
+# ---------- DATA ----------
+def _data_files(path):
+    if os.path.isfile(path):
+        return [path]
+    return sorted(
+        os.path.join(dirpath, name)
+        for dirpath, _, filenames in os.walk(path)
+        for name in filenames
+    )
+
+
+def read_data(path):
+    """CSV file, or a directory of partitions from data_generation.py (npy or parquet)."""
+    if os.path.isfile(path):
+        df = pd.read_csv(path)
+    else:
+        parts = []
+        for name in sorted(os.listdir(path)):
+            part = os.path.join(path, name)
+            if name.endswith(".parquet"):
+                parts.append(pd.read_parquet(part))
+            elif os.path.isdir(part):
+                parts.append(pd.DataFrame({
+                    f[:-len(".npy")]: np.load(os.path.join(part, f))
+                    for f in sorted(os.listdir(part)) if f.endswith(".npy")
+                }))
+        if not parts:
+            raise SystemExit(f"No data partitions in {path}")
+        df = pd.concat(parts, ignore_index=True)
+        if "pool_id" in df.columns:
+            # Phân vùng chia theo thời gian: gom lại theo hồ, đúng thứ tự thời gian
+            df = df.sort_values(["pool_id", "timestamp"], kind="stable", ignore_index=True)
+    df["timestamp"] = pd.to_datetime(df["timestamp"])
+    return df
+
+
+def build_arrays(df, feature_cols, outputs):
+    """Float32 matrices XGBoost trains on (it converts to float32 anyway) + segment columns."""
+    data = {
+        "X": df[feature_cols].to_numpy(np.float32),
+        "Y": df[[f"{name}_target" for name in outputs]].to_numpy(np.float32),
+        "w": sample_weights(df),
+    }
+    for column in SEGMENT_COLUMNS.values():
+        if column in df.columns:
+            data[column] = df[column].astype(str).to_numpy(dtype=str)
+    return data
+
+
+def feature_cache_key(data_path, feature_cols, outputs):
+    """Hash of the input files + everything that decides the matrices (incl. the feature code itself)."""
+    h = hashlib.sha256()
+    for path in _data_files(data_path):
+        h.update(os.path.relpath(path, data_path).encode())
+        h.update(_sha256(path).encode())
+    spec = {
+        "feature_cols": feature_cols,
+        "outputs": outputs,
+        "windows": windows,
+        "code": [inspect.getsource(f) for f in (engineer_features, prepare_pool, prepare_dataset, sample_weights, build_arrays)],
+    }
+    h.update(json.dumps(spec, sort_keys=True).encode())
+    return h.hexdigest()[:24]
+
+
+def load_dataset(args, feature_cols, outputs, timer):
+    """
+    Training matrices, memory-mapped from the feature cache when the same data
+    and feature spec were prepared before; computed (and cached) otherwise.
+    """
+    key = None
+    if not args.no_cache:
+        with timer("hash"):
+            key = feature_cache_key(args.data, feature_cols, outputs)
+        cache_dir = os.path.join(args.cache_dir, key)
+        if os.path.isdir(cache_dir):
+            with timer("load_cache"):
+                data = {
+                    f[:-len(".npy")]: np.load(os.path.join(cache_dir, f), mmap_mode="r")
+                    for f in os.listdir(cache_dir) if f.endswith(".npy")
+                }
+            print(f"Feature cache hit: {cache_dir}")
+            return data, key
+
+    # LOAD
+    print("Loading data...")
+    with timer("read"):
+        df = read_data(args.data)
+    with timer("features"):
+        df = prepare_dataset(df, args.horizons)
+        data = build_arrays(df, feature_cols, outputs)
+    del df
+
+    if key is not None:
+        with timer("write_cache"):
+            # Ghi vào thư mục tạm rồi đổi tên: lần chạy song song không đọc phải cache dở
+            tmp = f"{cache_dir}.tmp-{os.getpid()}"
+            os.makedirs(tmp, exist_ok=True)
+            for name, values in data.items():
+                np.save(os.path.join(tmp, f"{name}.npy"), values)
+            try:
+                os.replace(tmp, cache_dir)
+            except OSError:
+                shutil.rmtree(tmp, ignore_errors=True)  # lần chạy khác đã ghi xong trước
+            print(f"Feature cache written: {cache_dir}")
+    return data, key
+
+
+def stream_dataset(args, feature_cols, outputs, timer):
+    """
+    Training matrices from water_measurement, spooled to disk part by part:
+    RAM holds one cursor fetch, a few context rows per pool and one part,
+    whatever the time range.
+    """
+    from sqlalchemy import create_engine
+    if args.db_url:
+        engine = create_engine(args.db_url)
+    else:
+        from app.db.connection import engine
+
+    spool_dir = os.path.join(args.cache_dir, f"spool-{os.getpid()}")
+    stream = PoolFeatureStream(
+        prepare_pool, lambda df: build_arrays(df, feature_cols, outputs),
+        args.horizons, context_rows=max(windows),
+    )
+    print("Streaming water_measurement...")
+    with timer("stream"):
+        chunks = stream_measurements(engine, args.since, args.until, args.fetch_rows)
+        parts, rows = spool((batch for chunk in chunks for batch in stream.feed(chunk)), spool_dir, args.spool_rows)
+    if not rows:
+        shutil.rmtree(spool_dir, ignore_errors=True)
+        raise SystemExit("No training rows in water_measurement for the given range")
+    print(f"Spooled {rows} rows in {len(parts)} parts: {spool_dir}")
+    return {"parts": parts, "rows": rows, "spool_dir": spool_dir}
+
+
+def n_rows(data):
+    return data["rows"] if "parts" in data else len(data["X"])
+
+
+class StageTimer:
+    """Wall-clock seconds per pipeline stage (stages may repeat, e.g. one per segment)."""
+
+    def __init__(self):
+        self.stages = {}
+
+    @contextmanager
+    def __call__(self, stage):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stages[stage] = self.stages.get(stage, 0.0) + time.perf_counter() - started
+
+    def report(self):
+        total = sum(self.stages.values())
+        print("Stage timing (wall-clock):")
+        for stage, seconds in self.stages.items():
+            print(f"  {stage:<12}{seconds:>9.2f}s")
+        print(f"  {'total':<12}{total:>9.2f}s")
+
+
+# ---------- TRAINING ----------
+def booster_params(nthread, multi_output=False):
+    """XGB_PARAMS for xgboost.train (same model as XGBRegressor(**XGB_PARAMS).fit)."""
+    params = {
+        "max_depth": XGB_PARAMS["max_depth"],
+        "eta": XGB_PARAMS["learning_rate"],
+        "objective": XGB_PARAMS["objective"],
+        "tree_method": "hist",
+        "nthread": nthread,
+    }
+    if multi_output:
+        params["multi_strategy"] = "one_output_per_tree"
+    return params
+
+
+def train_matrix(data, label, nthread, ref=None, name="base"):
+    """
+    QuantileDMatrix on one Y column (label=j) or all of them (label=None).
+    Spooled data (--source db) becomes an ExtMemQuantileDMatrix whose pages stay on disk.
+    """
+    if "parts" in data:
+        it = SpoolIter(data["parts"], label, os.path.join(data["spool_dir"], f"xgb-{name}"))
+        return xgboost.ExtMemQuantileDMatrix(it, ref=ref, nthread=nthread)
+    Y = data["Y"]
+    return xgboost.QuantileDMatrix(
+        data["X"], label=Y if label is None else Y[:, label], weight=data["w"], ref=ref, nthread=nthread
+    )
+
+
+def train_label(data, j=None):
+    """Y column j (all columns for j=None) as one in-memory array."""
+    if "parts" in data:
+        return label_column(data["parts"], j)
+    return data["Y"] if j is None else data["Y"][:, j]
+
+
+def predict_rows(data, booster):
+    """Booster predictions for every training row, one spooled part at a time."""
+    blocks = [load_part(path, "X") for path in data["parts"]] if "parts" in data else [data["X"]]
+    return np.concatenate([booster.inplace_predict(X) for X in blocks]).astype(np.float32)
+
+
+def train_model_set(data, out_dir, args, feature_cols, outputs, timer):
+    """Train the forecasting models on `data` and save them (+ features.json) into out_dir."""
+    os.makedirs(out_dir, exist_ok=True)
+    rounds = XGB_PARAMS["n_estimators"]
+
+    if args.multi_output:
+        # Một model cho mọi target x horizon: cột output theo đúng thứ tự output_names()
+        print(f"Training multi-output model ({', '.join(outputs)})...")
+        with timer("dmatrix"):
+            dtrain = train_matrix(data, None, args.threads)
+        with timer("train"):
+            booster = xgboost.train(booster_params(args.threads, multi_output=True), dtrain, rounds)
+        booster.set_attr(targets=",".join(outputs))
+        with timer("save"):
+            booster.save_model(f"{out_dir}/xgb_multi.{args.format}")
+    else:
+        # Lượng tử hoá X một lần; mỗi luồng train dùng một DMatrix (chung lưới bin) và
+        # đổi nhãn giữa các target. Tổng số luồng XGBoost = args.threads
+        workers = max(1, min(args.parallel_targets, len(outputs), args.threads))
+        nthread = max(1, args.threads // workers)
+        with timer("dmatrix"):
+            base = train_matrix(data, 0, args.threads)
+            slots = [base] + [
+                train_matrix(data, 0, args.threads, ref=base, name=f"slot{slot}")
+                for slot in range(1, workers)
+            ]
+
+        def train_slot(slot):
+            dtrain = slots[slot]
+            for j in range(slot, len(outputs), workers):
+                name = outputs[j]
+                started = time.perf_counter()
+                dtrain.set_label(train_label(data, j))
+                booster = xgboost.train(booster_params(nthread), dtrain, rounds)
+                # Định dạng gốc của XGBoost: nạp nhanh, không phụ thuộc phiên bản pickle
+                booster.save_model(f"{out_dir}/xgb_{name}.{args.format}")
+                print(f"Trained {name} in {time.perf_counter() - started:.1f}s")
+
+        print(f"Training {len(outputs)} models, {workers} at a time x {nthread} threads...")
+        with timer("train"):
+            # xgboost.train nhả GIL: các target chạy song song thật
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                for future in [pool.submit(train_slot, slot) for slot in range(workers)]:
+                    future.result()
+
+    with open(f"{out_dir}/features.json", "w") as f:
+        json.dump(feature_cols, f)
+
+    if args.variants:
+        train_variants(data, out_dir, args, feature_cols, outputs, timer)
+
+
+def train_variants(data, out_dir, args, feature_cols, outputs, timer):
+    """
+    Compact copies of the model set just saved in out_dir, in
+    out_dir/variants/<name>/ (same files, fewer / shallower trees):
+    truncation keeps the first `trees` rounds of each full model; with `depth`
+    a new model is trained, on the true targets or, with `distill`, on the
+    full model's predictions.
+    """
+    names = ["multi"] if args.multi_output else outputs
+    teachers = {name: xgboost.Booster(model_file=f"{out_dir}/xgb_{name}.{args.format}") for name in names}
+    dtrain = None
+
+    for variant in args.variants:
+        variant_dir = os.path.join(out_dir, VARIANTS_DIR, variant["name"])
+        os.makedirs(variant_dir, exist_ok=True)
+        started = time.perf_counter()
+        with timer("variants"):
+            for j, name in enumerate(names):
+                label = None if name == "multi" else j
+                if variant["depth"] is None:
+                    booster = teachers[name][: variant["trees"]]
+                else:
+                    if dtrain is None:
+                        dtrain = train_matrix(data, label, args.threads)
+                    dtrain.set_label(
+                        predict_rows(data, teachers[name]) if variant["distill"] else train_label(data, label)
+                    )
+                    params = booster_params(args.threads, multi_output=label is None)
+                    params["max_depth"] = variant["depth"]
+                    booster = xgboost.train(params, dtrain, variant["trees"])
+                if label is None:
+                    booster.set_attr(targets=",".join(outputs))
+                booster.save_model(f"{variant_dir}/xgb_{name}.{args.format}")
+            with open(f"{variant_dir}/features.json", "w") as f:
+                json.dump(feature_cols, f)
+        print(f"Variant {variant['name']} in {time.perf_counter() - started:.1f}s")
+
+
+def train_segments(data, version_dir, args, feature_cols, outputs, timer):
+    """
+    Specialised model sets in <version>/segments/<key>/ for every group of
+    --segment-by with at least --min-segment-rows rows. Smaller groups are
+    served by the global set (PredictionService.route falls back).
+    """
+    segments = {}
+    for spec in args.segment_by:
+        by = spec.split(",")
+        columns = [SEGMENT_COLUMNS[b] for b in by]
+        missing = [c for c in columns if c not in data]
+        if missing:
+            raise SystemExit(f"--segment-by {spec}: CSV has no column {', '.join(missing)}")
+
+        groups = pd.DataFrame({c: np.asarray(data[c]) for c in columns}).groupby(columns, sort=True).indices
+        for values, rows in groups.items():
+            values = values if isinstance(values, tuple) else (values,)
+            key = segment_key(**{SEGMENT_ARGS[b]: str(v) for b, v in zip(by, values)})
+            if len(rows) < args.min_segment_rows:
+                print(f"Skipping segment {key}: {len(rows)} rows < {args.min_segment_rows}")
+                continue
+            print(f"Segment {key} ({len(rows)} rows)")
+            part = {name: data[name][rows] for name in ("X", "Y", "w")}
+            train_model_set(part, os.path.join(version_dir, SEGMENTS_DIR, key), args, feature_cols, outputs, timer)
+            segments[key] = {"rows": len(rows), **dict(zip(by, map(str, values)))}
+    return segments
+
+
+def main():
+    args = parse_args()
+    version = args.version or datetime.now(timezone.utc).strftime("%Y%m%d-%H%M%S")
+    version_dir = os.path.join(args.model_dir, VERSIONS_DIR, version)
+    # Không ghi đè phiên bản đã có: server có thể đang dùng nó
+    os.makedirs(version_dir, exist_ok=False)
+
+    timer = StageTimer()
+    feature_cols = build_feature_cols()
+    outputs = output_names(args.horizons)
+    if args.source == "db":
+        data, cache_key = stream_dataset(args, feature_cols, outputs, timer), None
+    else:
+        data, cache_key = load_dataset(args, feature_cols, outputs, timer)
+
+    try:
+        # TRAIN LOOP: bộ model chung cho mọi hồ, rồi các bộ chuyên biệt (nếu có)
+        train_model_set(data, version_dir, args, feature_cols, outputs, timer)
+        segments = train_segments(data, version_dir, args, feature_cols, outputs, timer)
+    finally:
+        if "spool_dir" in data:
+            shutil.rmtree(data["spool_dir"], ignore_errors=True)
+
+    with timer("manifest"):
+        write_manifest(version_dir, version, args, feature_cols, n_rows(data), segments, cache_key, timer)
+    print(f"Training Done. Models saved in '{version_dir}'.")
+    timer.report()
+
+    if not args.no_activate:
+        # Server có MODEL_WATCH_INTERVAL_S > 0 sẽ tự nạp; nếu không gọi POST /api/models/reload
+        write_current(args.model_dir, version)
+        print(f"CURRENT -> {version}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,172 @@
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from sqlalchemy import event
+
+from app.models.models import User
+
+# Số mục tối đa mỗi cache (0 = tắt cache xác thực, mọi request đều hỏi DB)
+AUTH_CACHE_SIZE = int(os.getenv("AUTH_CACHE_SIZE", 10000))
+# Thời gian sống của user / quyền sở hữu hồ (giây). Mỗi worker có cache riêng: thay đổi
+# ở worker khác (hoặc ngoài API) được thấy muộn nhất sau chừng này
+AUTH_CACHE_TTL_S = float(os.getenv("AUTH_CACHE_TTL_S", 60))
+# Token đã giải mã: giữ tới khi hết hạn (exp) nhưng không quá N giây
+AUTH_TOKEN_CACHE_TTL_S = float(os.getenv("AUTH_TOKEN_CACHE_TTL_S", 300))
+
+
+class TTLCache:
+    """Bounded LRU map whose entries expire ttl_s after being stored (or at an earlier deadline)."""
+
+    def __init__(self, max_entries: int, ttl_s: float):
+        self.max_entries = max_entries
+        self.ttl_s = ttl_s
+        self._entries = OrderedDict()  # key -> (value, expires_at monotonic)
+        self.stats = {"hits": 0, "misses": 0, "expired": 0, "evictions": 0, "invalidations": 0}
+
+    def get(self, key):
+        """Cached value, or None when missing / expired."""
+        entry = self._entries.get(key)
+        if entry is not None:
+            value, expires_at = entry
+            if time.monotonic() < expires_at:
+                self._entries.move_to_end(key)
+                self.stats["hits"] += 1
+                return value
+            del self._entries[key]
+            self.stats["expired"] += 1
+        self.stats["misses"] += 1
+        return None
+
+    def put(self, key, value, ttl_s: float = None):
+        if self.max_entries <= 0:
+            return
+        ttl_s = self.ttl_s if ttl_s is None else min(ttl_s, self.ttl_s)
+        if ttl_s <= 0:
+            return
+        self._entries[key] = (value, time.monotonic() + ttl_s)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.stats["evictions"] += 1
+
+    def discard(self, keys):
+        for key in keys:
+            if self._entries.pop(key, None) is not None:
+                self.stats["invalidations"] += 1
+
+    def keys(self):
+        return list(self._entries)
+
+    def snapshot(self) -> dict:
+        lookups = (self.stats["hits"] + self.stats["misses"]) or 1
+        return {
+            "size": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl_s": self.ttl_s,
+            **self.stats,
+            "hit_rate": self.stats["hits"] / lookups,
+        }
+
+
+class AuthCache:
+    """
+    Caches for the per-request authentication work:
+      tokens     sha256(token) -> user_id     (skips JWT decode)
+      users      user_id -> User (detached)    (skips SELECT users)
+      ownership  (user_id, pool_id) -> pool row (pool_id, species_id, region_id),
+                 or False when the user does not own that pool (skips SELECT pool)
+
+    Invalidation is explicit: forget_pool() on pool create / delete,
+    forget_user() on any User update / delete (ORM events below).
+    Handlers run on the event loop but ORM events may fire in worker threads,
+    hence the lock.
+    """
+
+    def __init__(self, max_entries: int = AUTH_CACHE_SIZE, ttl_s: float = AUTH_CACHE_TTL_S,
+                 token_ttl_s: float = AUTH_TOKEN_CACHE_TTL_S):
+        self.tokens = TTLCache(max_entries, token_ttl_s)
+        self.users = TTLCache(max_entries, ttl_s)
+        self.ownership = TTLCache(max_entries, ttl_s)
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _token_key(token: str) -> bytes:
+        # Không giữ chuỗi token gốc trong bộ nhớ
+        return hashlib.sha256(token.encode()).digest()
+
+    # ---------- TOKENS ----------
+    def token_user(self, token):
+        with self._lock:
+            return self.tokens.get(self._token_key(token))
+
+    def store_token(self, token, user_id, exp=None):
+        # Token hết hạn thì mục cache cũng hết hạn cùng lúc
+        ttl_s = None if exp is None else exp - time.time()
+        with self._lock:
+            self.tokens.put(self._token_key(token), user_id, ttl_s)
+
+    # ---------- USERS ----------
+    def user(self, user_id):
+        with self._lock:
+            return self.users.get(user_id)
+
+    def store_user(self, user):
+        with self._lock:
+            self.users.put(user.user_id, user)
+
+    def forget_user(self, user_id):
+        with self._lock:
+            self.users.discard([user_id])
+            self.ownership.discard([key for key in self.ownership.keys() if key[0] == user_id])
+
+    # ---------- POOL OWNERSHIP ----------
+    def owned(self, user_id, pool_ids):
+        """Split pool_ids into ({pool_id: row or False} cached, [pool_id] to query)."""
+        cached, missing = {}, []
+        with self._lock:
+            for pool_id in pool_ids:
+                row = self.ownership.get((user_id, pool_id))
+                if row is None:
+                    missing.append(pool_id)
+                else:
+                    cached[pool_id] = row
+        return cached, missing
+
+    def owned_pools(self, user_id, pool_ids):
+        """({pool_id: row} cached as owned, [pool_id] to query); cached "not owned" pools are left out."""
+        cached, missing = self.owned(user_id, pool_ids)
+        return {pool_id: row for pool_id, row in cached.items() if row is not False}, missing
+
+    def store_owned(self, user_id, pool_ids, rows):
+        """Cache the query result for pool_ids: the rows found, False for the others."""
+        found = {row.pool_id: row for row in rows}
+        with self._lock:
+            for pool_id in pool_ids:
+                self.ownership.put((user_id, pool_id), found.get(pool_id, False))
+        return found
+
+    def forget_pool(self, pool_id):
+        with self._lock:
+            self.ownership.discard([key for key in self.ownership.keys() if key[1] == pool_id])
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "enabled": self.users.max_entries > 0,
+                "tokens": self.tokens.snapshot(),
+                "users": self.users.snapshot(),
+                "ownership": self.ownership.snapshot(),
+            }
+
+
+auth_cache = AuthCache()
+
+
+# Mọi thay đổi User qua ORM (kể cả ngoài API) đều xoá cache của user đó
+@event.listens_for(User, "after_update")
+@event.listens_for(User, "after_delete")
+def _forget_changed_user(mapper, connection, target):
+    auth_cache.forget_user(target.user_id)
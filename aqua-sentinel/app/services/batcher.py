@@ -0,0 +1,146 @@
+import asyncio
+import os
+import time
+
+import numpy as np
+
+from app.services.inference_executor import inference_executor
+
+MICROBATCH_ENABLED = os.getenv("MICROBATCH_ENABLED", "false").lower() == "true"
+MICROBATCH_WINDOW_MS = float(os.getenv("MICROBATCH_WINDOW_MS", 3))
+MICROBATCH_MAX_ROWS = int(os.getenv("MICROBATCH_MAX_ROWS", 256))
+
+# Cận trên của các bucket histogram kích thước lô
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256)
+
+
+class PredictionBatcher:
+    """
+    Coalesces feature rows from concurrent requests into one predict_matrix call.
+
+    Rows are collected until MICROBATCH_WINDOW_MS has passed since the first one
+    arrived or MICROBATCH_MAX_ROWS rows are waiting, then inferred together and
+    the results are fanned back out to each awaiting handler. The batched
+    call itself runs on the inference executor, never on the event loop.
+    Rows are only batched with rows for the same PredictionService (model
+    version), so a hot reload never mixes versions inside one batch.
+    """
+
+    def __init__(
+        self,
+        executor=inference_executor,
+        enabled: bool = MICROBATCH_ENABLED,
+        window_ms: float = MICROBATCH_WINDOW_MS,
+        max_rows: int = MICROBATCH_MAX_ROWS,
+    ):
+        self.executor = executor
+        self.enabled = enabled
+        self.window = window_ms / 1000.0
+        self.max_rows = max_rows
+
+        self._pending = []  # (X, future, enqueued_at, service)
+        self._pending_rows = 0
+        self._timer = None
+        self._tasks = set()
+
+        self.stats = {
+            "requests": 0,
+            "batches": 0,
+            "rows": 0,
+            "max_batch_rows": 0,
+            "queue_delay_ms_total": 0.0,
+            "queue_delay_ms_max": 0.0,
+        }
+        self.batch_size_histogram = {f"<={b}": 0 for b in BATCH_SIZE_BUCKETS}
+        self.batch_size_histogram[f">{BATCH_SIZE_BUCKETS[-1]}"] = 0
+
+    async def predict(self, service, X):
+        """Same result as service.predict_matrix(X), possibly shared with other requests."""
+        if not self.enabled:
+            return await self.executor.run(service.predict_matrix, X)
+
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((X, future, time.perf_counter(), service))
+        self._pending_rows += len(X)
+        self.stats["requests"] += 1
+
+        if self._pending_rows >= self.max_rows:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.window, self._flush)
+
+        return await future
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+        batch, self._pending, self._pending_rows = self._pending, [], 0
+        if not batch:
+            return
+
+        # Thường chỉ có một nhóm; nhiều nhóm khi đang chuyển phiên bản model
+        groups = {}
+        for item in batch:
+            groups.setdefault(id(item[3]), []).append(item)
+
+        started = time.perf_counter()
+        for group in groups.values():
+            self._record(group, started)
+            task = asyncio.ensure_future(self._run(group[0][3], group))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, service, batch):
+        try:
+            outputs = await self.executor.run(
+                service.predict_matrix, np.vstack([X for X, _, _, _ in batch])
+            )
+        except Exception as e:
+            for _, future, _, _ in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        offset = 0
+        for X, future, _, _ in batch:
+            # Client có thể đã huỷ request trong lúc chờ
+            if not future.done():
+                future.set_result(outputs[offset:offset + len(X)])
+            offset += len(X)
+
+    def _record(self, batch, started):
+        rows = sum(len(X) for X, _, _, _ in batch)
+        self.stats["batches"] += 1
+        self.stats["rows"] += rows
+        self.stats["max_batch_rows"] = max(self.stats["max_batch_rows"], rows)
+
+        for _, _, enqueued_at, _ in batch:
+            delay_ms = (started - enqueued_at) * 1000
+            self.stats["queue_delay_ms_total"] += delay_ms
+            self.stats["queue_delay_ms_max"] = max(self.stats["queue_delay_ms_max"], delay_ms)
+
+        for bound in BATCH_SIZE_BUCKETS:
+            if rows <= bound:
+                self.batch_size_histogram[f"<={bound}"] += 1
+                break
+        else:
+            self.batch_size_histogram[f">{BATCH_SIZE_BUCKETS[-1]}"] += 1
+
+    def snapshot(self) -> dict:
+        batches = self.stats["batches"] or 1
+        requests = self.stats["requests"] or 1
+        return {
+            "enabled": self.enabled,
+            "window_ms": self.window * 1000,
+            "max_rows": self.max_rows,
+            **self.stats,
+            "avg_batch_rows": self.stats["rows"] / batches,
+            "avg_queue_delay_ms": self.stats["queue_delay_ms_total"] / requests,
+            "batch_size_histogram": self.batch_size_histogram,
+        }
+
+
+prediction_batcher = PredictionBatcher()
@@ -0,0 +1,226 @@
+from datetime import datetime
+
+import numpy as np
+
+# Phải giống hệt script/train_model.py
+TARGET_COLS = ["dissolved_oxygen", "ph", "ammonia", "turbidity", "temperature"]
+WINDOWS = (3, 12)
+
+
+def rolling_mean_last(values, w):
+    """
+    Mean of the last `w` rows of `values` (time on axis 0), computed the same way
+    pandas `rolling(w).mean()` does: Kahan add/remove over the whole series, so the
+    result is bit-identical to the pandas path. Returns NaN where there are fewer
+    than `w` rows.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    n = values.shape[0]
+    shape = values.shape[1:]
+    if n < w:
+        return np.full(shape, np.nan)
+
+    sum_x = np.zeros(shape)
+    comp_add = np.zeros(shape)
+    comp_remove = np.zeros(shape)
+    neg_ct = np.zeros(shape, dtype=np.int64)
+    same_ct = np.zeros(shape, dtype=np.int64)
+    prev = values[0].copy()
+
+    for i in range(n):
+        if i >= w:
+            v = values[i - w]
+            y = -v - comp_remove
+            t = sum_x + y
+            comp_remove = t - sum_x - y
+            sum_x = t
+            neg_ct = neg_ct - np.signbit(v)
+
+        v = values[i]
+        y = v - comp_add
+        t = sum_x + y
+        comp_add = t - sum_x - y
+        sum_x = t
+        neg_ct = neg_ct + np.signbit(v)
+        same_ct = np.where(v == prev, same_ct + 1, 1)
+        prev = v
+
+    result = sum_x / w
+    # Cùng các điều chỉnh như pandas (cửa sổ toàn giá trị giống nhau / cùng dấu)
+    result = np.where((neg_ct == w) & (result > 0), 0.0, result)
+    result = np.where((neg_ct == 0) & (result < 0), 0.0, result)
+    result = np.where(same_ct >= w, prev, result)
+    return result
+
+
+def _block_features(block, hours, months, rain_event, feeding_event) -> dict:
+    """
+    Latest-row features for b histories of equal length n.
+    block: (n, b, 5) readings in TARGET_COLS order; the other args are length-b arrays.
+    Missing windows are filled with 0, like `fillna(0)` in PredictionService.
+    """
+    n = block.shape[0]
+    current = block[-1]
+
+    features = {
+        "rain_event": np.asarray(rain_event, dtype=np.float64),
+        "feeding_event": np.asarray(feeding_event, dtype=np.float64),
+        "hour": np.asarray(hours, dtype=np.float64),
+        "month": np.asarray(months, dtype=np.float64),
+    }
+    for w in WINDOWS:
+        mean = np.nan_to_num(rolling_mean_last(block, w))
+        delta = current - block[-1 - w] if n > w else np.zeros_like(current)
+        for j, col in enumerate(TARGET_COLS):
+            features[col] = current[:, j]
+            features[f"{col}_roll_mean_{w}"] = mean[:, j]
+            features[f"{col}_delta_{w}"] = delta[:, j]
+
+    return features
+
+
+def latest_features(values, timestamp, rain_event=0, feeding_event=0) -> dict:
+    """Features of the last reading from a (n, 5) block of readings in TARGET_COLS order."""
+    block = np.asarray(values, dtype=np.float64)[:, None, :]
+    features = _block_features(
+        block, [timestamp.hour], [timestamp.month], [rain_event], [feeding_event]
+    )
+    return {name: arr[0] for name, arr in features.items()}
+
+
+def engineer_batch(histories, feature_cols):
+    """
+    Pandas-free feature engineering: lists of SensorPoint -> (len(histories), len(feature_cols))
+    matrix in feature_cols order. Histories of the same length are processed together.
+    """
+    col_idx = {c: i for i, c in enumerate(feature_cols)}
+    X = np.zeros((len(histories), len(feature_cols)), dtype=np.float64)
+
+    by_len = {}
+    for i, history in enumerate(histories):
+        if not history:
+            raise ValueError("History is empty")
+        by_len.setdefault(len(history), []).append(i)
+
+    for rows in by_len.values():
+        # (n, b, 5): thời gian ở trục 0 giống rolling_mean_last
+        block = np.array(
+            [[[getattr(p, c) for c in TARGET_COLS] for p in histories[r]] for r in rows],
+            dtype=np.float64,
+        ).transpose(1, 0, 2)
+        last = [histories[r][-1] for r in rows]
+        timestamps = [datetime.fromisoformat(p.timestamp) for p in last]
+
+        features = _block_features(
+            block,
+            [t.hour for t in timestamps],
+            [t.month for t in timestamps],
+            [p.rain_event for p in last],
+            [p.feeding_event for p in last],
+        )
+        for name, arr in features.items():
+            if name in col_idx:
+                X[rows, col_idx[name]] = arr
+
+    return X
+
+
+class RollingFeatureState:
+    """
+    Incremental feature state for one pool, updated in O(1) per reading.
+
+    Keeps Kahan running sums for the 3- and 12-point means (same add/remove
+    arithmetic as pandas, applied to the whole stream like train_model.py does)
+    and a (max(WINDOWS) + 1)-row lag buffer for the deltas.
+    """
+
+    LAG = max(WINDOWS) + 1
+
+    def __init__(self):
+        k = len(TARGET_COLS)
+        self.lags = np.zeros((self.LAG, k), dtype=np.float64)
+        self.head = 0
+        self.count = 0
+
+        self.sum_x = {w: np.zeros(k) for w in WINDOWS}
+        self.comp_add = {w: np.zeros(k) for w in WINDOWS}
+        self.comp_remove = {w: np.zeros(k) for w in WINDOWS}
+        self.neg_ct = {w: np.zeros(k, dtype=np.int64) for w in WINDOWS}
+        self.same_ct = np.zeros(k, dtype=np.int64)
+        self.prev = None
+
+        self.timestamp = None
+        self.rain_event = 0.0
+        self.feeding_event = 0.0
+
+    def _lag(self, k):
+        # Giá trị cách điểm mới nhất k bước (k = 0 là điểm mới nhất)
+        return self.lags[(self.head - 1 - k) % self.LAG]
+
+    def update(self, timestamp, values, rain_event=0, feeding_event=0):
+        values = np.array(values, dtype=np.float64)
+
+        for w in WINDOWS:
+            if self.count >= w:
+                old = self._lag(w - 1)
+                y = -old - self.comp_remove[w]
+                t = self.sum_x[w] + y
+                self.comp_remove[w] = t - self.sum_x[w] - y
+                self.sum_x[w] = t
+                self.neg_ct[w] = self.neg_ct[w] - np.signbit(old)
+
+            y = values - self.comp_add[w]
+            t = self.sum_x[w] + y
+            self.comp_add[w] = t - self.sum_x[w] - y
+            self.sum_x[w] = t
+            self.neg_ct[w] = self.neg_ct[w] + np.signbit(values)
+
+        if self.prev is None:
+            self.same_ct = np.ones_like(self.same_ct)
+        else:
+            self.same_ct = np.where(values == self.prev, self.same_ct + 1, 1)
+        self.prev = values
+
+        self.lags[self.head] = values
+        self.head = (self.head + 1) % self.LAG
+        self.count += 1
+
+        self.timestamp = timestamp
+        self.rain_event = float(rain_event)
+        self.feeding_event = float(feeding_event)
+
+    def _mean(self, w):
+        if self.count < w:
+            return np.zeros(len(TARGET_COLS))
+        result = self.sum_x[w] / w
+        result = np.where((self.neg_ct[w] == w) & (result > 0), 0.0, result)
+        result = np.where((self.neg_ct[w] == 0) & (result < 0), 0.0, result)
+        return np.where(self.same_ct >= w, self.prev, result)
+
+    def features(self) -> dict:
+        """Features of the latest reading, 0 where a window is not full yet."""
+        if self.count == 0:
+            raise ValueError("RollingFeatureState is empty")
+
+        features = {
+            "rain_event": self.rain_event,
+            "feeding_event": self.feeding_event,
+            "hour": float(self.timestamp.hour),
+            "month": float(self.timestamp.month),
+        }
+        current = self._lag(0)
+        means = {w: self._mean(w) for w in WINDOWS}
+
+        for j, col in enumerate(TARGET_COLS):
+            features[col] = current[j]
+            for w in WINDOWS:
+                features[f"{col}_roll_mean_{w}"] = means[w][j]
+                features[f"{col}_delta_{w}"] = (
+                    current[j] - self._lag(w)[j] if self.count > w else 0.0
+                )
+        return features
+
+    def vector(self, feature_cols):
+        """Latest features as a 1-D array in `feature_cols` (features.json) order."""
+        features = self.features()
+        return np.array([features.get(c, 0.0) for c in feature_cols], dtype=np.float64)
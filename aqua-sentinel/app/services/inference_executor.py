@@ -0,0 +1,19 @@
+import os
+
+from app.core.executor import BoundedExecutor, QueueFull
+
+# Số luồng chạy feature engineering + inference (XGBoost nhả GIL khi predict)
+INFERENCE_WORKERS = int(os.getenv("INFERENCE_WORKERS", 2))
+# Số tác vụ tối đa đang chờ + đang chạy; vượt quá thì từ chối (503)
+INFERENCE_QUEUE_MAX = int(os.getenv("INFERENCE_QUEUE_MAX", 64))
+
+
+class InferenceQueueFull(QueueFull):
+    """Raised by inference_executor.run when the bounded queue is full."""
+
+
+# Feature engineering, nạp model và inference (tốn CPU) chạy ở pool này:
+# /login, /my-pools và ingest vẫn phản hồi khi inference đang bận
+inference_executor = BoundedExecutor(
+    INFERENCE_WORKERS, INFERENCE_QUEUE_MAX, name="inference", rejected=InferenceQueueFull
+)
@@ -0,0 +1,131 @@
+import json
+import os
+import threading
+import time
+
+import numpy as np
+
+from app.services.feature_engine import TARGET_COLS
+
+# Bật chế độ bỏ qua inference cho hồ ổn định (mặc định tắt)
+INFERENCE_SKIP = os.getenv("INFERENCE_SKIP", "0") == "1"
+# Dự báo cũ hơn ngưỡng này luôn được tính lại, dù hồ vẫn ổn định
+INFERENCE_SKIP_MAX_AGE_S = float(os.getenv("INFERENCE_SKIP_MAX_AGE_S", 900))
+
+# Mức thay đổi tối đa (so với lần inference đầy đủ gần nhất) của giá trị đo,
+# delta_3 và delta_12 của mỗi chỉ số để vẫn coi là "không đổi".
+# Ghi đè bằng JSON, ví dụ INFERENCE_SKIP_TOLERANCES='{"dissolved_oxygen": 0.05}'
+DEFAULT_TOLERANCES = {
+    "dissolved_oxygen": 0.1,
+    "ph": 0.05,
+    "ammonia": 0.005,
+    "turbidity": 0.5,
+    "temperature": 0.2,
+}
+SKIP_TOLERANCES = {**DEFAULT_TOLERANCES, **json.loads(os.getenv("INFERENCE_SKIP_TOLERANCES", "{}"))}
+
+# Các feature này phải trùng khớp: đổi sự kiện / giờ thì model có thể cho kết quả khác hẳn
+EXACT_FEATURES = ("rain_event", "feeding_event", "hour", "month")
+
+SAFE_LEVEL = "SAFE"
+
+
+def tolerance_vector(feature_cols, tolerances=SKIP_TOLERANCES):
+    """Per-feature allowed change; inf for features that are not compared (rolling means)."""
+    tol = np.full(len(feature_cols), np.inf)
+    for j, col in enumerate(feature_cols):
+        if col in EXACT_FEATURES:
+            tol[j] = 0.0
+            continue
+        for target in TARGET_COLS:
+            if col in (target, f"{target}_delta_3", f"{target}_delta_12"):
+                tol[j] = tolerances[target]
+    return tol
+
+
+class InferenceSkipper:
+    """
+    Reuses the last forecast of a pool while its inputs stay put.
+
+    For each pool it keeps the feature row of its last full inference, the
+    forecast and the risk level. lookup() returns that forecast when the last
+    level was SAFE, the forecast is younger than max_age_s and every compared
+    feature moved less than its tolerance since that full inference (not since
+    the last request, so slow drift still triggers a refresh). Anything else is
+    a miss and the caller runs the models and store()s the new result.
+
+    One skipper belongs to one PredictionService, so a model reload starts
+    with an empty cache.
+    """
+
+    def __init__(
+        self,
+        enabled: bool = INFERENCE_SKIP,
+        max_age_s: float = INFERENCE_SKIP_MAX_AGE_S,
+        tolerances: dict = None,
+    ):
+        self.enabled = enabled
+        self.max_age_s = max_age_s
+        self.tolerances = tolerances or SKIP_TOLERANCES
+        self._tol = None
+        self._entries = {}  # pool_id -> (row, preds, level, stored_at)
+        self._lock = threading.Lock()
+
+        self.stats = {
+            "lookups": 0,
+            "skipped": 0,
+            "changed": 0,    # giá trị thay đổi vượt ngưỡng
+            "not_safe": 0,   # lần trước không SAFE
+            "stale": 0,      # quá max_age_s
+            "first_seen": 0,
+        }
+
+    def lookup(self, pool_id, row, feature_cols):
+        """Cached forecast for `pool_id` if its inputs have not moved, else None."""
+        if not self.enabled or pool_id is None:
+            return None
+        if self._tol is None:
+            self._tol = tolerance_vector(feature_cols, self.tolerances)
+
+        with self._lock:
+            self.stats["lookups"] += 1
+            entry = self._entries.get(pool_id)
+            if entry is None:
+                self.stats["first_seen"] += 1
+                return None
+
+            ref_row, preds, level, stored_at = entry
+            if level != SAFE_LEVEL:
+                self.stats["not_safe"] += 1
+                return None
+            if time.monotonic() - stored_at > self.max_age_s:
+                self.stats["stale"] += 1
+                return None
+            if not np.all(np.abs(row - ref_row) <= self._tol):
+                self.stats["changed"] += 1
+                return None
+
+            self.stats["skipped"] += 1
+            return preds
+
+    def store(self, pool_id, row, preds, level):
+        """Record the result of a full inference."""
+        if not self.enabled or pool_id is None:
+            return
+        with self._lock:
+            self._entries[pool_id] = (np.array(row, dtype=np.float64), preds, level, time.monotonic())
+
+    def forget(self, pool_id):
+        with self._lock:
+            self._entries.pop(pool_id, None)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            lookups = self.stats["lookups"] or 1
+            return {
+                "enabled": self.enabled,
+                "max_age_s": self.max_age_s,
+                "pools": len(self._entries),
+                **self.stats,
+                "skip_ratio": self.stats["skipped"] / lookups,
+            }
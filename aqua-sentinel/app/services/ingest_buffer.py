@@ -0,0 +1,169 @@
+import os
+import threading
+import time
+from collections import deque
+from itertools import groupby
+from operator import itemgetter
+
+from sqlalchemy import insert
+from sqlalchemy.exc import IntegrityError
+
+from app.db.connection import SessionLocal
+from app.models.models import WaterMeasurement
+
+INGEST_BUFFER_MAX = int(os.getenv("INGEST_BUFFER_MAX", 50000))
+INGEST_FLUSH_INTERVAL_MS = int(os.getenv("INGEST_FLUSH_INTERVAL_MS", 250))
+INGEST_BATCH_SIZE = int(os.getenv("INGEST_BATCH_SIZE", 1000))
+
+
+class MeasurementBuffer:
+    """
+    Write-behind buffer for water_measurement.
+
+    Readings are queued in memory and a background thread flushes them in bulk
+    (one multi-row INSERT per batch) every INGEST_FLUSH_INTERVAL_MS.
+    When the buffer is full, offer() refuses the readings so the caller can
+    apply backpressure instead of growing memory without bound.
+    """
+
+    def __init__(
+        self,
+        session_factory=SessionLocal,
+        max_size: int = INGEST_BUFFER_MAX,
+        flush_interval_ms: int = INGEST_FLUSH_INTERVAL_MS,
+        batch_size: int = INGEST_BATCH_SIZE,
+    ):
+        self.session_factory = session_factory
+        self.max_size = max_size
+        self.flush_interval = flush_interval_ms / 1000.0
+        self.batch_size = batch_size
+
+        self._queue = deque()
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+
+        self.stats = {
+            "accepted": 0,
+            "rejected": 0,
+            "flushed": 0,
+            "dropped": 0,
+            "flushes": 0,
+            "last_flush_ms": 0.0,
+        }
+
+    # ---------- PRODUCER ----------
+    def offer(self, rows) -> bool:
+        """Queue all rows or none of them. Returns False when the buffer is full."""
+        with self._lock:
+            if len(self._queue) + len(rows) > self.max_size:
+                self.stats["rejected"] += len(rows)
+                return False
+            self._queue.extend(rows)
+            self.stats["accepted"] += len(rows)
+            should_wake = len(self._queue) >= self.batch_size
+
+        if should_wake:
+            self._wakeup.set()
+        return True
+
+    def __len__(self):
+        return len(self._queue)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {**self.stats, "buffered": len(self._queue), "capacity": self.max_size}
+
+    # ---------- LIFECYCLE ----------
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="measurement-flusher", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        # Ghi nốt phần còn lại trước khi tắt
+        self.flush()
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                # Luồng ghi nền không được chết: dữ liệu còn trong buffer được thử lại ở lượt sau
+                print(f"[ERROR] Measurement flusher error: {e}")
+
+    # ---------- CONSUMER ----------
+    def flush(self):
+        while True:
+            with self._lock:
+                n = min(self.batch_size, len(self._queue))
+                batch = [self._queue.popleft() for _ in range(n)]
+            if not batch:
+                return
+
+            start = time.perf_counter()
+            try:
+                self._write(batch)
+            except IntegrityError:
+                # Thường do hồ đã bị xoá trong lúc dữ liệu còn nằm trong buffer
+                if not self._write_per_pool(batch):
+                    return
+            except Exception as e:
+                print(f"[ERROR] Failed to flush {len(batch)} measurements: {e}")
+                self._requeue(batch)
+                return
+
+            self.stats["flushes"] += 1
+            self.stats["last_flush_ms"] = (time.perf_counter() - start) * 1000
+
+    def _write(self, rows):
+        # SQLAlchemy gom executemany thành INSERT ... VALUES (...), (...) nhiều dòng
+        db = self.session_factory()
+        try:
+            db.execute(insert(WaterMeasurement), rows)
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+        self.stats["flushed"] += len(rows)
+
+    def _write_per_pool(self, rows) -> bool:
+        """Write rows pool by pool, dropping pools that violate constraints.
+        Returns False when another DB error stopped it (the unwritten rows are requeued)."""
+        rows = sorted(rows, key=itemgetter("pool_id"))
+        groups = [list(group) for _, group in groupby(rows, key=itemgetter("pool_id"))]
+        for i, group in enumerate(groups):
+            try:
+                self._write(group)
+            except IntegrityError as e:
+                print(f"[WARN] Dropping {len(group)} measurements for pool {group[0]['pool_id']}: {e.orig}")
+                self.stats["dropped"] += len(group)
+            except Exception as e:
+                # Lỗi khác (mất kết nối, ...): giữ lại nhóm này và các nhóm chưa ghi để thử lại
+                remaining = [row for rest in groups[i:] for row in rest]
+                print(f"[ERROR] Failed to flush {len(remaining)} measurements: {e}")
+                self._requeue(remaining)
+                return False
+        return True
+
+    def _requeue(self, rows):
+        with self._lock:
+            room = self.max_size - len(self._queue)
+            keep = rows[:room]
+            self._queue.extendleft(reversed(keep))
+            self.stats["dropped"] += len(rows) - len(keep)
+
+
+measurement_buffer = MeasurementBuffer()
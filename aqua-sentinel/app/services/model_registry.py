@@ -0,0 +1,238 @@
+import json
+import math
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+
+from app.schemas.schema_prediction import SensorPoint
+from app.services.prediction_service import MODEL_DIR, PredictionService
+
+# Mỗi phiên bản model nằm trong <MODEL_DIR>/versions/<version>/ (model + features.json
+# + manifest.json); file CURRENT ghi tên phiên bản đang dùng
+VERSIONS_DIR = "versions"
+CURRENT_FILE = "CURRENT"
+MANIFEST_FILE = "manifest.json"
+
+# Số process phục vụ API (app.prefork: WEB_WORKERS, uvicorn --workers: WEB_CONCURRENCY)
+SERVING_WORKERS = int(os.getenv("WEB_WORKERS") or os.getenv("WEB_CONCURRENCY") or 1)
+# > 0: kiểm tra CURRENT mỗi N giây và tự nạp phiên bản mới; 0: chỉ nạp qua API.
+# API reload chỉ đổi model của worker nhận request rồi ghi CURRENT, nên khi có nhiều
+# worker watcher mặc định bật để các worker còn lại nạp theo
+MODEL_WATCH_INTERVAL_S = float(os.getenv("MODEL_WATCH_INTERVAL_S", 5 if SERVING_WORKERS > 1 else 0))
+
+# Phiên bản khi MODEL_DIR chưa có versions/ (model đặt thẳng trong thư mục)
+UNVERSIONED = "unversioned"
+
+# Giá trị "bình thường" để sinh history giả khi warm model mới
+_WARMUP_READING = dict(
+    temperature=28.0, dissolved_oxygen=6.0, ph=7.5, turbidity=5.0, ammonia=0.02,
+    rain_event=0, feeding_event=0,
+)
+_WARMUP_POINTS = 15
+
+
+def read_manifest(version_dir):
+    path = os.path.join(version_dir, MANIFEST_FILE)
+    if not os.path.isfile(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+
+def write_current(root, version):
+    """Point CURRENT at `version` atomically (readers see the old or the new name, never half)."""
+    tmp = os.path.join(root, f".{CURRENT_FILE}.tmp")
+    with open(tmp, "w") as f:
+        f.write(version + "\n")
+    os.replace(tmp, os.path.join(root, CURRENT_FILE))
+
+
+def _warmup_history():
+    start = datetime(2024, 1, 1, 8, 0)
+    return [
+        SensorPoint(timestamp=(start + timedelta(minutes=5 * i)).isoformat(sep=" "), **_WARMUP_READING)
+        for i in range(_WARMUP_POINTS)
+    ]
+
+
+class ModelRegistry:
+    """
+    Versioned model sets with zero-downtime reload.
+
+    `active` is the PredictionService of the current version. Handlers take it
+    once per request and use that same object for features and inference, so a
+    reload only affects requests that start after the swap; in-flight ones finish
+    on the version they started with. reload() loads and warms the new version
+    off to the side, then replaces the reference in one assignment.
+    """
+
+    def __init__(self, root: str = MODEL_DIR, watch_interval_s: float = MODEL_WATCH_INTERVAL_S):
+        self.root = root
+        self.watch_interval = watch_interval_s
+
+        self._active = None
+        self._lock = threading.Lock()         # khởi tạo / hoán đổi _active
+        self._reload_lock = threading.Lock()  # mỗi lúc chỉ một lần reload
+        self._stop = threading.Event()
+        self._watcher = None
+        self._failed_version = None
+
+        self.stats = {
+            "reloads": 0,
+            "failed_reloads": 0,
+            "last_reload_ms": 0.0,
+            "last_error": None,
+            "activated_at": None,
+        }
+
+    # ---------- VERSIONS ----------
+    def _versions_root(self):
+        return os.path.join(self.root, VERSIONS_DIR)
+
+    def versions(self):
+        """Available versions with their manifests, oldest first."""
+        versions_root = self._versions_root()
+        if not os.path.isdir(versions_root):
+            return []
+        result = []
+        for name in sorted(os.listdir(versions_root)):
+            path = os.path.join(versions_root, name)
+            if os.path.isdir(path):
+                result.append({"version": name, **read_manifest(path)})
+        return result
+
+    def current_version(self):
+        """Version named by CURRENT, else the newest version directory, else UNVERSIONED."""
+        current = os.path.join(self.root, CURRENT_FILE)
+        if os.path.isfile(current):
+            with open(current) as f:
+                name = f.read().strip()
+            if name:
+                return name
+        versions = self.versions()
+        return versions[-1]["version"] if versions else UNVERSIONED
+
+    def version_dir(self, version):
+        if version == UNVERSIONED:
+            return self.root
+        # Tên phiên bản đến từ API reload: chỉ nhận tên thư mục, không cho thoát khỏi versions/
+        separators = [sep for sep in (os.sep, os.altsep, "/") if sep]
+        if not version or version in (".", "..") or any(sep in version for sep in separators):
+            raise ValueError(f"Invalid model version: {version}")
+        path = os.path.join(self._versions_root(), version)
+        if not os.path.isdir(path):
+            raise ValueError(f"Unknown model version: {version}")
+        return path
+
+    # ---------- ACTIVE MODEL SET ----------
+    @property
+    def active(self) -> PredictionService:
+        """Current PredictionService; created on first access, loaded on first use."""
+        service = self._active
+        if service is not None:
+            return service
+        with self._lock:
+            if self._active is None:
+                version = self.current_version()
+                self._active = PredictionService(
+                    model_dir=self.version_dir(version), version=version, preload=False
+                )
+                self.stats["activated_at"] = time.time()
+            return self._active
+
+    def load(self):
+        """Load the active version now (startup hook)."""
+        self.active.load()
+
+    def reload(self, version: str = None, publish: bool = False) -> dict:
+        """
+        Load `version` (default: CURRENT), warm it and swap it in.
+        On any error the previous version stays active and the error is raised.
+        publish=True also points CURRENT at it once active, so the watchers of the
+        other worker processes load the same version.
+        """
+        with self._reload_lock:
+            started = time.perf_counter()
+            try:
+                version = version or self.current_version()
+                service = PredictionService(
+                    model_dir=self.version_dir(version), version=version, preload=True
+                )
+                self._warm(service)
+            except Exception as e:
+                self._failed_version = version
+                self.stats["failed_reloads"] += 1
+                self.stats["last_error"] = f"{version}: {e}"
+                print(f"[ERROR] Model reload to {version} failed, keeping current version: {e}")
+                raise
+
+            with self._lock:
+                previous = self._active.version if self._active is not None else None
+                self._active = service
+            if publish:
+                write_current(self.root, version)
+            self.stats["reloads"] += 1
+            self.stats["last_reload_ms"] = (time.perf_counter() - started) * 1000
+            self.stats["last_error"] = None
+            self._failed_version = None
+            self.stats["activated_at"] = time.time()
+            print(f"[INFO] Model version {previous} -> {version}")
+            return {"previous": previous, "active": version}
+
+    def _warm(self, service):
+        # Một dự đoán giả qua đúng đường đi của request: phát hiện model hỏng trước
+        # khi nhận traffic và khởi tạo sẵn các thư viện / bộ nhớ đệm
+        results, _ = service.predict_batch([_warmup_history()])[0]
+        if set(results) != set(service.output_names) or not all(
+            math.isfinite(v) for v in results.values()
+        ):
+            raise RuntimeError(f"Warm-up prediction is invalid: {results}")
+
+    # ---------- WATCHER ----------
+    def start(self):
+        if self.watch_interval <= 0 or (self._watcher and self._watcher.is_alive()):
+            return
+        self._stop.clear()
+        self._watcher = threading.Thread(target=self._watch, name="model-watcher", daemon=True)
+        self._watcher.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._watcher:
+            self._watcher.join(timeout=5)
+
+    def _watch(self):
+        while not self._stop.wait(self.watch_interval):
+            try:
+                version = self.current_version()
+                # Phiên bản lỗi không được thử lại cho tới khi CURRENT đổi
+                if (
+                    self._active is not None
+                    and version != self._active.version
+                    and version != self._failed_version
+                ):
+                    self.reload(version)
+            except Exception:
+                pass  # lỗi đã được ghi ở reload()
+
+    def snapshot(self) -> dict:
+        active = self._active
+        return {
+            "active_version": active.version if active is not None else None,
+            "variant": active.variant if active is not None else None,
+            "loaded": bool(active is not None and active.output_names),
+            "current_file_version": self.current_version(),
+            "watch_interval_s": self.watch_interval,
+            **self.stats,
+            "segments": active.segment_snapshot() if active is not None else None,
+        }
+
+
+def resolve_model_dir(root=MODEL_DIR):
+    """Directory of the version CURRENT points at (for scripts that read one model set)."""
+    registry = ModelRegistry(root)
+    return registry.version_dir(registry.current_version())
+
+
+model_registry = ModelRegistry()
@@ -1,13 +1,118 @@
-import pandas as pd
-import joblib
+import json
 import os
+import re
+import threading
+from collections import OrderedDict
 import numpy as np
 from typing import List
 
+# pandas / xgboost / joblib được import trong hàm khi thật sự cần để khởi động nhanh
+from app.services.feature_engine import engineer_batch
+from app.services.inference_skip import InferenceSkipper
+from app.services.tree_engine import TreeEnsembleEngine
+
+MODEL_DIR = os.getenv("MODEL_DIR", "./app/models_storage/")
+
+# "pandas" (mặc định) hoặc "numpy" (không qua DataFrame, kết quả giống hệt từng bit)
+FEATURE_ENGINE = os.getenv("FEATURE_ENGINE", "pandas")
+
+# "xgboost" (mặc định) hoặc "numpy" (TreeEnsembleEngine, nhanh hơn nhiều với vài dòng)
+INFERENCE_ENGINE = os.getenv("INFERENCE_ENGINE", "xgboost")
+# Lô lớn hơn ngưỡng này vẫn gọi XGBoost gốc (C++ nhanh hơn khi có nhiều dòng)
+NUMPY_ENGINE_MAX_ROWS = int(os.getenv("NUMPY_ENGINE_MAX_ROWS", 32))
+
+# "auto": dùng xgb_multi.* nếu có, ngược lại một file xgb_<target> cho mỗi target
+# "multi" / "per_target": ép một layout
+MODEL_LAYOUT = os.getenv("MODEL_LAYOUT", "auto")
+
+# Thứ tự ưu tiên khi tìm xgb_<name>.*: định dạng gốc của XGBoost, rồi pickle (joblib) cũ
+MODEL_FILE_EXTENSIONS = (".json", ".ubj", ".pkl")
+
+# Số luồng XGBoost mỗi lần predict. Model train với n_jobs=-1 sẽ dùng mọi core,
+# nhân lên với số worker uvicorn và số luồng inference -> tranh chấp CPU
+XGB_NTHREAD = int(os.getenv("XGB_NTHREAD", 1))
+
+# Bộ model chuyên biệt theo loài / vùng: <version>/segments/<key>/ (train_model.py --segment-by)
+SEGMENTS_DIR = "segments"
+# Bộ model gọn (train_model.py --variants): <bộ model>/variants/<tên>/. Mỗi tầng triển khai
+# đặt tên riêng, ví dụ edge: MODEL_VARIANT=tiny; rỗng = model đầy đủ
+VARIANTS_DIR = "variants"
+MODEL_VARIANT = os.getenv("MODEL_VARIANT", "")
+# Ngân sách bộ nhớ cho các bộ model chuyên biệt đang nạp (ước lượng theo dung lượng file model)
+MODEL_CACHE_MAX_MB = float(os.getenv("MODEL_CACHE_MAX_MB", 512))
+
+# Khoảng cách giữa 2 lần đo; horizon 5 phút là bước kế tiếp
+STEP_MINUTES = 5
+_HORIZON_SUFFIX = re.compile(r"^(.+)_(\d+)min$")
+
+
+def horizon_output(target, minutes):
+    """Output name of `target` `minutes` ahead; the 5-minute horizon keeps the plain target name."""
+    return target if minutes == STEP_MINUTES else f"{target}_{minutes}min"
+
+
+def split_horizons(results):
+    """{"ph": .., "ph_15min": ..} -> {5: {"ph": ..}, 15: {"ph": ..}}"""
+    horizons = {}
+    for name, value in results.items():
+        match = _HORIZON_SUFFIX.match(name)
+        target, minutes = (match.group(1), int(match.group(2))) if match else (name, STEP_MINUTES)
+        horizons.setdefault(minutes, {})[target] = value
+    return dict(sorted(horizons.items()))
+
+
+def segment_key(species=None, region_id=None):
+    """Directory name of a specialised model set, e.g. "species=tom,region=<uuid>"."""
+    parts = []
+    if species:
+        parts.append(f"species={species}")
+    if region_id:
+        parts.append(f"region={region_id}")
+    return ",".join(parts)
+
+
+def _model_set_bytes(model_dir):
+    return sum(
+        os.path.getsize(os.path.join(model_dir, f))
+        for f in os.listdir(model_dir)
+        if f.startswith("xgb_") and os.path.isfile(os.path.join(model_dir, f))
+    )
+
 
 class PredictionService:
-    def __init__(self, model_dir: str = "./app/models_storage/"):
+    def __init__(
+        self,
+        model_dir: str = MODEL_DIR,
+        feature_engine: str = FEATURE_ENGINE,
+        inference_engine: str = INFERENCE_ENGINE,
+        model_layout: str = MODEL_LAYOUT,
+        nthread: int = XGB_NTHREAD,
+        preload: bool = True,
+        version: str = None,
+        segment_cache_mb: float = MODEL_CACHE_MAX_MB,
+        variant: str = MODEL_VARIANT,
+    ):
+        if feature_engine not in ("pandas", "numpy"):
+            raise ValueError(f"Unknown feature engine: {feature_engine}")
+        if inference_engine not in ("xgboost", "numpy"):
+            raise ValueError(f"Unknown inference engine: {inference_engine}")
+        if model_layout not in ("auto", "multi", "per_target"):
+            raise ValueError(f"Unknown model layout: {model_layout}")
         self.model_dir = model_dir
+        self.version = version
+        self.variant = variant or None
+        # Thư mục chứa file model: biến thể nếu có, ngược lại chính bộ model
+        self.files_dir = model_dir
+        if self.variant:
+            path = os.path.join(model_dir, VARIANTS_DIR, self.variant)
+            if os.path.isdir(path):
+                self.files_dir = path
+            else:
+                print(f"[WARN] Model variant '{self.variant}' not found in {model_dir}, using full models")
+        self.feature_engine = feature_engine
+        self.inference_engine = inference_engine
+        self.model_layout = model_layout
+        self.nthread = nthread
         self.targets = [
             "dissolved_oxygen",
             "ph",
@@ -16,9 +121,132 @@ class PredictionService:
             "temperature",
         ]
         self.models = {}
+        self.fused_model = None
+        self.output_names = []  # thứ tự cột output của _infer
         self.feature_cols = []
+        self.tree_engine = None
+
+        self._model_names = []  # "multi" hoặc các target, theo layout
+        self._loaded = False
+        self._load_lock = threading.Lock()
+        self._xgb_loaded = False
+        self._xgb_lock = threading.Lock()
+
+        # Tái dùng dự báo của hồ ổn định (INFERENCE_SKIP=1), riêng cho bộ model này
+        self.skipper = InferenceSkipper()
+
+        # LRU các bộ model chuyên biệt: key -> PredictionService
+        self.segment_cache_bytes = int(segment_cache_mb * 1024 * 1024)
+        self._segment_keys = None
+        self._segments = OrderedDict()
+        self._segment_bytes = {}
+        self._segment_lock = threading.Lock()
+        self.segment_stats = {"hits": 0, "misses": 0, "evictions": 0, "fallbacks": 0}
 
-        self._load_models()
+        if preload:
+            self.load()
+
+    def load(self):
+        """Load the models once; later calls (from any thread) wait for / reuse that load."""
+        if self._loaded:
+            return
+        with self._load_lock:
+            if not self._loaded:
+                self._load_models()
+                self._loaded = True
+
+    @property
+    def loaded(self) -> bool:
+        return self._loaded
+
+    @property
+    def horizons(self) -> List[int]:
+        """Forecast horizons (minutes) of the loaded model set."""
+        return list(split_horizons(dict.fromkeys(self.output_names)))
+
+    # ---------- SPECIALISED MODEL SETS ----------
+    def route(self, species=None, region_id=None):
+        """
+        Model set for a pool: species+region, then species, then region, then
+        this (global) set. Specialised sets are created on first use (and load
+        lazily like any PredictionService) and kept in an LRU cache bounded by
+        segment_cache_bytes.
+        """
+        keys = self._available_segments()
+        if not keys:
+            return self
+
+        region_id = str(region_id) if region_id else None
+        for key in (
+            segment_key(species, region_id),
+            segment_key(species=species),
+            segment_key(region_id=region_id),
+        ):
+            if key and key in keys:
+                return self._segment(key)
+
+        with self._segment_lock:
+            self.segment_stats["fallbacks"] += 1
+        return self
+
+    def _available_segments(self):
+        if self._segment_keys is None:
+            path = os.path.join(self.model_dir, SEGMENTS_DIR)
+            self._segment_keys = frozenset(os.listdir(path)) if os.path.isdir(path) else frozenset()
+        return self._segment_keys
+
+    def _segment(self, key):
+        with self._segment_lock:
+            service = self._segments.get(key)
+            if service is not None:
+                self._segments.move_to_end(key)
+                self.segment_stats["hits"] += 1
+                return service
+
+            self.segment_stats["misses"] += 1
+            path = os.path.join(self.model_dir, SEGMENTS_DIR, key)
+            service = PredictionService(
+                model_dir=path,
+                feature_engine=self.feature_engine,
+                inference_engine=self.inference_engine,
+                model_layout=self.model_layout,
+                nthread=self.nthread,
+                preload=False,
+                version=f"{self.version}/{key}",
+                segment_cache_mb=0,
+                variant=self.variant,
+            )
+            self._segments[key] = service
+            self._segment_bytes[key] = _model_set_bytes(service.files_dir)
+            self._evict()
+            return service
+
+    def _evict(self):
+        # Bỏ bộ ít dùng nhất cho tới khi vừa ngân sách (luôn giữ bộ vừa nạp).
+        # Request đang giữ bộ bị loại vẫn chạy xong bình thường, GC giải phóng sau
+        while len(self._segments) > 1 and sum(self._segment_bytes.values()) > self.segment_cache_bytes:
+            key, _ = self._segments.popitem(last=False)
+            del self._segment_bytes[key]
+            self.segment_stats["evictions"] += 1
+
+    def segment_snapshot(self) -> dict:
+        with self._segment_lock:
+            return {
+                "available": sorted(self._available_segments()),
+                "loaded": list(self._segments),
+                "loaded_mb": sum(self._segment_bytes.values()) / (1024 * 1024),
+                "budget_mb": self.segment_cache_bytes / (1024 * 1024),
+                **self.segment_stats,
+            }
+
+    def skip_snapshot(self) -> dict:
+        """InferenceSkipper stats of this set and of every loaded specialised set."""
+        with self._segment_lock:
+            segments = list(self._segments.items())
+        return {
+            "global": self.skipper.snapshot(),
+            **{key: service.skipper.snapshot() for key, service in segments},
+        }
 
     # ---------- MODEL LOADING ----------
     def _load_models(self):
@@ -26,30 +254,135 @@ class PredictionService:
             print(f"[WARN] Model directory not found: {self.model_dir}")
             return
 
-        # Load models
-        for t in self.targets:
-            path = os.path.join(self.model_dir, f"xgb_{t}.pkl")
-            if os.path.isfile(path):
-                try:
-                    self.models[t] = joblib.load(path)
-                except Exception as e:
-                    print(f"[ERROR] Failed to load model {path}: {e}")
+        self._load_feature_cols()
+
+        fused = self.model_layout == "multi" or (
+            self.model_layout == "auto" and self._find_model_file("multi") is not None
+        )
+        self._model_names = ["multi"] if fused else [
+            horizon_output(target, minutes) for minutes in self._file_horizons() for target in self.targets
+        ]
+
+        # Engine numpy + model .json: đọc cây thẳng từ file, chưa cần import xgboost
+        if self.inference_engine == "numpy" and self._compile_from_json():
+            return
+
+        self._load_xgb_models()
+        if self.inference_engine == "numpy" and self.output_names:
+            try:
+                if self.fused_model is not None:
+                    self.tree_engine = TreeEnsembleEngine.from_multi_output(
+                        self.fused_model, len(self.output_names)
+                    )
+                else:
+                    self.tree_engine = TreeEnsembleEngine.from_models(self.models, self.output_names)
+            except Exception as e:
+                print(f"[ERROR] Failed to compile tree engine, using xgboost: {e}")
+
+    def _load_feature_cols(self):
+        features_json = os.path.join(self.files_dir, "features.json")
+        features_pkl = os.path.join(self.files_dir, "features.pkl")
+        try:
+            if os.path.isfile(features_json):
+                with open(features_json) as f:
+                    self.feature_cols = json.load(f)
+            elif os.path.isfile(features_pkl):
+                import joblib
+                self.feature_cols = joblib.load(features_pkl)
             else:
+                print(f"[WARN] Missing features.json in {self.files_dir}")
+        except Exception as e:
+            print(f"[ERROR] Failed to load feature list: {e}")
+
+    def _file_horizons(self):
+        # train_model.py --horizons ghi thêm xgb_<target>_<phút>min.* cho mỗi horizon > 5 phút
+        pattern = re.compile(rf"^xgb_{self.targets[0]}_(\d+)min\.")
+        minutes = {int(m.group(1)) for m in map(pattern.match, os.listdir(self.files_dir)) if m}
+        return sorted(minutes | {STEP_MINUTES})
 
-                print(f"[WARN] Missing model file: {path}")
+    def _find_model_file(self, name):
+        # Định dạng gốc của XGBoost (.json / .ubj) trước, pickle cũ sau cùng
+        for ext in MODEL_FILE_EXTENSIONS:
+            path = os.path.join(self.files_dir, f"xgb_{name}{ext}")
+            if os.path.isfile(path):
+                return path
+        return None
 
-        # Load feature list
-        features_path = os.path.join(self.model_dir, "features.pkl")
-        if os.path.isfile(features_path):
+    def _load_xgb_models(self):
+        for name in self._model_names:
+            path = self._find_model_file(name)
+            if path is None:
+                print(f"[WARN] Missing model file: xgb_{name}.ubj in {self.files_dir}")
+                continue
             try:
-                self.feature_cols = joblib.load(features_path)
+                if path.endswith(".pkl"):
+                    import joblib
+                    model = joblib.load(path)
+                else:
+                    from xgboost import XGBRegressor
+                    model = XGBRegressor()
+                    model.load_model(path)
             except Exception as e:
-                print(f"[ERROR] Failed to load features.pkl: {e}")
-        else:
-            print(f"[WARN] Missing features.pkl in {self.model_dir}")
+                print(f"[ERROR] Failed to load model {path}: {e}")
+                continue
+
+            model = self._set_nthread(model)
+            if name == "multi":
+                # train_model.py --multi-output ghi thứ tự target vào booster
+                targets = model.get_booster().attr("targets")
+                self.output_names = targets.split(",") if targets else list(self.targets)
+                self.fused_model = model
+            else:
+                self.models[name] = model
+
+        if self.fused_model is None:
+            self.output_names = list(self.models)
+        self._xgb_loaded = True
+
+    def _ensure_xgb_models(self):
+        # Khi tree engine được dựng từ .json, model XGBoost chỉ nạp ở lô lớn đầu tiên
+        if self._xgb_loaded:
+            return
+        with self._xgb_lock:
+            if not self._xgb_loaded:
+                self._load_xgb_models()
+
+    def _compile_from_json(self):
+        paths = [self._find_model_file(name) for name in self._model_names]
+        if not all(path is not None and path.endswith(".json") for path in paths):
+            return False
+
+        try:
+            documents = []
+            for path in paths:
+                with open(path) as f:
+                    documents.append(json.load(f))
+
+            if self._model_names == ["multi"]:
+                targets = documents[0]["learner"].get("attributes", {}).get("targets")
+                output_names = targets.split(",") if targets else list(self.targets)
+                boosters = [(documents[0], list(range(len(output_names))))]
+            else:
+                output_names = list(self._model_names)
+                boosters = [(doc, [j]) for j, doc in enumerate(documents)]
+
+            self.tree_engine = TreeEnsembleEngine(boosters, len(output_names))
+        except Exception as e:
+            print(f"[ERROR] Failed to compile tree engine from json, using xgboost: {e}")
+            return False
+
+        self.output_names = output_names
+        return True
+
+    def _set_nthread(self, model):
+        model.set_params(n_jobs=self.nthread)
+        model.get_booster().set_param("nthread", self.nthread)
+        return model
 
     # ---------- FEATURE ENGINEERING ----------
     def _engineer_features(self, history):
+        import pandas as pd
+
         if not history:
             raise ValueError("History is empty")
 
@@ -77,34 +410,115 @@ class PredictionService:
         return df.iloc[[-1]].fillna(0)
 
     # ---------- PREDICTION ----------
-    def predict(self, history):
-        if not self.models:
+    def _check_ready(self):
+        self.load()
+        if not self.output_names:
             raise RuntimeError("PredictionService has no loaded models")
 
         if not self.feature_cols:
             raise RuntimeError("Feature columns not loaded")
 
-        latest_df = self._engineer_features(history)
-        current_do = latest_df.get("dissolved_oxygen", [0]).values[0]
+    def predict(self, history):
+        return self.predict_batch([history])[0]
+
+    def predict_batch(self, histories):
+        """
+        Predict for many pools at once: one feature matrix, one model.predict per target.
+        Returns a list of (results, current_state) in the same order as histories.
+        """
+        self._check_ready()
+        return self.predict_matrix(self.feature_matrix(histories))
+
+    def feature_matrix(self, histories):
+        """(len(histories), len(feature_cols)) matrix with the configured feature engine."""
+        self.load()
+        if self.feature_engine == "numpy":
+            return engineer_batch(histories, self.feature_cols)
+
+        import pandas as pd
+
+        frames = [self._engineer_features(h) for h in histories]
+        batch_df = pd.concat(frames, ignore_index=True)
 
         # Ensure feature consistency
         for col in self.feature_cols:
-            if col not in latest_df.columns:
-                latest_df[col] = 0
+            if col not in batch_df.columns:
+                batch_df[col] = 0
 
-        results = {}
-        for name, model in self.models.items():
-            pred = float(model.predict(latest_df[self.feature_cols])[0])
+        return batch_df[self.feature_cols].to_numpy(dtype=np.float64)
+
+    def feature_row(self, features: dict):
+        """(1, len(feature_cols)) matrix from a feature dict (e.g. RollingFeatureState.features())."""
+        self.load()
+        return np.array([[features.get(c, 0.0) for c in self.feature_cols]], dtype=np.float64)
+
+    def predict_features(self, features: dict):
+        return self.predict_matrix(self.feature_row(features))[0]
+
+    def predict_matrix(self, X):
+        """
+        Core inference on a (n_rows, len(feature_cols)) array.
+        Returns a list of (results, current_state) per row; results holds every
+        horizon (split_horizons() groups them), all computed in the same pass.
+        """
+        self._check_ready()
+
+        raw_preds = self._infer(X)
 
-            # Physical constraint for DO
-            if name == "dissolved_oxygen":
-                delta_3 = latest_df.get("dissolved_oxygen_delta_3", [0]).values[0]
-                if delta_3 < -0.1:
-                    pred = min(pred, current_do)
+        do_idx = self.feature_cols.index("dissolved_oxygen")
+        do_delta_3_idx = self.feature_cols.index("dissolved_oxygen_delta_3")
+        # DO ở mọi horizon
+        do_outputs = {name for name in raw_preds if _HORIZON_SUFFIX.sub(r"\1", name) == "dissolved_oxygen"}
 
-            results[name] = max(0.0, round(pred, 2))
-        
-        return results, latest_df.iloc[0].to_dict()
+        outputs = []
+        for i, row in enumerate(X):
+            current_do = float(row[do_idx])
+            results = {}
+            for name, preds in raw_preds.items():
+                pred = float(preds[i])
 
+                # Physical constraint for DO
+                if name in do_outputs:
+                    if row[do_delta_3_idx] < -0.1:
+                        pred = min(pred, current_do)
+
+                results[name] = max(0.0, round(pred, 2))
+
+            outputs.append((results, dict(zip(self.feature_cols, row.tolist()))))
+
+        return outputs
+
+    def predict_columns(self, X):
+        """
+        Vectorized predict_matrix for offline use (backtest): name -> array of
+        post-processed predictions (DO constraint, 2 decimals, >= 0) for all rows.
+        np.round may differ from round() in the last decimal on rare ties.
+        """
+        self._check_ready()
+        raw_preds = self._infer(X)
+
+        current_do = X[:, self.feature_cols.index("dissolved_oxygen")]
+        do_falling = X[:, self.feature_cols.index("dissolved_oxygen_delta_3")] < -0.1
+
+        results = {}
+        for name, preds in raw_preds.items():
+            preds = np.asarray(preds, dtype=np.float64)
+            if _HORIZON_SUFFIX.sub(r"\1", name) == "dissolved_oxygen":
+                preds = np.where(do_falling, np.minimum(preds, current_do), preds)
+            results[name] = np.maximum(0.0, np.round(preds, 2))
+        return results
+
+    def _infer(self, X):
+        """Raw model outputs per target for a feature matrix."""
+        if self.tree_engine is not None and len(X) <= NUMPY_ENGINE_MAX_ROWS:
+            out = self.tree_engine.predict(X)
+            return {name: out[:, j] for j, name in enumerate(self.output_names)}
+
+        self._ensure_xgb_models()
+        if self.fused_model is not None:
+            # Một lần gọi cho cả 5 target
+            out = self.fused_model.predict(X)
+        else:
+            return {name: model.predict(X) for name, model in self.models.items()}
 
-prediction_service = PredictionService()
\ No newline at end of file
+        return {name: out[:, j] for j, name in enumerate(self.output_names)}
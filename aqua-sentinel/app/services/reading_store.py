@@ -0,0 +1,150 @@
+import os
+import threading
+import time
+
+import numpy as np
+from sqlalchemy import select
+
+from app.models.models import WaterMeasurement
+from app.services.feature_engine import TARGET_COLS, RollingFeatureState
+
+# 5 chỉ số + 2 cờ sự kiện, đúng thứ tự cột của block
+CHANNELS = TARGET_COLS + ["rain_event", "feeding_event"]
+
+# Cần > 12 điểm để delta_12 có giá trị thật
+READING_BUFFER_SIZE = int(os.getenv("READING_BUFFER_SIZE", 16))
+# Nạp lại buffer của một hồ từ DB sau N giây. Mỗi worker có buffer riêng và /ingest chỉ
+# cập nhật worker nhận request: dữ liệu ingest ở worker khác được thấy muộn nhất sau
+# chừng này (+ chu kỳ flush của ingest_buffer). 0 = nạp lại ở mọi lần dự báo
+READING_STORE_TTL_S = float(os.getenv("READING_STORE_TTL_S", 30))
+
+
+class PoolRingBuffer:
+    """
+    Preallocated (capacity, len(CHANNELS)) block holding the last readings of one pool,
+    plus the incremental feature state those readings produce.
+    """
+
+    __slots__ = ("values", "timestamps", "head", "count", "state", "warmed_at")
+
+    def __init__(self, capacity: int):
+        # float64 để đặc trưng tính từ buffer khớp từng bit với đường history
+        self.values = np.zeros((capacity, len(CHANNELS)), dtype=np.float64)
+        self.timestamps = [None] * capacity
+        self.head = 0  # vị trí ghi tiếp theo
+        self.count = 0
+        self.state = RollingFeatureState()
+        self.warmed_at = None  # time.monotonic() của lần nạp từ DB gần nhất
+
+    @property
+    def capacity(self):
+        return self.values.shape[0]
+
+    @property
+    def last_timestamp(self):
+        if self.count == 0:
+            return None
+        return self.timestamps[(self.head - 1) % self.capacity]
+
+    def append(self, timestamp, row) -> bool:
+        # Bỏ qua điểm cũ hơn hoặc trùng (gateway gửi lại)
+        last = self.last_timestamp
+        if last is not None and timestamp <= last:
+            return False
+        self.values[self.head] = row
+        self.timestamps[self.head] = timestamp
+        self.head = (self.head + 1) % self.capacity
+        self.count = min(self.count + 1, self.capacity)
+
+        n = len(TARGET_COLS)
+        self.state.update(timestamp, row[:n], rain_event=row[n], feeding_event=row[n + 1])
+        return True
+
+    def ordered(self):
+        """Copy of the readings, oldest first, with their timestamps."""
+        idx = (np.arange(self.head - self.count, self.head)) % self.capacity
+        return self.values[idx], [self.timestamps[i] for i in idx]
+
+
+class ReadingStore:
+    """In-memory last-N readings per pool, fed by /ingest and warmed from water_measurement."""
+
+    def __init__(self, capacity: int = READING_BUFFER_SIZE, ttl_s: float = READING_STORE_TTL_S):
+        self.capacity = capacity
+        self.ttl_s = ttl_s
+        self._buffers = {}
+        self._lock = threading.Lock()
+
+    def append_points(self, pool_id, points):
+        """points: iterable of (timestamp, SensorPoint)."""
+        with self._lock:
+            ring = self._buffers.get(pool_id)
+            if ring is None:
+                ring = self._buffers[pool_id] = PoolRingBuffer(self.capacity)
+            for ts, p in points:
+                ring.append(ts, [getattr(p, c) for c in CHANNELS])
+
+    def window(self, pool_id):
+        """Returns (values, timestamps) oldest first, or None if the pool is not cached."""
+        with self._lock:
+            ring = self._buffers.get(pool_id)
+            if ring is None or ring.count == 0:
+                return None
+            return ring.ordered()
+
+    def latest_features(self, pool_id):
+        """Features of the newest reading from the incremental state (O(1)), or None."""
+        with self._lock:
+            ring = self._buffers.get(pool_id)
+            if ring is None or ring.count == 0:
+                return None
+            return ring.state.features()
+
+    def count(self, pool_id) -> int:
+        with self._lock:
+            ring = self._buffers.get(pool_id)
+            return ring.count if ring is not None else 0
+
+    def needs_warm(self, pool_id, min_count: int) -> bool:
+        """
+        True when the pool's ring must be (re)loaded from the DB: missing, shorter
+        than min_count, only fed by this worker's /ingest, or warmed more than ttl_s ago.
+        """
+        with self._lock:
+            ring = self._buffers.get(pool_id)
+            if ring is None or ring.count < min_count or ring.warmed_at is None:
+                return True
+            return time.monotonic() - ring.warmed_at >= self.ttl_s
+
+    async def warm(self, db, pool_id):
+        """Load the last `capacity` readings of a pool (AsyncSession) with one (pool_id, created_at) indexed query."""
+        rows = (await db.execute(
+            select(WaterMeasurement).where(
+                WaterMeasurement.pool_id == pool_id
+            ).order_by(WaterMeasurement.created_at.desc()).limit(self.capacity)
+        )).scalars().all()
+
+        ring = PoolRingBuffer(self.capacity)
+        for m in reversed(rows):
+            # water_measurement không lưu cờ mưa / cho ăn -> mặc định 0
+            row = [m.dissolved_oxygen, m.ph, m.amonia, m.turbidity, m.temperature, 0, 0]
+            if any(v is None for v in row):
+                continue
+            ring.append(m.created_at, row)
+        ring.warmed_at = time.monotonic()
+
+        with self._lock:
+            # Giữ lại các điểm mới hơn còn nằm trong buffer ghi (chưa flush xuống DB)
+            old = self._buffers.get(pool_id)
+            if old is not None:
+                values, timestamps = old.ordered()
+                for ts, row in zip(timestamps, values):
+                    ring.append(ts, row)
+            self._buffers[pool_id] = ring
+
+    def evict(self, pool_id):
+        with self._lock:
+            self._buffers.pop(pool_id, None)
+
+
+reading_store = ReadingStore()
@@ -0,0 +1,112 @@
+import asyncio
+import hashlib
+import os
+import time
+from collections import OrderedDict
+
+# Số kết quả tối đa giữ lại (0 = tắt cache và gộp request)
+RESULT_CACHE_SIZE = int(os.getenv("RESULT_CACHE_SIZE", 10000))
+# Thời gian sống của một kết quả (giây)
+RESULT_CACHE_TTL_S = float(os.getenv("RESULT_CACHE_TTL_S", 30))
+
+HIT = "hit"
+WAIT = "wait"
+LEAD = "lead"
+
+
+def result_key(version, species, row) -> bytes:
+    """Content address of a prediction: model version + species + exact feature values."""
+    h = hashlib.blake2b(digest_size=16)
+    h.update(f"{version}\0{species}\0".encode())
+    h.update(row.tobytes())
+    return h.digest()
+
+
+class PredictionResultCache:
+    """
+    TTL + LRU cache of /predict responses with in-flight deduplication.
+
+    acquire(key) answers one of:
+      (HIT, response)  - cached and not expired
+      (WAIT, future)   - another request is computing the same key; await the future
+      (LEAD, None)     - caller computes, then complete(key, response) or fail(key, exc)
+
+    Only used from the event loop, so no lock is needed.
+    """
+
+    def __init__(self, max_entries: int = RESULT_CACHE_SIZE, ttl_s: float = RESULT_CACHE_TTL_S):
+        self.max_entries = max_entries
+        self.ttl_s = ttl_s
+        self._entries = OrderedDict()  # key -> (response, expires_at)
+        self._inflight = {}            # key -> Future
+
+        self.stats = {
+            "hits": 0,
+            "misses": 0,
+            "coalesced": 0,  # request chờ kết quả của request giống hệt đang chạy
+            "evictions": 0,
+            "expired": 0,
+        }
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0
+
+    def acquire(self, key):
+        if not self.enabled:
+            return LEAD, None
+
+        entry = self._entries.get(key)
+        if entry is not None:
+            response, expires_at = entry
+            if time.monotonic() < expires_at:
+                self._entries.move_to_end(key)
+                self.stats["hits"] += 1
+                return HIT, response
+            del self._entries[key]
+            self.stats["expired"] += 1
+
+        future = self._inflight.get(key)
+        if future is not None:
+            self.stats["coalesced"] += 1
+            return WAIT, future
+
+        self.stats["misses"] += 1
+        future = asyncio.get_running_loop().create_future()
+        # Không ai chờ thì lỗi của future không bị báo "never retrieved"
+        future.add_done_callback(lambda f: f.cancelled() or f.exception())
+        self._inflight[key] = future
+        return LEAD, None
+
+    def complete(self, key, response):
+        if not self.enabled:
+            return
+        self._entries[key] = (response, time.monotonic() + self.ttl_s)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.stats["evictions"] += 1
+
+        future = self._inflight.pop(key, None)
+        if future is not None and not future.done():
+            future.set_result(response)
+
+    def fail(self, key, exc):
+        future = self._inflight.pop(key, None)
+        if future is not None and not future.done():
+            future.set_exception(exc)
+
+    def snapshot(self) -> dict:
+        lookups = (self.stats["hits"] + self.stats["misses"] + self.stats["coalesced"]) or 1
+        return {
+            "enabled": self.enabled,
+            "max_entries": self.max_entries,
+            "ttl_s": self.ttl_s,
+            "size": len(self._entries),
+            "inflight": len(self._inflight),
+            **self.stats,
+            "hit_rate": (self.stats["hits"] + self.stats["coalesced"]) / lookups,
+        }
+
+
+result_cache = PredictionResultCache()
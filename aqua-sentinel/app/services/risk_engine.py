@@ -1,5 +1,47 @@
+import numpy as np
+from typing import List
+
+LEVELS = ("SAFE", "WARNING", "DANGER_ACTION_NEEDED")
+LEVELS_ARRAY = np.array(LEVELS)
+
+# Mã lý do, theo đúng thứ tự assess_risk thêm câu vào "reasons"
+(
+    R_DO_DANGER, R_DO_WARNING, R_PH_SEVERE, R_PH_MILD, R_NH3_DANGER, R_NH3_WARNING,
+    R_TEMP_SEVERE, R_TEMP_MILD, R_TEMP_SHOCK, R_DO_CURRENT,
+) = range(10)
+N_REASONS = 10
+# Điểm cộng của từng mã (R_DO_CURRENT không cộng mà nâng điểm lên tối thiểu 5)
+REASON_POINTS = np.array([5, 2, 3, 1, 5, 2, 3, 1, 5, 0], dtype=np.int64)
+
+REASON_TEMPLATES = {
+    R_DO_DANGER: "Nồng độ Oxi dự đoán ({value:.2f}) < Ngưỡng chết ({do_danger})",
+    R_DO_WARNING: "Nồng độ Oxi dự đoán ({value:.2f}) < Ngưỡng cảnh báo ({do_warning})",
+    R_PH_SEVERE: "Nồng độ pH ({value:.2f}) lệch nghiêm trọng khỏi chuẩn {ph_min}-{ph_max}",
+    R_PH_MILD: "Nồng độ pH ({value:.2f}) lệch nhẹ khỏi chuẩn",
+    R_NH3_DANGER: "Nồng độ NH3 ({value:.4f}) vượt ngưỡng độc ({ammonia_danger})",
+    R_NH3_WARNING: "Nồng độ NH3 ({value:.4f}) mức cảnh báo ({ammonia_warning})",
+    R_TEMP_SEVERE: "Nhiệt độ ({value:.1f}°C) vượt ngưỡng chịu đựng!",
+    R_TEMP_MILD: "Nhiệt độ ({value:.1f}°C) không tối ưu",
+    R_TEMP_SHOCK: "Nguy cơ SỐC NHIỆT! Biến động {value:.1f}°C cực nhanh.",
+    R_DO_CURRENT: "DO hiện tại ({value:.2f}) đã ở mức nguy hiểm!",
+}
+
+# Cột của bảng ngưỡng numpy
+THRESHOLD_FIELDS = (
+    "do_danger", "do_warning", "ph_min", "ph_max", "ammonia_danger", "ammonia_warning",
+    "temp_min", "temp_max", "temp_shock_delta",
+)
+
+
+def render_reason(code: int, cfg: dict, value: float) -> str:
+    """Vietnamese text of a reason code for one row."""
+    return REASON_TEMPLATES[code].format(value=value, **cfg)
+
+
 class RiskEngine:
     def __init__(self):
+        self._threshold_table = None
+        self._species_index = None
         self.SPECIES_CONFIG = {
             "tom": {
                 "do_danger": 3.5, "do_warning": 5.0,
@@ -63,30 +105,30 @@ class RiskEngine:
         
         if pred_do < cfg["do_danger"]:
             score += 5
-            details.append(f"Nồng độ Oxi dự đoán ({pred_do:.2f}) < Ngưỡng chết ({cfg['do_danger']})")
+            details.append(render_reason(R_DO_DANGER, cfg, pred_do))
         elif pred_do < cfg["do_warning"]:
             score += 2
-            details.append(f"Nồng độ Oxi dự đoán ({pred_do:.2f}) < Ngưỡng cảnh báo ({cfg['do_warning']})")
+            details.append(render_reason(R_DO_WARNING, cfg, pred_do))
 
         # === 3. Đánh giá pH ===
         pred_ph = prediction.get("ph", 7.0)
         
         if pred_ph < (cfg["ph_min"] - 0.5) or pred_ph > (cfg["ph_max"] + 0.5):
             score += 3
-            details.append(f"Nồng độ pH ({pred_ph:.2f}) lệch nghiêm trọng khỏi chuẩn {cfg['ph_min']}-{cfg['ph_max']}")
+            details.append(render_reason(R_PH_SEVERE, cfg, pred_ph))
         elif pred_ph < cfg["ph_min"] or pred_ph > cfg["ph_max"]:
             score += 1
-            details.append(f"Nồng độ pH ({pred_ph:.2f}) lệch nhẹ khỏi chuẩn")
+            details.append(render_reason(R_PH_MILD, cfg, pred_ph))
 
         # === 4. Đánh giá Ammonia ===
         pred_amm = prediction.get("ammonia", 0)
         
         if pred_amm > cfg["ammonia_danger"]:
             score += 5
-            details.append(f"Nồng độ NH3 ({pred_amm:.4f}) vượt ngưỡng độc ({cfg['ammonia_danger']})")
+            details.append(render_reason(R_NH3_DANGER, cfg, pred_amm))
         elif pred_amm > cfg["ammonia_warning"]:
             score += 2
-            details.append(f"Nồng độ NH3 ({pred_amm:.4f}) mức cảnh báo ({cfg['ammonia_warning']})")
+            details.append(render_reason(R_NH3_WARNING, cfg, pred_amm))
 
         # === 5. Đánh giá Nhiệt độ (MỚI) ===
         # Chỉ đánh giá nếu có dữ liệu nhiệt độ, nếu không thì bỏ qua (tránh lỗi)
@@ -97,16 +139,16 @@ class RiskEngine:
             # 5.1 Quá nóng hoặc Quá lạnh
             if pred_temp < (cfg["temp_min"] - 2) or pred_temp > (cfg["temp_max"] + 2):
                 score += 3
-                details.append(f"Nhiệt độ ({pred_temp:.1f}°C) vượt ngưỡng chịu đựng!")
+                details.append(render_reason(R_TEMP_SEVERE, cfg, pred_temp))
             elif pred_temp < cfg["temp_min"] or pred_temp > cfg["temp_max"]:
                 score += 1
-                details.append(f"Nhiệt độ ({pred_temp:.1f}°C) không tối ưu")
+                details.append(render_reason(R_TEMP_MILD, cfg, pred_temp))
 
             # 5.2 Sốc nhiệt (Shock check)
             delta_temp = abs(pred_temp - curr_temp)
             if delta_temp > cfg.get("temp_shock_delta", 2.0):
                 score += 5 # BÁO ĐỘNG ĐỎ
-                details.append(f"Nguy cơ SỐC NHIỆT! Biến động {delta_temp:.1f}°C cực nhanh.")
+                details.append(render_reason(R_TEMP_SHOCK, cfg, delta_temp))
 
         # === 6. Safety Net (Dựa trên chỉ số hiện tại) ===
         # Lấy DO hiện tại từ dictionary current_state
@@ -114,7 +156,7 @@ class RiskEngine:
         
         if curr_do < cfg["do_danger"]:
             score = max(score, 5)
-            details.append(f"DO hiện tại ({curr_do:.2f}) đã ở mức nguy hiểm!")
+            details.append(render_reason(R_DO_CURRENT, cfg, curr_do))
 
         # === 7. Kết luận ===
         status = "SAFE"
@@ -130,5 +172,117 @@ class RiskEngine:
             "thresholds_used": cfg
         }
 
+    # ---------- BATCH (NUMPY) ----------
+    def _table(self):
+        # Bảng ngưỡng (n_species, len(THRESHOLD_FIELDS)), dựng một lần
+        if self._threshold_table is None:
+            self._species_index = {name: i for i, name in enumerate(self.SPECIES_CONFIG)}
+            self._threshold_table = np.array([
+                [cfg.get(field, 2.0) for field in THRESHOLD_FIELDS]
+                for cfg in self.SPECIES_CONFIG.values()
+            ], dtype=np.float64)
+        return self._threshold_table
+
+    def species_codes(self, species) -> np.ndarray:
+        """Row index into the threshold table per species name (unknown -> "tom", like assess_risk)."""
+        self._table()
+        default = self._species_index["tom"]
+        names, inverse = np.unique(np.asarray(species), return_inverse=True)
+        lookup = np.array([self._species_index.get(s, default) for s in names], dtype=np.intp)
+        return lookup[inverse.reshape(-1)]
+
+    def assess_batch(self, prediction: dict, current_state: dict, species) -> "RiskBatch":
+        """
+        Columnar assess_risk: prediction / current_state map a column name to an
+        array (one value per row), species is a sequence of names or an array of
+        species_codes(). Same rules, scores and levels as assess_risk row by row;
+        reasons are kept as a (rows, N_REASONS) mask and rendered on demand.
+        NaN in a temperature column means "missing" (assess_risk's None).
+        """
+        table = self._table()
+        species = np.asarray(species)
+        codes = species if species.dtype.kind in "iu" else self.species_codes(species)
+        n = len(codes)
+        cfg = {field: table[codes, j] for j, field in enumerate(THRESHOLD_FIELDS)}
+
+        def column(values, name, default):
+            if name not in values:
+                return np.full(n, default, dtype=np.float64)
+            return np.asarray(values[name], dtype=np.float64)
+
+        pred_do = column(prediction, "dissolved_oxygen", 0.0)
+        pred_ph = column(prediction, "ph", 7.0)
+        pred_amm = column(prediction, "ammonia", 0.0)
+        pred_temp = column(prediction, "temperature", np.nan)
+        curr_temp = column(current_state, "temperature", np.nan)
+        curr_do = column(current_state, "dissolved_oxygen", 99.0)
+        has_temp = ~(np.isnan(pred_temp) | np.isnan(curr_temp))
+        delta_temp = np.abs(pred_temp - curr_temp)
+
+        mask = np.zeros((n, N_REASONS), dtype=bool)
+        mask[:, R_DO_DANGER] = pred_do < cfg["do_danger"]
+        mask[:, R_DO_WARNING] = ~mask[:, R_DO_DANGER] & (pred_do < cfg["do_warning"])
+        mask[:, R_PH_SEVERE] = (pred_ph < cfg["ph_min"] - 0.5) | (pred_ph > cfg["ph_max"] + 0.5)
+        mask[:, R_PH_MILD] = ~mask[:, R_PH_SEVERE] & ((pred_ph < cfg["ph_min"]) | (pred_ph > cfg["ph_max"]))
+        mask[:, R_NH3_DANGER] = pred_amm > cfg["ammonia_danger"]
+        mask[:, R_NH3_WARNING] = ~mask[:, R_NH3_DANGER] & (pred_amm > cfg["ammonia_warning"])
+        mask[:, R_TEMP_SEVERE] = has_temp & (
+            (pred_temp < cfg["temp_min"] - 2) | (pred_temp > cfg["temp_max"] + 2)
+        )
+        mask[:, R_TEMP_MILD] = has_temp & ~mask[:, R_TEMP_SEVERE] & (
+            (pred_temp < cfg["temp_min"]) | (pred_temp > cfg["temp_max"])
+        )
+        mask[:, R_TEMP_SHOCK] = has_temp & (delta_temp > cfg["temp_shock_delta"])
+        mask[:, R_DO_CURRENT] = curr_do < cfg["do_danger"]
+
+        score = mask[:, :R_DO_CURRENT].astype(np.int64) @ REASON_POINTS[:R_DO_CURRENT]
+        score = np.where(mask[:, R_DO_CURRENT], np.maximum(score, 5), score)
+        level_codes = (score >= 2).astype(np.int8) + (score >= 5)
+
+        # Giá trị in trong câu lý do, theo từng mã
+        values = np.stack([
+            pred_do, pred_do, pred_ph, pred_ph, pred_amm, pred_amm,
+            pred_temp, pred_temp, delta_temp, curr_do,
+        ], axis=1)
+        return RiskBatch(self, codes, score, level_codes, mask, values)
+
+
+class RiskBatch:
+    """Result of RiskEngine.assess_batch; text is only built by reasons() / to_dict()."""
+
+    def __init__(self, engine, species_codes, score, level_codes, reason_mask, values):
+        self.engine = engine
+        self.species_codes = species_codes
+        self.score = score
+        self.level_codes = level_codes    # chỉ số vào LEVELS
+        self.reason_mask = reason_mask    # (rows, N_REASONS) bool, cột = mã lý do
+        self._values = values
+
+    def __len__(self):
+        return len(self.score)
+
+    @property
+    def levels(self) -> np.ndarray:
+        return LEVELS_ARRAY[self.level_codes]
+
+    def reason_codes(self, i) -> List[int]:
+        return np.flatnonzero(self.reason_mask[i]).tolist()
+
+    def thresholds(self, i) -> dict:
+        return list(self.engine.SPECIES_CONFIG.values())[self.species_codes[i]]
+
+    def reasons(self, i) -> List[str]:
+        cfg = self.thresholds(i)
+        return [render_reason(code, cfg, float(self._values[i, code])) for code in self.reason_codes(i)]
+
+    def to_dict(self, i) -> dict:
+        """Row i in the assess_risk format."""
+        return {
+            "level": LEVELS[self.level_codes[i]],
+            "score": int(self.score[i]),
+            "reasons": self.reasons(i),
+            "thresholds_used": self.thresholds(i),
+        }
+
 # Instance singleton
 risk_engine = RiskEngine()
\ No newline at end of file
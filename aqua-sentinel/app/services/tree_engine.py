@@ -0,0 +1,155 @@
+import json
+
+import numpy as np
+
+# Số dòng mỗi lần duyệt cây, giới hạn bộ nhớ của mảng (rows, n_trees)
+ROWS_PER_CHUNK = 128
+
+# Cây được trải thành cây nhị phân đầy đủ 2^depth lá; quá sâu thì tốn bộ nhớ
+MAX_SUPPORTED_DEPTH = 12
+
+
+def _parse_base_score(raw: str):
+    # XGBoost >= 2 lưu dạng "[6.33181E0]" hoặc "[a,b,c]" cho multi-target
+    return [float(v) for v in raw.strip("[]").split(",")]
+
+
+def _model_json(booster):
+    # xgboost.Booster, hoặc dict đã đọc từ file model .json (không cần import xgboost)
+    if isinstance(booster, dict):
+        return booster
+    return json.loads(booster.save_raw(raw_format="json"))
+
+
+def _tree_depth(tree):
+    left, right = tree["left_children"], tree["right_children"]
+    max_depth = 0
+    stack = [(0, 0)]
+    while stack:
+        node, depth = stack.pop()
+        if left[node] == -1:
+            max_depth = max(max_depth, depth)
+        else:
+            stack.append((left[node], depth + 1))
+            stack.append((right[node], depth + 1))
+    return max_depth
+
+
+class TreeEnsembleEngine:
+    """
+    Pure NumPy evaluator for XGBoost gbtree regressors.
+
+    At load time every tree is exported once into flat arrays laid out as a complete
+    binary tree of the ensemble's max depth (heap order: children of i are 2i+1, 2i+2).
+    A leaf shallower than max depth is copied to all its padded descendants, so
+    evaluation is exactly `depth` vectorized steps over all (row, tree) pairs for
+    every target together, with no per-node child lookups.
+    """
+
+    def __init__(self, boosters, n_outputs: int):
+        """
+        :param boosters: list of (booster, output_columns), where booster is an
+                         xgboost.Booster or the parsed JSON of a saved model, and
+                         output_columns[k] is the output column of its k-th target
+        :param n_outputs: total number of output columns
+        """
+        trees, tree_outputs = [], []
+        self.base = np.zeros(n_outputs, dtype=np.float64)
+
+        for booster, output_columns in boosters:
+            model = _model_json(booster)["learner"]
+            if model["gradient_booster"]["name"] != "gbtree":
+                raise ValueError("TreeEnsembleEngine only supports gbtree boosters")
+
+            for k, score in enumerate(_parse_base_score(model["learner_model_param"]["base_score"])):
+                self.base[output_columns[k]] = score
+
+            gbtree = model["gradient_booster"]["model"]
+            for tree, target in zip(gbtree["trees"], gbtree["tree_info"]):
+                if any(tree["split_type"]):
+                    raise ValueError("Categorical splits are not supported")
+                trees.append(tree)
+                tree_outputs.append(output_columns[target])
+
+        self.depth = max(_tree_depth(t) for t in trees)
+        if self.depth > MAX_SUPPORTED_DEPTH:
+            raise ValueError(f"Tree depth {self.depth} > {MAX_SUPPORTED_DEPTH} is not supported")
+
+        n_trees = len(trees)
+        n_internal = 2 ** self.depth - 1
+        n_leaves = 2 ** self.depth
+
+        feature = np.zeros((n_trees, n_internal), dtype=np.intp)
+        threshold = np.zeros((n_trees, n_internal), dtype=np.float32)
+        default_left = np.ones((n_trees, n_internal), dtype=bool)
+        value = np.zeros((n_trees, n_leaves), dtype=np.float32)
+
+        for i, tree in enumerate(trees):
+            left, right = tree["left_children"], tree["right_children"]
+            stack = [(0, 0, 0)]  # (node, level, vị trí trong level)
+            while stack:
+                node, level, pos = stack.pop()
+                if left[node] == -1:
+                    span = 2 ** (self.depth - level)
+                    value[i, pos * span:(pos + 1) * span] = tree["split_conditions"][node]
+                    continue
+                h = 2 ** level - 1 + pos
+                feature[i, h] = tree["split_indices"][node]
+                threshold[i, h] = tree["split_conditions"][node]
+                default_left[i, h] = bool(tree["default_left"][node])
+                stack.append((left[node], level + 1, 2 * pos))
+                stack.append((right[node], level + 1, 2 * pos + 1))
+
+        self.n_trees = n_trees
+        self.n_outputs = n_outputs
+        self.feature = feature.ravel()
+        self.threshold = threshold.ravel()
+        self.default_left = default_left.ravel()
+        self.value = value.ravel()
+        self.tree_node_offset = np.arange(n_trees, dtype=np.intp) * n_internal
+        self.tree_leaf_offset = np.arange(n_trees, dtype=np.intp) * n_leaves
+
+        # (n_trees, n_outputs): cộng giá trị lá của mỗi cây vào đúng target
+        self.output_map = np.zeros((n_trees, n_outputs), dtype=np.float64)
+        self.output_map[np.arange(n_trees), tree_outputs] = 1.0
+
+    @classmethod
+    def from_models(cls, models: dict, targets: list):
+        """One single-target XGBRegressor per name in `targets`."""
+        boosters = [(models[name].get_booster(), [j]) for j, name in enumerate(targets)]
+        return cls(boosters, len(targets))
+
+    @classmethod
+    def from_multi_output(cls, model, n_outputs: int):
+        """One multi-output XGBRegressor (one_output_per_tree) with `n_outputs` targets."""
+        return cls([(model.get_booster(), list(range(n_outputs)))], n_outputs)
+
+    def predict(self, X):
+        """(n_rows, n_features) -> (n_rows, n_outputs) float64, chunked over rows."""
+        X = np.asarray(X, dtype=np.float32)
+        if X.ndim == 1:
+            X = X[None, :]
+
+        out = np.empty((X.shape[0], self.n_outputs), dtype=np.float64)
+        for start in range(0, X.shape[0], ROWS_PER_CHUNK):
+            chunk = np.ascontiguousarray(X[start:start + ROWS_PER_CHUNK])
+            out[start:start + ROWS_PER_CHUNK] = self._predict_chunk(chunk)
+        return out
+
+    def _predict_chunk(self, X):
+        n_rows, n_features = X.shape
+        flat_x = X.ravel()
+        row_offset = (np.arange(n_rows, dtype=np.intp) * n_features)[:, None]
+        has_missing = np.isnan(flat_x).any()
+
+        pos = np.zeros((n_rows, self.n_trees), dtype=np.intp)
+        for level in range(self.depth):
+            node = self.tree_node_offset + (2 ** level - 1) + pos
+            x = flat_x[row_offset + self.feature[node]]
+            # XGBoost: x < ngưỡng -> trái; NaN -> theo default_left
+            go_right = x >= self.threshold[node]
+            if has_missing:
+                go_right |= np.isnan(x) & ~self.default_left[node]
+            pos = 2 * pos + go_right
+
+        return self.value[self.tree_leaf_offset + pos] @ self.output_map + self.base